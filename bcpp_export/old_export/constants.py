@@ -65,3 +65,8 @@ survival = {
     edc_ALIVE: ALIVE,
     edc_DEAD: DEAD,
     None: np.nan}
+
+plot_action = {
+    'confirmed': YES,
+    'unconfirmed': NO,
+    None: np.nan}
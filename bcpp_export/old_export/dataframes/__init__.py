@@ -1,4 +1,5 @@
 from .combined_dataframes import CombinedDataFrames, CDCDataFrames
+from .dataframe_cache import DataframeCache
 from .members import Members
 from .residences import Residences
 from .subjects import Subjects
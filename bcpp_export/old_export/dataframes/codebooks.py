@@ -0,0 +1,69 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from django.core.management.color import color_style
+
+from ..constants import gender, hiv_options, plot_action, survival, tf, yes_no
+
+style = color_style()
+
+
+class Codebook(object):
+
+    """A mapping of EDC responses to numeric codes that codes a whole column at once.
+
+    The responses are held in an index and the codes in a lookup array in the same
+    order, so a column is coded by looking up the position of each value in the index.
+    """
+
+    def __init__(self, name, codes):
+        self.name = name
+        codes = dict([(key, value) for key, value in codes.items() if key is not None])
+        self.responses = pd.Index(list(codes.keys()), dtype=object)
+        self.lookup = np.array(list(codes.values()) + [np.nan], dtype=float)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.name)
+
+    def codes(self, values):
+        """Return an array of the codes of the values and a boolean array of the values
+        that are not null and not in the codebook, coded as NaN."""
+        positions = self.responses.get_indexer(pd.Series(values).astype(object))
+        unmapped = (positions == -1) & pd.notnull(values)
+        return self.lookup[positions], np.asarray(unmapped)
+
+
+codebooks = dict([(codebook.name, codebook) for codebook in [
+    Codebook('gender', gender),
+    Codebook('hiv_options', hiv_options),
+    Codebook('plot_action', plot_action),
+    Codebook('survival', survival),
+    Codebook('tf', tf),
+    Codebook('yes_no', yes_no)]])
+
+
+def map_codes(df, schema, name=None, nullable_ints=None):
+    """Map the columns of the dataframe in place to numeric codes and return the dataframe.
+
+    `schema` is a dictionary of column name to codebook name, e.g. {'gender': 'gender'}.
+    Coded columns are float, with NaN for missing values, or with `nullable_ints` the
+    nullable Int8, if the version of pandas supports it. Non-null values not in the
+    codebook are counted and reported."""
+    nullable_ints = nullable_ints is True and hasattr(pd, 'Int8Dtype')
+    for column, codebook_name in sorted(schema.items()):
+        try:
+            codebook = codebooks[codebook_name]
+        except KeyError:
+            raise TypeError('Invalid codebook for column {}. Expected one of {}. Got {}'.format(
+                column, sorted(codebooks), codebook_name))
+        codes, unmapped = codebook.codes(df[column].values)
+        if unmapped.any():
+            values = pd.Series(df[column].values[unmapped]).astype(str).value_counts()
+            sys.stdout.write(style.WARNING(
+                'Warning! {} {} value(s) of column {} are not in codebook {}. Got {}.\n'.format(
+                    unmapped.sum(), name or 'dataframe', column, codebook.name,
+                    ', '.join(['{} ({})'.format(value, count) for value, count in values[:5].items()]))))
+        df[column] = pd.Series(codes, index=df.index).astype('Int8') if nullable_ints else codes
+    return df
@@ -0,0 +1,203 @@
+import os
+
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
+from numbers import Number
+
+import numpy as np
+import pandas as pd
+
+from django.utils import six
+
+PARQUET = 'parquet'
+FEATHER = 'feather'
+HDF5 = 'hdf5'
+PICKLE = 'pickle'
+
+# export_format: the module pandas needs to write and read the format
+required_modules = {
+    PARQUET: 'pyarrow',
+    FEATHER: 'pyarrow',
+    HDF5: 'tables',
+}
+
+# columns with few distinct values, stored as categoricals (dictionary encoded in parquet)
+categorical_columns = ['community', 'survey', 'plot_status']
+
+
+def columnar_dataframe(df, nullable_ints=None):
+    """Return a copy of the dataframe with dtypes that round-trip through a columnar file.
+
+        * object columns of dates or datetimes become datetime64;
+        * object columns of numbers become numeric;
+        * other object columns with mixed values become strings (nulls are kept);
+        * float columns of whole numbers with nulls become nullable Int64, if
+          `nullable_ints` and the version of pandas supports it;
+        * nullable integer columns, e.g. from compact_dtypes, become float64 if not
+          `nullable_ints`;
+        * `categorical_columns` become categoricals.
+    """
+    nullable_ints = False if nullable_ints is False else hasattr(pd, 'Int64Dtype')
+    df = df.copy()
+    for column in df.columns:
+        values = df[column].dropna()
+        if column in categorical_columns:
+            df[column] = df[column].astype('category')
+        elif df[column].dtype == object and not values.empty:
+            if values.map(lambda value: isinstance(value, date)).all():
+                df[column] = pd.to_datetime(df[column], errors='coerce')
+            elif values.map(lambda value: isinstance(value, (Number, Decimal)) and
+                            not isinstance(value, bool)).all():
+                df[column] = pd.to_numeric(df[column].map(
+                    lambda value: float(value) if isinstance(value, Decimal) else value))
+            elif not values.map(lambda value: isinstance(value, six.string_types)).all():
+                df[column] = df[column].where(pd.isnull(df[column]), df[column].astype(str))
+        elif not nullable_ints and str(df[column].dtype).startswith(('Int', 'UInt')):
+            df[column] = df[column].astype(float)
+        elif (nullable_ints and df[column].dtype.kind == 'f' and len(values) < len(df) and
+                not values.empty and (values == np.floor(values)).all()):
+            df[column] = df[column].astype('Int64')
+    return df
+
+
+def write_parquet(df, path, name):
+    df.to_parquet(path, index=False)
+
+
+def write_feather(df, path, name):
+    df.reset_index(drop=True).to_feather(path)
+
+
+def write_hdf5(df, path, name):
+    df.to_hdf(path, key=name, mode='w', format='table')
+
+
+# export_format: (writer, file extension, nullable ints supported)
+writers = {
+    PARQUET: (write_parquet, '.parquet', True),
+    FEATHER: (write_feather, '.feather', True),
+    HDF5: (write_hdf5, '.h5', False),
+}
+
+
+# export_format: reader
+readers = {
+    PARQUET: lambda path, name: pd.read_parquet(path),
+    FEATHER: lambda path, name: pd.read_feather(path),
+    HDF5: lambda path, name: pd.read_hdf(path, key=name),
+}
+
+
+def check_export_format(export_format):
+    """Raise an ImportError if the module needed for `export_format` is not installed."""
+    module = required_modules.get(export_format)
+    if module:
+        try:
+            import_module(module)
+        except ImportError:
+            raise ImportError(
+                'Export format {} requires {}. Install it with pip install bcpp-export[columnar].'.format(
+                    export_format, module))
+
+
+def write_columnar(df, path, name, export_format, nullable_ints=None):
+    """Write the dataframe to `path` in `export_format` through a temp file.
+
+    Float columns with nulls become nullable integers where the format supports
+    them unless `nullable_ints` is False."""
+    try:
+        writer, _, supports_nullable_ints = writers[export_format]
+    except KeyError:
+        raise TypeError('Invalid export format. Expected one of {}. Got {}'.format(
+            list(writers), export_format))
+    check_export_format(export_format)
+    nullable_ints = False if nullable_ints is False else supports_nullable_ints
+    temp_path = '{}.tmp'.format(path)
+    try:
+        writer(columnar_dataframe(df, nullable_ints=nullable_ints), temp_path, name)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.rename(temp_path, path)
+
+
+class ColumnarChunkStore(object):
+
+    """A folder of columnar files, one per chunk of a dataframe, e.g. to write the
+    chunks of a query as they are read instead of holding the result in memory.
+
+        store = ColumnarChunkStore('~/lis_store', 'results')
+        store.clear()
+        for df in chunks:
+            store.append(df)
+        df = store.read()
+
+    or, to process one chunk at a time:
+
+        for df in store.chunks():
+            ...
+
+    Chunks are written without nullable integers so they concatenate to the same
+    dtypes whatever the nulls in a chunk.
+
+    The default format is parquet, or pickle if pyarrow is not installed. A format
+    chosen explicitly raises an ImportError if its module is not installed.
+    """
+
+    def __init__(self, folder, name, export_format=None):
+        self.folder = os.path.expanduser(folder)
+        self.name = name
+        if export_format is None:
+            try:
+                check_export_format(PARQUET)
+            except ImportError:
+                export_format = PICKLE
+            else:
+                export_format = PARQUET
+        self.export_format = export_format
+        if self.export_format not in list(writers) + [PICKLE]:
+            raise TypeError('Invalid export format. Expected one of {}. Got {}'.format(
+                list(writers) + [PICKLE], self.export_format))
+        check_export_format(self.export_format)
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    @property
+    def extension(self):
+        return '.pkl' if self.export_format == PICKLE else writers[self.export_format][1]
+
+    @property
+    def paths(self):
+        prefix = '{}-'.format(self.name)
+        return sorted([
+            os.path.join(self.folder, filename) for filename in os.listdir(self.folder)
+            if filename.startswith(prefix) and filename.endswith(self.extension)])
+
+    def append(self, df):
+        path = os.path.join(self.folder, '{}-{:05d}{}'.format(self.name, len(self.paths), self.extension))
+        if self.export_format == PICKLE:
+            df.to_pickle(path + '.tmp')
+            os.rename(path + '.tmp', path)
+        else:
+            write_columnar(df, path, self.name, self.export_format, nullable_ints=False)
+
+    def read_chunk(self, path):
+        if self.export_format == PICKLE:
+            return pd.read_pickle(path)
+        return readers[self.export_format](path, self.name)
+
+    def chunks(self):
+        """Yield the chunks as dataframes, in the order they were appended."""
+        for path in self.paths:
+            yield self.read_chunk(path)
+
+    def read(self):
+        """Return the chunks as one dataframe or an empty dataframe if there are none."""
+        dfs = list(self.chunks())
+        return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+
+    def clear(self):
+        for path in self.paths:
+            os.remove(path)
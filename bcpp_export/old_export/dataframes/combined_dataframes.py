@@ -5,13 +5,16 @@ import sys
 
 from datetime import date, datetime, timedelta
 from bcpp_export import urls  # DO NOT DELETE
-from bcpp_export.constants import YES, POS
+from bcpp_export.constants import YES, POS, PLOT_IDENTIFIER, SUBJECT_IDENTIFIER
 from .csv_export_mixin import CsvExportMixin
+from .dtypes import compact_dtypes
+from .incremental import ExportSnapshot, replace_rows
 from .members import Members
-from .residences import Residences
+from .residences import Residences, residences_dataframe
 from .subjects import Subjects
 from django.core.management.color import color_style
-from bcpp_export.identity256 import identity256
+from django.utils import timezone
+from bcpp_export.identity256_cache import identity256_bulk
 from bcpp_export.dataframes.subjects_crio2017 import SubjectsCrio2017
 
 style = color_style()
@@ -28,42 +31,75 @@ class CombinedDataFrames(CsvExportMixin):
 
         dfs = CombinedDataFrames('bcpp-year-1', export_pairs=range(1, 15), add_identity256=True)
 
+        # smaller dtypes for the subjects, members and residences dataframes
+        dfs = CombinedDataFrames('bcpp-year-1', compact_dtypes=True)
+
+        # only hash identities not hashed on a previous run
+        dfs = CombinedDataFrames('bcpp-year-1', add_identity256=True, identity256_cache=Identity256Cache())
+
         # if instances members, subjects, residences already exist
         dfs = CombinedDataFrames(
             'bcpp-year-1', members_object=members, subjects_object=subjects, residences_object=residences)
 
+        # reuse dataframes queried on a previous run if the source tables are unchanged
+        dfs = CombinedDataFrames('bcpp-year-1', dataframe_cache=DataframeCache())
+
+        # incremental export: the first run exports and keeps a snapshot in snapshot_folder,
+        # later runs update the snapshot from data modified since and also export delta files
+        dfs = CombinedDataFrames('bcpp-year-1', snapshot_folder='~/bcpp_export_snapshots')
+        dfs.to_csv()
+
+    On an incremental export only subjects, household structures and plots with data modified
+    since the previous export are fetched and recomputed. A row deleted from the database is
+    only removed if other data under the same subject, household structure or plot is modified.
     """
     export_dataset_names = ['plots', 'residences', 'members', 'subjects']
     default_export_dataset_name = 'all'
 
     def __init__(self, survey_name, merge_subjects_on=None, add_identity256=None,
                  members_object=pd.DataFrame(), subjects_object=pd.DataFrame(),
-                 residences_object=pd.DataFrame(), **kwargs):
+                 residences_object=pd.DataFrame(), dataframe_cache=None, snapshot_folder=None,
+                 identity256_cache=None, compact_dtypes=None, **kwargs):
         super(CombinedDataFrames, self).__init__(**kwargs)
         self.survey_name = survey_name
+        self.dataframe_cache = dataframe_cache
+        self.identity256_cache = identity256_cache
+        self.compact_dtypes = compact_dtypes
+        self.snapshot = ExportSnapshot(snapshot_folder, survey_name) if snapshot_folder else None
+        self.delta_keys = {}
         self.plots = pd.DataFrame()
         self.households = pd.DataFrame()
-        if not subjects_object.empty:
-            self.subjects = subjects_object
-        else:
-            self.obj_subjects = self.get_subjects(
-                merge_subjects_on, add_identity256)
-            self.subjects = self.obj_subjects.results
-            self.subjects.to_csv('~/subjects_tmp.csv', index=False)
-        if not members_object.empty:
-            self.members = members_object
+        watermark = timezone.now()
+        if (self.snapshot and self.snapshot.exists and subjects_object.empty and
+                members_object.empty and residences_object.empty):
+            self.update_from_snapshot(merge_subjects_on, add_identity256)
         else:
-            self.obj_members = Members(
-                self.survey_name, subjects=self.subjects)
-            self.members = self.obj_members.results
-        if not residences_object.empty:
-            self.residences = residences_object
-        else:
-            self.obj_residences = Residences(
-                self.survey_name, subjects=self.subjects, members=self.members)
-            self.plots = self.obj_residences.plots
-            self.households = self.obj_residences.households
-            self.residences = self.obj_residences.residences
+            if not subjects_object.empty:
+                self.subjects = subjects_object
+            else:
+                self.obj_subjects = self.get_subjects(
+                    merge_subjects_on, add_identity256)
+                self.subjects = self.obj_subjects.results
+            if not members_object.empty:
+                self.members = members_object
+            else:
+                self.obj_members = Members(
+                    self.survey_name, subjects=self.subjects, dataframe_cache=self.dataframe_cache,
+                    compact_dtypes=self.compact_dtypes)
+                self.members = self.obj_members.results
+            if not residences_object.empty:
+                self.residences = residences_object
+            else:
+                self.obj_residences = Residences(
+                    self.survey_name, subjects=self.subjects, members=self.members,
+                    dataframe_cache=self.dataframe_cache, compact_dtypes=self.compact_dtypes)
+                self.plots = self.obj_residences.plots
+                self.households = self.obj_residences.households
+                self.residences = self.obj_residences.residences
+        if self.snapshot and residences_object.empty:
+            self.snapshot.write(
+                watermark, subjects=self.subjects, members=self.members,
+                households=self.households, plots=self.plots)
         residences_columns = [
             'household_structure', 'household_consented', 'household_log_status', 'household_log_date',
             'confirmed', 'plot_status', 'plot_modified', 'selected', 'gps_lat',
@@ -72,9 +108,86 @@ class CombinedDataFrames(CsvExportMixin):
             self.members, self.residences[residences_columns], how='left', on='household_structure')
         self.subjects = pd.merge(
             self.subjects, self.residences[residences_columns], how='left', on='household_structure')
+        if self.dataframe_cache is not None:
+            self.dataframe_cache.close()
+
+    def update_from_snapshot(self, merge_subjects_on, add_identity256):
+        """Update the dataframes of the previous export with the subjects, household
+        structures and plots that have data modified since the previous export."""
+        since = self.snapshot.watermark
+        sys.stdout.write(style.NOTICE('Updating {} export from data modified since {}.\n'.format(
+            self.survey_name, since)))
+        previous_subjects = self.snapshot.read('subjects')
+        self.obj_subjects = self.get_subjects(merge_subjects_on, add_identity256)
+        subject_identifiers = self.obj_subjects.modified_subject_identifiers(since)
+        self.obj_subjects.subject_identifiers = subject_identifiers
+        self.subjects = replace_rows(
+            previous_subjects, self.obj_subjects.results if subject_identifiers else pd.DataFrame(),
+            SUBJECT_IDENTIFIER, subject_identifiers)
+        subjects = pd.concat([previous_subjects, self.subjects])
+        subjects = subjects[subjects[SUBJECT_IDENTIFIER].isin(subject_identifiers)]
+
+        previous_members = self.snapshot.read('members')
+        self.obj_members = Members(
+            self.survey_name, subjects=self.subjects, dataframe_cache=self.dataframe_cache,
+            compact_dtypes=self.compact_dtypes)
+        self.obj_residences = Residences(
+            self.survey_name, subjects=self.subjects, members=previous_members,
+            dataframe_cache=self.dataframe_cache)
+        # all modified household structures, so members of each are refreshed
+        household_structures = self.obj_members.modified_household_structures(since)
+        household_structures.update(subjects['household_structure'].dropna())
+        household_structures.update(self.obj_residences.modified_household_structures(since))
+        self.obj_members.household_structures = household_structures
+        self.members = replace_rows(
+            previous_members, self.obj_members.results if household_structures else pd.DataFrame(),
+            'household_structure', household_structures)
+        self.obj_residences.members = self.members
+        plot_identifiers = self.obj_residences.modified_plot_identifiers(since)
+        plot_identifiers.update(subjects[PLOT_IDENTIFIER].dropna())
+        plot_identifiers.update(self.obj_residences.household_structure_plot_identifiers(household_structures))
+        self.obj_residences.household_structures = household_structures
+        self.obj_residences.plot_identifiers = plot_identifiers
+        self.households = replace_rows(
+            self.snapshot.read('households'),
+            self.obj_residences.households if household_structures else pd.DataFrame(),
+            'household_structure', household_structures)
+        self.plots = replace_rows(
+            self.snapshot.read('plots'), self.obj_residences.plots if plot_identifiers else pd.DataFrame(),
+            PLOT_IDENTIFIER, plot_identifiers)
+        self.residences = residences_dataframe(self.households, self.plots)
+        if self.compact_dtypes:
+            self.residences = compact_dtypes(self.residences, 'residences')
+        self.delta_keys = {
+            SUBJECT_IDENTIFIER: subject_identifiers,
+            'household_structure': household_structures,
+            PLOT_IDENTIFIER: plot_identifiers}
+        sys.stdout.write(style.SQL_FIELD('Updated {} subjects, {} household structures and {} plots.\n'.format(
+            len(subject_identifiers), len(household_structures), len(plot_identifiers))))
+
+    def delta(self, dataset_name):
+        """Return the rows of the dataset updated by an incremental export."""
+        df = getattr(self, dataset_name)
+        updated = pd.Series(False, index=df.index)
+        for column, values in self.delta_keys.items():
+            if column in df.columns:
+                updated = updated | df[column].isin(values)
+        return df[updated]
+
+    def to_csv(self, dataset_name=None, **kwargs):
+        """Export the datasets and, after an incremental update, a delta file of
+        the updated rows of each dataset."""
+        super(CombinedDataFrames, self).to_csv(dataset_name, **kwargs)
+        if self.delta_keys:
+            kwargs.pop('path_or_buf', None)
+            for name in self.dataset_names(dataset_name or self.default_export_dataset_name):
+                columns = self.get_export_columns(name, columns_list=kwargs.get('columns'))
+                self.export_dataframe(self.delta(name), '{}_delta'.format(name), columns.get(name), **kwargs)
 
     def get_subjects(self, merge_subjects_on, add_identity256):
-        return Subjects(self.survey_name, merge_subjects_on, add_identity256)
+        return Subjects(
+            self.survey_name, merge_subjects_on, add_identity256, dataframe_cache=self.dataframe_cache,
+            identity256_cache=self.identity256_cache, compact_dtypes=self.compact_dtypes)
 
     def validate(self):
         assert len(self.plots.query('enrolled == 1')) == len(
@@ -140,11 +253,9 @@ class CDCDataFrames(CombinedDataFrames):
             sys.stdout.write(style.SQL_FIELD('Done.\n'))
 
     def add_identity256(self):
-        sys.stdout.write(style.NOTICE('Adding column \'identity256\' to subjects dataframe.\n'
-                                      'This may take a few minutes ...\n'))
+        sys.stdout.write(style.NOTICE('Adding column \'identity256\' to subjects dataframe.\n'))
         dte_start = datetime.today()
-        self.subjects['identity256'] = self.subjects.apply(
-            lambda row: identity256(row, column_name='identity'), axis=1)
+        self.subjects['identity256'] = identity256_bulk(self.subjects['identity'], cache=self.identity256_cache)
         td = (datetime.today() - dte_start)
         sys.stdout.write(style.SQL_FIELD('Done. {} minutes {} seconds\n'.format(
             *divmod(td.days * 86400 + td.seconds, 60))))
@@ -171,4 +282,6 @@ class CDCDataFramesCroi2017(CDCDataFrames):
     ]
 
     def get_subjects(self, merge_subjects_on, add_identity256):
-        return SubjectsCrio2017(self.survey_name, merge_subjects_on, add_identity256)
+        return SubjectsCrio2017(
+            self.survey_name, merge_subjects_on, add_identity256, dataframe_cache=self.dataframe_cache,
+            identity256_cache=self.identity256_cache, compact_dtypes=self.compact_dtypes)
@@ -1,13 +1,60 @@
+import gzip
+import io
 import os
 import sys
 
+import numpy as np
+
+from contextlib import contextmanager
 from datetime import date
 
+from django.utils import six
+
+from .columnar_writers import PARQUET, writers, write_columnar
+
 MIN = 0
 MAX = 1
 INTERVENTION = 1
 NON_INTERVENTION = 0
 
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+compression_extensions = {GZIP: '.gz', ZSTD: '.zst'}
+
+
+@contextmanager
+def export_file(path, compression=None):
+    """Yield a text file handle that writes to a temp file in the folder of `path`,
+    optionally gzip or zstd compressed, and rename the temp file to `path` when done.
+
+    If an exception is raised the temp file is removed, so `path` is never left half written."""
+    if compression not in [None, GZIP, ZSTD]:
+        raise TypeError('Invalid compression. Expected one of {}. Got {}'.format([GZIP, ZSTD], compression))
+    temp_path = '{}.tmp'.format(path)
+    raw = open(temp_path, 'wb')
+    try:
+        if compression == GZIP:
+            f = gzip.GzipFile(fileobj=raw, mode='wb')
+        elif compression == ZSTD:
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError('zstd compression requires zstandard. Install it with pip install bcpp-export[zstd].')
+            f = zstandard.ZstdCompressor().stream_writer(raw)
+        else:
+            f = raw
+        f = io.TextIOWrapper(f, encoding='utf8', newline='') if six.PY3 else f
+        yield f
+        f.close()
+        if not raw.closed:
+            raw.close()
+    except BaseException:
+        raw.close()
+        os.remove(temp_path)
+        raise
+    os.rename(temp_path, path)
+
 
 class CsvExportMixin(object):
 
@@ -15,6 +62,7 @@ class CsvExportMixin(object):
     default_export_arms = (INTERVENTION, )
     default_export_dataset_name = 'results'
     default_filename_template = 'bcpp_export_{timestamp}_{datasetname}.csv'
+    default_export_chunksize = 10000
     export_dataset_names = ['results']
 
     def __init__(self, *args, **kwargs):
@@ -22,34 +70,72 @@ class CsvExportMixin(object):
         self.export_pairs = tuple(kwargs.get('export_pairs', self.default_export_pairs))
         self.export_arms = kwargs.get('export_arms', self.default_export_arms)
 
-    def filtered_export_dataframe(self, df, export_arms=None, export_pairs=None, **kwargs):
+    def filtered_export_dataframe(self, df, **kwargs):
         """Return a DF filtered by intervention arm(s) and pair(s).
 
         This is the DF that exports by default."""
+        return df[self.filtered_export_mask(df, **kwargs)]
+
+    def filtered_export_mask(self, df, export_arms=None, export_pairs=None, **kwargs):
+        """Return a boolean series that selects the rows of the DF in the intervention arm(s) and pair(s)."""
         arms = export_arms or self.export_arms  # tuple, e.g. (INTERVENTION, NON_INTERVENTION)
         pairs = export_pairs or self.export_pairs  # tuple, e.g. (1, 15)
-        return df[df['intervention'].isin(arms) & df['pair'].isin(pairs)]
+        return df['intervention'].isin(arms) & df['pair'].isin(pairs)
 
     def to_csv(self, dataset_name=None, **kwargs):
         dataset_name = dataset_name or self.default_export_dataset_name
-        export_folder = kwargs.get('export_folder', self.export_folder)
         for name in self.dataset_names(dataset_name):
             columns = self.get_export_columns(name, columns_list=kwargs.get('columns'))
-            df = getattr(self, name)
-            df = self.filtered_export_dataframe(df, **kwargs)
-            path_or_buf = os.path.expanduser(
-                kwargs.get('path_or_buf') or
-                os.path.join(export_folder, self.default_filename_template.format(
-                    timestamp=date.today().strftime('%Y%m%d'), datasetname=name)))
-            options = dict(
-                path_or_buf=path_or_buf,
-                na_rep='',
-                encoding='utf8',
-                date_format=kwargs.get('date_format', '%Y-%m-%d %H:%M:%S'),
-                index=kwargs.get('index', False),
-                columns=columns.get(name))
-            self._to_csv(df, **options)
-            sys.stdout.write(' (*) Exported CSV file \'{}\'\n'.format(path_or_buf))
+            self.export_dataframe(getattr(self, name), name, columns.get(name), **kwargs)
+
+    def export_dataframe(self, df, datasetname, columns, **kwargs):
+        """Export the filtered dataframe to a CSV file named for `datasetname`.
+
+        Rows are written in chunks of `chunksize` through a temp file that is renamed
+        when complete. Set `compression` to 'gzip' or 'zstd' (needs zstandard) to compress
+        the file; the extension is added to the default filename."""
+        export_folder = kwargs.get('export_folder', self.export_folder)
+        compression = kwargs.get('compression')
+        chunksize = kwargs.get('chunksize') or self.default_export_chunksize
+        rows = np.flatnonzero(self.filtered_export_mask(df, **kwargs).values)
+        path = os.path.expanduser(
+            kwargs.get('path_or_buf') or
+            os.path.join(export_folder, self.default_filename_template.format(
+                timestamp=date.today().strftime('%Y%m%d'), datasetname=datasetname)) +
+            compression_extensions.get(compression, ''))
+        with export_file(path, compression) as f:
+            for start in range(0, max(len(rows), 1), chunksize):
+                options = dict(
+                    path_or_buf=f,
+                    na_rep='',
+                    encoding='utf8',
+                    date_format=kwargs.get('date_format', '%Y-%m-%d %H:%M:%S'),
+                    index=kwargs.get('index', False),
+                    header=start == 0,
+                    columns=columns)
+                self._to_csv(df.iloc[rows[start:start + chunksize]], **options)
+        sys.stdout.write(' (*) Exported CSV file \'{}\'\n'.format(path))
+
+    def to_columnar(self, dataset_name=None, export_format=None, **kwargs):
+        """Export the filtered datasets to Parquet (default), Feather or HDF5 files.
+
+        Dates, nullable integers and categoricals keep their dtypes, so a dataset
+        reloads with, for example, pd.read_parquet(path)."""
+        dataset_name = dataset_name or self.default_export_dataset_name
+        export_format = export_format or PARQUET
+        export_folder = kwargs.get('export_folder', self.export_folder)
+        for name in self.dataset_names(dataset_name):
+            columns = self.get_export_columns(name, columns_list=kwargs.get('columns')).get(name)
+            df = self.filtered_export_dataframe(getattr(self, name), **kwargs)
+            if columns:
+                df = df[columns]
+            filename = os.path.splitext(self.default_filename_template.format(
+                timestamp=date.today().strftime('%Y%m%d'), datasetname=name))[0]
+            path = os.path.expanduser(
+                kwargs.get('path') or
+                os.path.join(export_folder, filename + writers.get(export_format, (None, ''))[1]))
+            write_columnar(df, path, name, export_format)
+            sys.stdout.write(' (*) Exported {} file \'{}\'\n'.format(export_format, path))
 
     def _to_csv(self, df, **options):
         df.to_csv(**options)
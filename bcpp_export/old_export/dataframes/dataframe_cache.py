@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from django.db.models import get_models
+
+from .edc.edc_watermark import model_watermark
+
+PARQUET = 'parquet'
+FEATHER = 'feather'
+PICKLE = 'pickle'
+
+file_extensions = {
+    PARQUET: '.parquet',
+    FEATHER: '.feather',
+    PICKLE: '.pkl',
+}
+
+
+class DataframeCache(object):
+
+    """A persistent on-disk cache of dataframes extracted from Edc querysets.
+
+    Each dataframe is stored as one file in `cache_folder`. Files are keyed by model,
+    survey, selected columns, query and the watermarks (row count, max pk and max
+    modified) of the tables the query selects from or joins, e.g. subject_visit and household_member
+    for a CRF filtered on the survey. A cached dataframe is used until the watermark
+    changes. Watermarks are queried again once they are older than `watermark_ttl`
+    seconds (default 300). Pass watermark_ttl=0 to query them on every access.
+
+    When the files in the cache exceed `max_size` bytes, the least recently used
+    files are removed.
+
+        from bcpp_export.dataframes import DataframeCache, Subjects
+        cache = DataframeCache('~/bcpp_export_cache', max_size=2 * 1024 ** 3)
+        subjects = Subjects('bcpp-year-1', dataframe_cache=cache)
+
+    Parquet and Feather need pyarrow. If a dataframe cannot be written in `file_format`,
+    it is written as a pickle.
+
+    Access times of cache hits are kept in memory and written to the index with the
+    next `put` or on `close`.
+    """
+
+    default_cache_folder = '~/.bcpp_export_cache'
+    default_max_size = 2 * 1024 ** 3
+    default_file_format = PARQUET
+    default_watermark_ttl = 300
+    index_filename = 'index.json'
+
+    def __init__(self, cache_folder=None, max_size=None, file_format=None, watermark_ttl=None):
+        self.cache_folder = os.path.expanduser(cache_folder or self.default_cache_folder)
+        self.max_size = max_size or self.default_max_size
+        self.watermark_ttl = self.default_watermark_ttl if watermark_ttl is None else watermark_ttl
+        self.file_format = file_format or self.default_file_format
+        if self.file_format not in file_extensions:
+            raise TypeError('Invalid file_format. Expected one of {}. Got {}'.format(
+                list(file_extensions), self.file_format))
+        self.watermarks = {}
+        self.tables = None
+        self.lock = threading.RLock()
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder)
+        self.index = self.read_index()
+
+    def dataframe(self, qs, columns, survey_name=None):
+        """Return a dataframe of the values_list queryset `qs` with `columns`, from
+        the cache if the tables of the query are unchanged since it was cached."""
+        query_key = self.query_key(qs, columns, survey_name)
+        key = self.key(query_key, [self.watermark(model) for model in self.query_models(qs)])
+        with self.lock:
+            df = self.get(key)
+        if df is None:
+            df = pd.DataFrame(list(qs), columns=columns)
+            with self.lock:
+                self.put(key, df, query_key=query_key)
+        return df
+
+    def watermark(self, model):
+        """Return the model's watermark, queried again if older than watermark_ttl."""
+        label = '{}.{}'.format(model._meta.app_label, model._meta.model_name)
+        with self.lock:
+            queried, watermark = self.watermarks.get(label, (None, None))
+        if queried is None or time.time() - queried >= self.watermark_ttl:
+            # queried outside the lock so threads loading other dataframes are not held up
+            watermark = [label, sorted(model_watermark(model).items())]
+            with self.lock:
+                self.watermarks[label] = (time.time(), watermark)
+        return watermark
+
+    def query_models(self, qs):
+        """Return the model of the queryset and the models of the tables it joins."""
+        if self.tables is None:
+            self.tables = dict([(model._meta.db_table, model) for model in get_models()])
+        models = [qs.model]
+        for join in qs.query.alias_map.values():
+            model = self.tables.get(join.table_name)
+            if model is not None and model not in models:
+                models.append(model)
+        return models
+
+    def query_key(self, qs, columns, survey_name=None):
+        return self.hexdigest([
+            qs.model._meta.app_label, qs.model._meta.model_name,
+            survey_name, list(columns), str(qs.query)])
+
+    def key(self, query_key, watermark):
+        return self.hexdigest([query_key, watermark])
+
+    def hexdigest(self, values):
+        return hashlib.sha1(json.dumps(values, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached dataframe for key or None."""
+        entry = self.index.get(key)
+        if not entry:
+            return None
+        path = os.path.join(self.cache_folder, entry['filename'])
+        if not os.path.exists(path):
+            del self.index[key]
+            self.write_index()
+            return None
+        df = self.read(path, entry['file_format'])
+        entry['accessed'] = time.time()
+        return df
+
+    def put(self, key, df, query_key=None):
+        """Write the dataframe to the cache, replacing any previous version of the same query."""
+        for old_key, entry in list(self.index.items()):
+            if query_key and entry.get('query_key') == query_key:
+                self.remove(old_key)
+        file_format = self.write(df, key)
+        path = os.path.join(self.cache_folder, key + file_extensions[file_format])
+        self.index[key] = {
+            'filename': key + file_extensions[file_format],
+            'file_format': file_format,
+            'query_key': query_key,
+            'size': os.path.getsize(path),
+            'accessed': time.time()}
+        self.evict(keep=key)
+        self.write_index()
+
+    def read(self, path, file_format):
+        if file_format == PARQUET:
+            return pd.read_parquet(path)
+        elif file_format == FEATHER:
+            return pd.read_feather(path)
+        return pd.read_pickle(path)
+
+    def write(self, df, key):
+        """Write the dataframe and return the file format used."""
+        path = os.path.join(self.cache_folder, key)
+        try:
+            if self.file_format == PARQUET:
+                df.to_parquet(path + file_extensions[PARQUET])
+            elif self.file_format == FEATHER:
+                df.reset_index(drop=True).to_feather(path + file_extensions[FEATHER])
+            else:
+                df.to_pickle(path + file_extensions[PICKLE])
+                return PICKLE
+        except (ImportError, TypeError, ValueError):
+            # pyarrow not installed or cannot convert a column, e.g. mixed types
+            if os.path.exists(path + file_extensions[self.file_format]):
+                os.remove(path + file_extensions[self.file_format])
+            df.to_pickle(path + file_extensions[PICKLE])
+            return PICKLE
+        return self.file_format
+
+    @property
+    def size(self):
+        return sum([entry['size'] for entry in self.index.values()])
+
+    def evict(self, keep=None):
+        """Remove least recently used files until the cache is within max_size."""
+        entries = sorted(self.index.items(), key=lambda item: item[1]['accessed'])
+        for key, entry in entries:
+            if self.size <= self.max_size:
+                break
+            if key != keep:
+                self.remove(key)
+
+    def remove(self, key):
+        entry = self.index.pop(key)
+        path = os.path.join(self.cache_folder, entry['filename'])
+        if os.path.exists(path):
+            os.remove(path)
+
+    def clear(self):
+        for key in list(self.index):
+            self.remove(key)
+        self.write_index()
+
+    def close(self):
+        """Write the index, with the access times of cache hits."""
+        with self.lock:
+            self.write_index()
+
+    def read_index(self):
+        path = os.path.join(self.cache_folder, self.index_filename)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return {}
+
+    def write_index(self):
+        path = os.path.join(self.cache_folder, self.index_filename)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.rename(path + '.tmp', path)
+
+
+class DataframeCacheMixin(object):
+
+    """A mixin for classes that build dataframes from values_list querysets.
+
+    If `dataframe_cache` is set to a DataframeCache the dataframe is read from the cache."""
+
+    dataframe_cache = None
+
+    def queryset_to_dataframe(self, qs, columns):
+        """Return a dataframe of values_list queryset `qs`."""
+        if self.dataframe_cache is None:
+            return pd.DataFrame(list(qs), columns=columns)
+        return self.dataframe_cache.dataframe(qs, columns, survey_name=self.survey_name)
@@ -0,0 +1,80 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from django.core.management.color import color_style
+from django.utils import six
+
+style = color_style()
+
+# pandas 2 parses strings in the format of the first string unless told formats are mixed
+to_datetime_kwargs = {'format': 'mixed'} if int(pd.__version__.split('.')[0]) >= 2 else {}
+
+# smallest first
+nullable_int_dtypes = [('Int8', np.int8), ('Int16', np.int16), ('Int32', np.int32), ('Int64', np.int64)]
+
+
+def nullable_int_dtype(values):
+    """Return the name of the smallest nullable integer dtype that holds the values or None."""
+    for name, dtype in nullable_int_dtypes:
+        if values.min() >= np.iinfo(dtype).min and values.max() <= np.iinfo(dtype).max:
+            return name
+    return None
+
+
+def to_dates(values):
+    """Return an object series of the values, datetimes, dates or date strings, as dates.
+
+    Converts the whole column at once: tz-aware datetimes are converted to UTC and made
+    naive, like the datetimes of EdcModelToDataFrame, then truncated to the date.
+    Missing or invalid values become NaN, whatever the values, so compare dates only
+    where they are not null."""
+    datetimes = pd.to_datetime(values, errors='coerce', utc=True, **to_datetime_kwargs).dt.tz_convert(None)
+    dates = pd.Series(np.nan, index=datetimes.index, dtype=object)
+    valid = pd.notnull(datetimes)
+    dates[valid] = datetimes[valid].dt.date
+    return dates
+
+
+def compact_dtypes(df, name=None, categorical_threshold=None):
+    """Return a copy of the dataframe with smaller dtypes and report the memory saved.
+
+        * string columns where the ratio of unique values to rows is below
+          `categorical_threshold` (default 0.5) become categoricals, e.g. survey, community;
+        * float columns of whole numbers, e.g. coded answers mapped with yes_no, tf,
+          hiv_options or gender, become the smallest nullable integer (Int8 for codes),
+          if the version of pandas supports it, or else float32;
+        * integer columns are downcast to the smallest integer.
+
+    Nullable integers compare to NA where a value is missing, so only use the
+    compacted dataframe with code that does not compare values row by row.
+    """
+    categorical_threshold = categorical_threshold or 0.5
+    nullable_ints = hasattr(pd, 'Int64Dtype')
+    memory_before = df.memory_usage(deep=True).sum()
+    df = df.copy()
+    for column in df.columns:
+        values = df[column].dropna()
+        if values.empty:
+            continue
+        dtype = df[column].dtype
+        if dtype.kind == 'O' and str(dtype) != 'category':
+            if (values.map(lambda value: isinstance(value, six.string_types)).all() and
+                    values.nunique() < categorical_threshold * len(df)):
+                df[column] = df[column].astype('category')
+        elif dtype.kind == 'f' and (values == np.floor(values)).all():
+            int_dtype = nullable_int_dtype(values) if nullable_ints else None
+            if int_dtype:
+                df[column] = df[column].astype(int_dtype)
+            elif len(values) == len(df):
+                df[column] = pd.to_numeric(df[column], downcast='integer')
+            elif values.abs().max() <= 2 ** 24:
+                df[column] = df[column].astype(np.float32)
+        elif isinstance(dtype, np.dtype) and dtype.kind in 'iu':
+            df[column] = pd.to_numeric(df[column], downcast='integer' if dtype.kind == 'i' else 'unsigned')
+    memory_after = df.memory_usage(deep=True).sum()
+    sys.stdout.write(style.SQL_FIELD('Compacted {} dataframe from {:.1f} MB to {:.1f} MB, saving {:.1f} MB.\n'.format(
+        name or 'the', memory_before / 1024.0 ** 2, memory_after / 1024.0 ** 2,
+        (memory_before - memory_after) / 1024.0 ** 2)))
+    return df
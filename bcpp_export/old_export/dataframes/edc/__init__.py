@@ -4,3 +4,11 @@ from .edc_registered_subject import RegisteredSubject
 from .edc_aliquot import Aliquot
 from .edc_receive import Receive
 from .edc_model_to_dataframe import EdcModelToDataFrame
+from .edc_frames import EdcFrames
+
+edc_frames = EdcFrames()
+edc_frames.register('clinic_consent', ClinicConsent)
+edc_frames.register('subject_consent', SubjectConsent)
+edc_frames.register('requisition', Requisition)
+edc_frames.register('registered_subject', RegisteredSubject)
+edc_frames.register('receive', Receive)
@@ -6,6 +6,8 @@ from sqlalchemy import create_engine
 from bcpp_export import urls  # DO NOT DELETE
 from bhp066.apps.bcpp_lab.models import Aliquot as EdcAliquot, Receive, SubjectRequisition, ClinicRequisition
 
+from .edc_model_columns import model_columns
+
 
 class Aliquot(object):
 
@@ -23,11 +25,7 @@ class Aliquot(object):
         return columns
 
     def aliquot(self):
-        qs = EdcAliquot.objects.all()
-        columns = qs[0].__dict__.keys()
-        columns = self.safe_remove(columns, '_state')
-        columns = self.safe_remove(columns, '_user_container_instance')
-        columns = self.safe_remove(columns, 'using')
+        columns = model_columns(EdcAliquot)
         columns = self.safe_remove(columns, 'id')
         columns = self.safe_remove(columns, 'subject_identifier')
         columns.append('receive__requisition_identifier')
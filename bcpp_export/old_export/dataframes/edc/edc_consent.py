@@ -7,13 +7,16 @@ from bcpp_export import urls  # DO NOT DELETE
 from bhp066.apps.bcpp_clinic.models import ClinicConsent as EdcClinicConsent
 from bhp066.apps.bcpp_subject.models import SubjectConsent as EdcSubjectConsent
 
+from .edc_model_columns import model_columns
+
 
 class ClinicConsent(object):
     """ df_clinic = ClinicConsent().df """
+
+    models = [EdcClinicConsent]
+
     def __init__(self):
-        qs = EdcClinicConsent.objects.all()
-        columns = qs[0].__dict__.keys()
-        columns.remove('_state')
+        columns = model_columns(EdcClinicConsent)
         columns.append('household_member__household_structure__survey__survey_slug')
         columns.append('household_member__household_structure__household__plot__community')
         qs = EdcClinicConsent.objects.values_list(*columns).all()
@@ -36,12 +39,11 @@ class ClinicConsent(object):
 
 class SubjectConsent(object):
     """ df_subject = SubjectConsent().df """
+
+    models = [EdcSubjectConsent]
+
     def __init__(self):
-        qs = EdcSubjectConsent.objects.all()
-        columns = qs[0].__dict__.keys()
-        columns.remove('_state')
-        columns.remove('_user_container_instance')
-        columns.remove('using')
+        columns = model_columns(EdcSubjectConsent)
         columns.append('household_member__household_structure__survey__survey_slug')
         columns.append('household_member__household_structure__household__plot__community')
         qs = EdcSubjectConsent.objects.values_list(*columns).all()
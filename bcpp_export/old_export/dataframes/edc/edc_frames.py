@@ -0,0 +1,69 @@
+import threading
+
+from .edc_model_to_dataframe import EdcModelToDataFrame
+from .edc_watermark import model_watermark
+
+
+class EdcFrames(object):
+
+    """A process-level registry of EDC reference frames shared by Lis, VlRecon and
+    the working scripts.
+
+    A frame is loaded on first access and handed to every consumer until the watermark
+    of its models (row count, max pk and max modified) changes, then it is loaded again.
+
+        from bcpp_export.dataframes.edc import edc_frames
+        df_clinic_consent = edc_frames.get('clinic_consent').df
+        df_panel = edc_frames.model_dataframe(Panel)
+
+    Frames are shared, so copy a dataframe before changing it.
+    """
+
+    def __init__(self):
+        self.loaders = {}
+        self.frames = {}
+        self.lock = threading.RLock()
+
+    def register(self, name, loader, models=None):
+        """Register a callable that returns the frame, e.g. ClinicConsent, invalidated on
+        changes to `models`, by default the loader's `models` attribute."""
+        with self.lock:
+            self.loaders[name] = (loader, models or loader.models)
+            self.frames.pop(name, None)
+
+    def get(self, name):
+        """Return the frame, loaded if not loaded or if its models have changed since."""
+        try:
+            loader, models = self.loaders[name]
+        except KeyError:
+            raise TypeError('Invalid EDC frame. Expected one of {}. Got {}'.format(
+                sorted(self.loaders), name))
+        with self.lock:
+            watermark = self.watermark(models)
+            try:
+                frame_watermark, frame = self.frames[name]
+            except KeyError:
+                frame_watermark, frame = None, None
+            if frame_watermark != watermark:
+                frame = loader()
+                self.frames[name] = (watermark, frame)
+            return frame
+
+    def model_dataframe(self, model, add_columns_for=None):
+        """Return the EdcModelToDataFrame dataframe of the model, registered on first access."""
+        name = '{}.{}:{}'.format(model._meta.app_label, model._meta.model_name, add_columns_for or '')
+        if name not in self.loaders:
+            self.register(
+                name, lambda: EdcModelToDataFrame(model, add_columns_for=add_columns_for).dataframe, [model])
+        return self.get(name)
+
+    def watermark(self, models):
+        return [model_watermark(model) for model in models]
+
+    def invalidate(self, name=None):
+        """Drop the frame, or all frames, so it is loaded again on next access."""
+        with self.lock:
+            if name:
+                self.frames.pop(name, None)
+            else:
+                self.frames = {}
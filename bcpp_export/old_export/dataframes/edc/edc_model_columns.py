@@ -0,0 +1,12 @@
+model_columns_cache = {}
+
+
+def model_columns(model):
+    """Return a new list of the model's column names, the attname of each concrete field,
+    e.g. 'panel_id' for a foreign key to Panel.
+
+    The names come from the model's metadata, cached per model, so no query is needed
+    and an empty table still has columns."""
+    if model not in model_columns_cache:
+        model_columns_cache[model] = [field.attname for field in model._meta.concrete_fields]
+    return list(model_columns_cache[model])
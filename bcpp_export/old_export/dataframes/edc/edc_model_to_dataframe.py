@@ -1,20 +1,78 @@
 import pandas as pd
 import numpy as np
+
+from multiprocessing import Pool
+
+from django.db import connection
+from django.db.models import get_model
+
 from bcpp_export import urls  # DO NOT DELETE
 
+from .edc_model_columns import model_columns
+
+
+def decrypt(field, values):
+    """Return a list of the values decrypted by the encrypted field."""
+    return [field.to_python(value) for value in values]
+
+
+def _decrypt(args):
+    app_label, model_name, field_name, values = args
+    return decrypt(get_model(app_label, model_name)._meta.get_field(field_name), values)
+
+
+def decrypt_values(field, values, batch_size=None, processes=None):
+    """Return a list of the values decrypted by the encrypted field, in batches of
+    `batch_size`, on a pool of `processes` processes if more than one."""
+    batch_size = batch_size or 1000
+    batches = [values[start:start + batch_size] for start in range(0, len(values), batch_size)]
+    if processes and processes > 1 and len(batches) > 1:
+        # each process opens its own connection
+        connection.close()
+        pool = Pool(processes)
+        try:
+            decrypted = pool.map(_decrypt, [
+                (field.model._meta.app_label, field.model._meta.model_name, field.name, batch)
+                for batch in batches])
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        decrypted = [decrypt(field, batch) for batch in batches]
+    return [value for batch in decrypted for value in batch]
+
 
 class EdcModelToDataFrame(object):
     """
         e = EdcModelToDataFrame(ClinicVlResult, add_columns_for='clinic_visit')
         my_df = e.dataframe
+
+    For models with encrypted fields, the ciphertext is selected with values_list and
+    each unique value of an encrypted column is decrypted once, in batches of
+    `decrypt_batch_size`, on a pool of `processes` processes if more than one. Set
+    `bulk_decrypt=False` to decrypt model instance by instance instead.
+
+    To read a large table without holding the whole result in memory, iterate over
+    chunks of the table instead:
+
+        for df in EdcModelToDataFrame.chunks(Aliquot, chunksize=50000):
+            ...
     """
 
-    def __init__(self, model=None, queryset=None, query_filter=None, add_columns_for=None):
+    def __init__(self, model=None, queryset=None, query_filter=None, add_columns_for=None,
+                 bulk_decrypt=None, decrypt_batch_size=None, processes=None):
         query_filter = query_filter or {}
-        qs = queryset or model.objects.all()
+        qs = model.objects.all() if queryset is None else queryset
         self.model = model or qs.model
+        self.bulk_decrypt = False if bulk_decrypt is False else True
+        self.decrypt_batch_size = decrypt_batch_size
+        self.processes = processes
         columns = self.columns(qs, add_columns_for)
-        if self.has_encrypted_fields:
+        if self.has_encrypted_fields and self.bulk_decrypt:
+            qs = qs.values_list(*columns.keys()).filter(**query_filter)
+            self.dataframe = pd.DataFrame(list(qs), columns=columns.keys())
+            self.decrypt_dataframe(self.dataframe)
+        elif self.has_encrypted_fields:
             qs = qs.filter(**query_filter)
             self.dataframe = pd.DataFrame(
                 [[getattr(obj, key) for key in columns]
@@ -28,6 +86,36 @@ class EdcModelToDataFrame(object):
             self.dataframe[column] = self.dataframe[
                 column].astype('datetime64[ns]')
 
+    @classmethod
+    def chunks(cls, model=None, queryset=None, query_filter=None, chunksize=None, store=None, **kwargs):
+        """Yield the dataframe of the model in chunks of `chunksize` rows, paged by primary
+        key (pk > last pk of the previous chunk, not OFFSET), each appended to the columnar
+        `store`, e.g. a ColumnarChunkStore, if given. The store is cleared first, as for
+        read_sql.
+
+        Other keyword arguments are passed to EdcModelToDataFrame."""
+        qs = model.objects.all() if queryset is None else queryset
+        model = model or qs.model
+        pk = model._meta.pk.attname
+        qs = qs.filter(**(query_filter or {})).order_by('pk')
+        chunksize = chunksize or 10000
+        if store is not None:
+            store.clear()
+        last_pk = None
+        while True:
+            chunk_qs = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+            df = cls(model, queryset=chunk_qs[:chunksize], **kwargs).dataframe
+            if df.empty:
+                break
+            if store is not None:
+                store.append(df)
+            yield df
+            if len(df) < chunksize:
+                break
+            last_pk = df[pk].iloc[-1]
+            # a numpy scalar is not a valid query parameter
+            last_pk = last_pk.item() if hasattr(last_pk, 'item') else last_pk
+
     @property
     def has_encrypted_fields(self):
         for field in self.model._meta.fields:
@@ -35,10 +123,19 @@ class EdcModelToDataFrame(object):
                 return True
         return False
 
+    def decrypt_dataframe(self, df):
+        """Decrypt the encrypted columns of the dataframe in place, each unique
+        ciphertext once."""
+        for field in self.model._meta.fields:
+            if hasattr(field, 'field_cryptor') and field.attname in df.columns:
+                values = list(pd.unique(df[field.attname].dropna()))
+                decrypted = decrypt_values(
+                    field, values, batch_size=self.decrypt_batch_size, processes=self.processes)
+                df[field.attname] = df[field.attname].map(dict(zip(values, decrypted)))
+
     def columns(self, qs, add_columns_for):
         """ """
-        columns = qs[0].__dict__.keys()
-        columns = self.remove_sys_columns(columns)
+        columns = model_columns(qs.model)
         columns = dict(zip(columns, columns))
         if add_columns_for in columns or '{}_id'.format(add_columns_for) in columns:
             if add_columns_for.endswith('_visit'):
@@ -75,12 +172,3 @@ class EdcModelToDataFrame(object):
 #                     'appointment__visit_definition__code':
 #                     'visit_code'})
         return columns
-
-    def remove_sys_columns(self, columns):
-        names = ['_state', '_user_container_instance', 'using']
-        for name in names:
-            try:
-                columns.remove(name)
-            except ValueError:
-                pass
-        return columns
@@ -6,15 +6,15 @@ from sqlalchemy import create_engine
 from bcpp_export import urls  # DO NOT DELETE
 from bhp066.apps.bcpp_lab.models import Receive as EdcReceive
 
+from .edc_model_columns import model_columns
+
 
 class Receive(object):
 
+    models = [EdcReceive]
+
     def __init__(self):
-        qs = EdcReceive.objects.all()
-        columns = qs[0].__dict__.keys()
-        columns = self.safe_remove(columns, '_state')
-        columns = self.safe_remove(columns, '_user_container_instance')
-        columns = self.safe_remove(columns, 'using')
+        columns = model_columns(EdcReceive)
         columns = self.safe_remove(columns, 'id')
         columns = self.safe_remove(columns, 'subject_identifier')
         columns.append('registered_subject__subject_identifier')
@@ -7,14 +7,15 @@ from bcpp_export import urls  # DO NOT DELETE
 from bcpp_export.identity256 import identity
 from edc.subject.registration.models import RegisteredSubject as EdcRegisteredSubject
 
+from .edc_model_columns import model_columns
+
 
 class RegisteredSubject(object):
+
+    models = [EdcRegisteredSubject]
+
     def __init__(self):
-        qs = EdcRegisteredSubject.objects.all()
-        columns = qs[0].__dict__.keys()
-        columns.remove('_state')
-        columns.remove('_user_container_instance')
-        columns.remove('using')
+        columns = model_columns(EdcRegisteredSubject)
         qs = EdcRegisteredSubject.objects.values_list(*columns).all()
         df = pd.DataFrame(list(qs), columns=columns)
         for column in list(df.select_dtypes(include=['datetime64[ns, UTC]']).columns):
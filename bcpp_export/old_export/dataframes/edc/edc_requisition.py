@@ -6,9 +6,13 @@ from tabulate import tabulate
 from bcpp_export import urls  # DO NOT DELETE
 from bhp066.apps.bcpp_lab.models import SubjectRequisition, ClinicRequisition
 
+from .edc_model_columns import model_columns
+
 
 class Requisition(object):
 
+    models = [SubjectRequisition, ClinicRequisition]
+
     def __init__(self):
         self.subject = self.requisition_df(SubjectRequisition, 'subject_visit')
         self.subject['requisition_source'] = 'subject'
@@ -34,11 +38,7 @@ class Requisition(object):
             '[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}')
 
     def requisition_df(self, model, visit_model_name):
-        qs = model.objects.all()
-        columns = qs[0].__dict__.keys()
-        columns.remove('_state')
-        columns.remove('_user_container_instance')
-        columns.remove('using')
+        columns = model_columns(model)
         columns.remove('subject_identifier')
         columns.remove('community')
         columns.append('{}__household_member__household_structure__survey__survey_slug'.format(visit_model_name))
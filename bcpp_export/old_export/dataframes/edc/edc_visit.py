@@ -3,15 +3,13 @@ from bcpp_export import urls  # DO NOT DELETE
 
 from bhp066.apps.bcpp_subject.models import SubjectConsent, SubjectVisit, HicEnrollment
 
+from bcpp_export.dataframes.edc.edc_model_columns import model_columns
+
 # subject visit
-qs = SubjectVisit.objects.all()
-columns = qs[0].__dict__.keys()
+columns = model_columns(SubjectVisit)
 columns.append('household_member__household_structure__household__plot__community')
 columns.append('household_member__household_structure__survey__survey_slug')
 columns.append('appointment__visit_definition__code')
-columns.remove('_state')
-columns.remove('_user_container_instance')
-columns.remove('using')
 columns.remove('subject_identifier')
 qs = SubjectVisit.objects.values_list(*columns).all()
 df_subject_visit = pd.DataFrame(list(qs), columns=columns)
@@ -23,14 +21,10 @@ df_subject_visit.rename(columns={
 }, inplace=True)
 
 # hic enrollment
-qs = HicEnrollment.objects.all()
-columns = qs[0].__dict__.keys()
+columns = model_columns(HicEnrollment)
 columns.append('subject_visit__household_member__household_structure__household__plot__community')
 columns.append('subject_visit__household_member__household_structure__survey__survey_slug')
 columns.append('subject_visit__appointment__visit_definition__code')
-columns.remove('_state')
-columns.remove('_user_container_instance')
-columns.remove('using')
 qs = HicEnrollment.objects.values_list(*columns).all()
 df_hic_enrollment = pd.DataFrame(list(qs), columns=columns)
 df_hic_enrollment.rename(columns={
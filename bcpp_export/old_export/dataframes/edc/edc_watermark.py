@@ -0,0 +1,16 @@
+from django.db.models import Count, Max
+
+
+def model_watermark(model):
+    """Return the watermark of the model's table: its row count, max pk and max modified.
+
+    max_pk and max_modified are strings, or None if the table is empty. max_modified
+    is None for models without a `modified` field."""
+    aggregates = {'count': Count('pk'), 'max_pk': Max('pk')}
+    if 'modified' in [field.name for field in model._meta.fields]:
+        aggregates['max_modified'] = Max('modified')
+    values = model.objects.aggregate(**aggregates)
+    return {
+        'count': values['count'],
+        'max_pk': None if values.get('max_pk') is None else str(values['max_pk']),
+        'max_modified': None if values.get('max_modified') is None else str(values['max_modified'])}
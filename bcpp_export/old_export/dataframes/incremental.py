@@ -0,0 +1,79 @@
+import os
+import pickle
+
+import pandas as pd
+
+
+def filter_in(qs, lookup, values):
+    """Return the queryset filtered on `lookup`__in `values` or the queryset
+    unchanged if `values` is None."""
+    if values is None:
+        return qs
+    return qs.filter(**{'{}__in'.format(lookup): list(values)})
+
+
+def modified_values(model, since, lookup, **filters):
+    """Return a set of the `lookup` values of model instances modified after `since`."""
+    return set(model.objects.filter(modified__gt=since, **filters).values_list(lookup, flat=True))
+
+
+def replace_rows(previous, updated, column, values):
+    """Return the previous dataframe with rows where `column` is in `values` replaced
+    by the rows of the updated dataframe."""
+    if previous.empty:
+        return updated.reset_index(drop=True)
+    df = previous[~previous[column].isin(values)]
+    if updated.empty:
+        return df.reset_index(drop=True)
+    return pd.concat([df, updated], ignore_index=True)
+
+
+class ExportSnapshot(object):
+
+    """The dataframes and `modified` watermark of the last export of a survey, kept as
+    pickles in `snapshot_folder`.
+
+    The watermark is the time the last export started."""
+
+    snapshot_names = ['subjects', 'members', 'households', 'plots']
+
+    def __init__(self, snapshot_folder, survey_name):
+        self.snapshot_folder = os.path.expanduser(snapshot_folder)
+        self.survey_name = survey_name
+        if not os.path.exists(self.snapshot_folder):
+            os.makedirs(self.snapshot_folder)
+
+    def path(self, name):
+        return os.path.join(self.snapshot_folder, '{}_{}.pkl'.format(self.survey_name, name))
+
+    @property
+    def exists(self):
+        return all([os.path.exists(self.path(name)) for name in self.snapshot_names + ['watermark']])
+
+    @property
+    def watermark(self):
+        try:
+            with open(self.path('watermark'), 'rb') as f:
+                return pickle.load(f)
+        except IOError:
+            return None
+
+    def read(self, name):
+        try:
+            return pd.read_pickle(self.path(name))
+        except IOError:
+            return pd.DataFrame()
+
+    def write(self, watermark, **dataframes):
+        """Write each dataframe and then the watermark, each through a temp file.
+
+        The previous watermark is removed first, so an interrupted write leaves no
+        snapshot and the next export is a full export."""
+        if os.path.exists(self.path('watermark')):
+            os.remove(self.path('watermark'))
+        for name in self.snapshot_names:
+            dataframes[name].to_pickle(self.path(name) + '.tmp')
+            os.rename(self.path(name) + '.tmp', self.path(name))
+        with open(self.path('watermark') + '.tmp', 'wb') as f:
+            pickle.dump(watermark, f)
+        os.rename(self.path('watermark') + '.tmp', self.path('watermark'))
@@ -1,2 +1,3 @@
 from .lis import Lis
 from .storage import Storage
+from .lis_mirror import LisMirror
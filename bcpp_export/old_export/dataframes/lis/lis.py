@@ -5,17 +5,36 @@ import numpy as np
 from sqlalchemy import create_engine
 from tabulate import tabulate
 from bcpp_export import urls  # DO NOT DELETE
-from bcpp_export.undash import undash
 from bcpp_export.private_settings import Lis as LisCredentials
-from bcpp_export.dataframes.edc import ClinicConsent
-from bcpp_export.dataframes.edc.edc_requisition import Requisition
-from bcpp_export.dataframes.edc.edc_registered_subject import RegisteredSubject
+from bcpp_export.dataframes.edc import edc_frames
+from bcpp_export.dataframes.columnar_writers import ColumnarChunkStore
+from .read_sql import read_sql
+from .subject_identifier_resolver import SubjectIdentifierResolver, identifier_lookup
+
+result_pattern = re.compile(r'[<>*=]')
+aliquot_identifier_pattern = re.compile(r'^066\w+[0-9]{4}$')
 
 
 class Lis(object):
 
+    """LIS results for the protocol.
+
+    Set `chunksize` to read the results in chunks, each normalized as it is read, and
+    `store_folder` to write the normalized chunks to parquet files in the folder
+    instead of holding them in memory until all are read.
+
+    Set `mirror` to a LisMirror to sync only new results to the local mirror and
+    build from the mirror, or with `offline` to build from the mirror without syncing."""
+
     def __init__(self, df=pd.DataFrame(), engine=None, protocol=None,
-                 protocol_prefix=None, df_currentstudyparticipant=pd.DataFrame()):
+                 protocol_prefix=None, df_currentstudyparticipant=pd.DataFrame(),
+                 chunksize=None, store_folder=None, mirror=None, offline=None):
+        self.protocol = protocol or 'BHP066'
+        self.protocol_prefix = protocol_prefix or '066'
+        self.chunksize = chunksize
+        self.store_folder = store_folder
+        self.mirror = mirror
+        self.offline = True if offline is True else False
         if not df.empty:
             self.results = df
         else:
@@ -23,17 +42,11 @@ class Lis(object):
                 user=LisCredentials.user, passwd=LisCredentials.password,
                 host=LisCredentials.host, port=LisCredentials.port,
                 db=LisCredentials.name))
-            self.protocol = protocol or 'BHP066'
-            self.protocol_prefix = protocol_prefix or '066'
             self.results = self.fetch_results_as_dataframe()
-            self.df_clinic_consent = ClinicConsent().df
-            self.requisition = Requisition()
-            self.update_final_subject_identifier_from_lab_identifier()
-            self.update_final_subject_identifier_from_htc_identifier()
-            self.update_final_subject_identifier_from_requisitions()
-            self.update_final_subject_identifier_from_identity()
+            self.df_clinic_consent = edc_frames.get('clinic_consent').df
+            self.requisition = edc_frames.get('requisition')
+            self.resolve_final_subject_identifier(df_currentstudyparticipant)
             self.update_edc_specimen_identifier_from_requisition()
-            self.update_final_subject_identifier_from_cdc(df_currentstudyparticipant)
             # self.update_edc_specimen_identifier_from_receive()
             self.update_requisition_columns()
 
@@ -87,28 +100,39 @@ class Lis(object):
                 'drawn', 'result'])
 
     def fetch_results_as_dataframe(self, edc_panels=None):
-        with self.engine.connect() as conn, conn.begin():
-            df = pd.read_sql_query(self.sql_results, conn)
+        if self.mirror is not None:
+            if not self.offline:
+                self.mirror.sync(self.engine, self.sql_results, self.sql_results_since, chunksize=self.chunksize)
+            return self.normalize_results(self.mirror.read())
+        if self.store_folder and self.chunksize:
+            store = ColumnarChunkStore(self.store_folder, 'lis_results')
+            return read_sql(self.engine, self.sql_results, chunksize=self.chunksize,
+                            store=store, normalize=self.normalize_results).read()
+        return read_sql(self.engine, self.sql_results, chunksize=self.chunksize, normalize=self.normalize_results)
+
+    def normalize_results(self, df):
+        """Return the LIS results with the result cleaned, datetimes converted and
+        the aliquot, edc specimen and subject identifiers derived, a column at a time."""
         df.fillna(value=np.nan, inplace=True)
-        df['result'] = df['result'].str.replace('<', '')
-        df['result'] = df['result'].str.replace('>', '')
-        df['result'] = df['result'].str.replace('*', '')
-        df['result'] = df['result'].str.replace('=', '')
-        df['result'] = df.apply(
-            lambda row: np.nan if row['result'] == '' else row['result'], axis=1)
+        df['result'] = df['result'].str.replace(result_pattern, '', regex=True)
+        df['result'] = df['result'].where(df['result'] != '', np.nan)
         # df['result_float'] = df[df['result'].str.contains('\d+')]['result'].astype(float, na=False)
         for column in list(df.select_dtypes(include=['datetime64[ns, UTC]']).columns):
             df[column] = df[column].astype('datetime64[ns]')
         df['result_datetime'] = pd.to_datetime(df['result_datetime'])
         df['received_datetime'] = pd.to_datetime(df['received_datetime'])
-        df['drawn_datetime'] = pd.to_datetime(df['drawn_datetime'])
-        df['drawn_datetime'] = pd.to_datetime(df['drawn_datetime'].dt.date)
-        df['specimen_identifier'] = df.apply(lambda row: np.nan if row['specimen_identifier'] == 'NA' else row['specimen_identifier'], axis=1)
-        df['aliquot_identifier'] = df.apply(lambda row: self.aliquot_identifier(row), axis=1)
-        df['edc_specimen_identifier'] = df.apply(lambda row: self.edc_specimen_identifier(row, self.protocol_prefix), axis=1)
-        df['subject_identifier'] = df.apply(lambda row: undash(row['subject_identifier'], '^{}-'.format(self.protocol_prefix)), axis=1)
-        df['final_subject_identifier'] = df[df['subject_identifier'].str.startswith('{}-'.format(self.protocol_prefix))]['subject_identifier']
-        df['final_subject_identifier_source'] = df.apply(lambda row: np.nan if pd.isnull(row['final_subject_identifier']) else 'lis', axis=1)
+        df['drawn_datetime'] = pd.to_datetime(df['drawn_datetime']).dt.floor('D')
+        df['specimen_identifier'] = df['specimen_identifier'].where(df['specimen_identifier'] != 'NA', np.nan)
+        df['aliquot_identifier'] = self.aliquot_identifier(df)
+        df['edc_specimen_identifier'] = self.edc_specimen_identifier(df, self.protocol_prefix)
+        subject_identifier = df['subject_identifier'].astype(object)
+        df['subject_identifier'] = subject_identifier.where(
+            subject_identifier.str.startswith('{}-'.format(self.protocol_prefix), na=False),
+            subject_identifier.str.replace('-', ''))
+        df['final_subject_identifier'] = df['subject_identifier'].where(
+            df['subject_identifier'].str.startswith('{}-'.format(self.protocol_prefix), na=False))
+        df['final_subject_identifier_source'] = pd.Series('lis', index=df.index).where(
+            pd.notnull(df['final_subject_identifier']))
         return df
 
     @property
@@ -123,120 +147,52 @@ class Lis(object):
         left join BHPLAB.DBO.LAB21ResponseQ001X0 as L21D on L21D.QID1X0=L21.Q001X0
         where sample_protocolnumber='BHP066'"""
 
+    def sql_results_since(self, received_datetime, result_datetime):
+        """Return the results query for all rows of PIDs received or resulted since the given datetimes."""
+        conditions = ['{} >= \'{}\''.format(column, value) for column, value in [
+            ('L.headerdate', received_datetime), ('L21D.sample_assay_date', result_datetime)] if value]
+        return """{sql_results}
+        and L.PID in (select L.PID from BHPLAB.DBO.LAB01Response as L
+        left join BHPLAB.DBO.LAB21Response as L21 ON L21.PID=L.PID
+        left join BHPLAB.DBO.LAB21ResponseQ001X0 as L21D on L21D.QID1X0=L21.Q001X0
+        where sample_protocolnumber='BHP066' and ({conditions}))""".format(
+            sql_results=self.sql_results, conditions=' or '.join(conditions))
+
     @property
     def sql_getresults(self):
         return """SELECT * FROM "getresults_dst_history"""
 
-    def update_final_subject_identifier_from_lab_identifier(self):
-        """Matches lab_identifier from clinic consent to lis.subject_identifier."""
-        df = pd.merge(self.results[pd.isnull(self.results['final_subject_identifier'])],
-                      self.df_clinic_consent[['subject_identifier', 'lab_identifier']],
-                      left_on='subject_identifier',
-                      right_on='lab_identifier',
-                      suffixes=['', '_edc'])[['subject_identifier', 'subject_identifier_edc']]
-        df.rename(columns={'subject_identifier_edc': 'final_subject_identifier'}, inplace=True)
-        df['final_subject_identifier_source'] = 'clinic_consent (lab id)'
-        df.drop_duplicates(inplace=True)
-        df.set_index('subject_identifier', inplace=True)
-        self.results.set_index('subject_identifier', inplace=True)
-        self.results = self.results.combine_first(df)
-        self.results.reset_index(inplace=True)
-
-    def update_final_subject_identifier_from_htc_identifier(self):
-        """Matches htc_identifier from clinic consent to lis.subject_identifier."""
-        df = pd.merge(self.results[pd.isnull(self.results['final_subject_identifier'])],
-                      self.df_clinic_consent[['subject_identifier', 'htc_identifier']],
-                      left_on='subject_identifier',
-                      right_on='htc_identifier',
-                      suffixes=['', '_edc'])[['subject_identifier', 'subject_identifier_edc']]
-        df.rename(columns={'subject_identifier_edc': 'final_subject_identifier'}, inplace=True)
-        df['final_subject_identifier_source'] = 'clinic_consent (htc id)'
-        df.drop_duplicates(inplace=True)
-        df.set_index('subject_identifier', inplace=True)
-        self.results.set_index('subject_identifier', inplace=True)
-        self.results = self.results.combine_first(df)
-        self.results.reset_index(inplace=True)
-
-    def update_final_subject_identifier_from_requisitions(self):
-        # find with lis_identifier > 7 but no subject identifier
-        # assume are edc specimen identifiers or aliquot numbers
+    def resolve_final_subject_identifier(self, df_currentstudyparticipant):
+        """Resolve final_subject_identifier from clinic consent lab and htc identifiers,
+        EDC requisitions, registered subject identity and, if given, CDC htc and ccc
+        identifiers, in that order, in one pass."""
+        resolver = SubjectIdentifierResolver()
+        resolver.add_source('clinic_consent (lab id)', identifier_lookup(self.df_clinic_consent, 'lab_identifier'))
+        resolver.add_source('clinic_consent (htc id)', identifier_lookup(self.df_clinic_consent, 'htc_identifier'))
         for df_req in [self.requisition.subject, self.requisition.clinic]:
-            df = self.results[
-                pd.isnull(self.results['final_subject_identifier']) &
-                ~(self.results['subject_identifier'].str.startswith('K')) &
-                (self.results['lis_identifier'].str.len() > 7)][['lis_identifier']]
-            df['edc_specimen_identifier'] = df['lis_identifier'].str[0:12]
-            df.drop_duplicates(inplace=True)
-            df = pd.merge(df, df_req[['edc_specimen_identifier', 'subject_identifier']],
-                          on='edc_specimen_identifier',
-                          how='inner',
-                          suffixes=['', '_edc'])[['lis_identifier', 'subject_identifier']]
-            df.rename(columns={'subject_identifier': 'final_subject_identifier'}, inplace=True)
-            df['final_subject_identifier_source'] = 'edc requisition'
-            df.drop_duplicates(inplace=True)
-            df.set_index('lis_identifier', inplace=True)
-            self.results.set_index('lis_identifier', inplace=True)
-            self.results = self.results.combine_first(df)
-            self.results.reset_index(inplace=True)
-
-    def update_final_subject_identifier_from_identity(self):
-        df_rs = RegisteredSubject().df
-        df = pd.merge(self.results[pd.isnull(self.results['final_subject_identifier'])],
-                      df_rs[['subject_identifier', 'identity']],
-                      left_on='subject_identifier',
-                      right_on='identity',
-                      suffixes=['', '_edc'])[['subject_identifier', 'subject_identifier_edc']]
-        df.rename(columns={'subject_identifier_edc': 'final_subject_identifier'}, inplace=True)
-        df['final_subject_identifier_source'] = 'edc registered_subject'
-        df.drop_duplicates(inplace=True)
-        df.set_index('subject_identifier', inplace=True)
-        self.results.set_index('subject_identifier', inplace=True)
-        self.results = self.results.combine_first(df)
-        self.results.reset_index(inplace=True)
-
-    def update_final_subject_identifier_from_cdc(self, df_currentstudyparticipant):
-        """Update identifier from CDC HTC data."""
+            # lis_identifier > 7 but no subject identifier, assume are edc specimen identifiers or aliquot numbers
+            resolver.add_source(
+                'edc requisition', identifier_lookup(df_req, 'edc_specimen_identifier'),
+                keys=self.requisition_keys)
+        identity_lookup = identifier_lookup(edc_frames.get('registered_subject').df, 'identity')
+        resolver.add_source('edc registered_subject', identity_lookup)
         if not df_currentstudyparticipant.empty:
-            df = df_currentstudyparticipant
-            df['htcid'].fillna(value=np.nan, inplace=True)
-            df['htcid'] = df.apply(lambda row: undash(row['htcid']), axis=1)
-            df['ssid'].fillna(value=np.nan, inplace=True)
-            df['ssid'] = df.apply(lambda row: undash(row['ssid']), axis=1)
+            df = df_currentstudyparticipant.copy()
+            df['htcid'] = df['htcid'].astype(object).str.replace('-', '')
+            df['ssid'] = df['ssid'].astype(object).str.replace('-', '')
             df = df.replace('unk', np.nan)
             df = df[pd.notnull(df['omangnumber'])]
-            self.df_htc = df.copy()
-            self.df_htc = self.df_htc.rename(columns={'htcid': 'subject_identifier_cdc', 'omangnumber': 'identity'})
-            self.df_htc = pd.merge(
-                self.results[pd.isnull(self.results['final_subject_identifier'])],
-                self.df_htc[['subject_identifier_cdc', 'identity']],
-                left_on='subject_identifier',
-                right_on='subject_identifier_cdc',
-                suffixes=['', '_cdc'])[['subject_identifier', 'subject_identifier_cdc']]
-            self.df_htc.rename(columns={'subject_identifier_edc': 'final_subject_identifier'}, inplace=True)
-            self.df_htc['final_subject_identifier_source'] = 'cdc (htc)'
-            self.df_htc.drop_duplicates(inplace=True)
-            self.df_htc.set_index('subject_identifier', inplace=True)
-            self.results.set_index('subject_identifier', inplace=True)
-            self.results = self.results.combine_first(self.df_htc)
-            self.results.reset_index(inplace=True)
-            self.df_htc.reset_index(inplace=True)
+            # CDC identifiers resolve through the omang to the registered subject
+            for name, column in [('cdc (htc)', 'htcid'), ('cdc (ccc)', 'ssid')]:
+                resolver.add_source(name, identifier_lookup(df, column, 'omangnumber').map(identity_lookup).dropna())
+        self.results = resolver.resolve(self.results)
 
-            self.df_ccc = df.copy()
-            self.df_ccc = self.df_ccc.rename(columns={'ssid': 'subject_identifier_cdc', 'omangnumber': 'identity'})
-            self.df_ccc = pd.merge(
-                self.results[pd.isnull(self.results['final_subject_identifier'])],
-                self.df_ccc[['subject_identifier_cdc', 'identity']],
-                left_on='subject_identifier',
-                right_on='subject_identifier_cdc',
-                suffixes=['', '_cdc'])[['subject_identifier', 'subject_identifier_cdc']]
-            self.df_ccc.rename(columns={'subject_identifier_edc': 'final_subject_identifier'}, inplace=True)
-            self.df_ccc['final_subject_identifier_source'] = 'cdc (ccc)'
-            self.df_ccc.drop_duplicates(inplace=True)
-            self.df_ccc.set_index('subject_identifier', inplace=True)
-            self.results.set_index('subject_identifier', inplace=True)
-            self.results = self.results.combine_first(self.df_ccc)
-            self.results.reset_index(inplace=True)
-            self.df_ccc.reset_index(inplace=True)
+    def requisition_keys(self, df):
+        """Return a series of the first 12 characters of the lis identifier, where longer
+        than 7 and the subject identifier is not a K number, to look up in requisitions."""
+        return df['lis_identifier'].astype(object).str[0:12].where(
+            ~(df['subject_identifier'].astype(object).str.startswith('K', na=False)) &
+            (df['lis_identifier'].astype(object).str.len() > 7))
 
     def update_requisition_columns(self):
         columns = ['edc_specimen_identifier', 'survey', 'visit_code',
@@ -253,32 +209,36 @@ class Lis(object):
 #         df_rs = RegisteredSubject().df
 
     def update_edc_specimen_identifier_from_requisition(self, edc_panels=None):
+        """Fill in missing edc_specimen_identifiers from requisitions of the same subject,
+        drawn date and panel.
+
+        A result's panel is one of panel_ids, so a single merge against the requisitions
+        of all the panels matches the same as a merge per panel."""
         edc_panels = edc_panels or {'610': 1, '401': 2, '974': 3, '201': 4, '101': 5}
-        self.results['edc_panel_id'] = self.results.apply(
-            lambda row: edc_panels.get(row['test_id'], 0) if pd.notnull(row['test_id']) else np.nan,
-            axis=1)
+        test_id = self.results['test_id']
+        self.results['edc_panel_id'] = np.where(
+            pd.isnull(test_id), np.nan, test_id.map(edc_panels).fillna(0))
         df_req = self.requisition.all[pd.notnull(self.requisition.all['edc_specimen_identifier'])].copy()
         df_req['requisition_datetime'] = pd.to_datetime(df_req['requisition_datetime'].dt.date)
         df_req = df_req[
             ~(df_req['edc_specimen_identifier'].isin(
                 self.results['edc_specimen_identifier']))]
         panel_ids = [1, 3, 4, 5, 2]
-        for panel_id in panel_ids:
-            self.results = pd.merge(
-                self.results,
-                df_req[df_req['panel_id'] == panel_id][
-                    ['edc_specimen_identifier', 'subject_identifier', 'requisition_datetime',
-                     'panel_id']],
-                how='left',
-                left_on=['final_subject_identifier', 'drawn_datetime', 'edc_panel_id'],
-                right_on=['subject_identifier', 'requisition_datetime', 'panel_id'],
-                suffixes=['', '_merge'])
-            self.results['edc_specimen_identifier'] = self.results.apply(
-                lambda row: self.fill_edc_specimen_identifier(row), axis=1)
-            self.results.drop(
-                ['edc_specimen_identifier_merge', 'subject_identifier_merge',
-                 'panel_id', 'requisition_datetime'],
-                axis=1, inplace=True)
+        self.results = pd.merge(
+            self.results,
+            df_req[df_req['panel_id'].isin(panel_ids)][
+                ['edc_specimen_identifier', 'subject_identifier', 'requisition_datetime',
+                 'panel_id']],
+            how='left',
+            left_on=['final_subject_identifier', 'drawn_datetime', 'edc_panel_id'],
+            right_on=['subject_identifier', 'requisition_datetime', 'panel_id'],
+            suffixes=['', '_merge'])
+        self.results['edc_specimen_identifier'] = self.results['edc_specimen_identifier'].fillna(
+            self.results['edc_specimen_identifier_merge'])
+        self.results.drop(
+            ['edc_specimen_identifier_merge', 'subject_identifier_merge',
+             'panel_id', 'requisition_datetime'],
+            axis=1, inplace=True)
 
     def update_final_subject_identifier(self, suffix=None, drop_column=None):
         suffix = suffix or '_edc'
@@ -296,12 +256,6 @@ class Lis(object):
                 final_subject_identifier = row['subject_identifier{}'.format(suffix)]
         return final_subject_identifier
 
-    def fill_edc_specimen_identifier(self, row):
-        if (pd.isnull(row['edc_specimen_identifier']) and
-                pd.notnull(row['edc_specimen_identifier_merge'])):
-            return row['edc_specimen_identifier_merge']
-        return row['edc_specimen_identifier']
-
     def other_identifier(self, row):
         if pd.notnull(row['htc_identifier']) and row['htc_identifier'].strip() != '':
             other_identifier = row['htc_identifier'].replace('-', '')
@@ -311,20 +265,20 @@ class Lis(object):
             other_identifier = np.nan
         return other_identifier
 
-    def edc_specimen_identifier(self, row, prefix):
-        edc_specimen_identifier = np.nan
-        if pd.notnull(row['aliquot_identifier']):
-            edc_specimen_identifier = row['aliquot_identifier'][0:12]
-        elif pd.notnull(row['specimen_identifier']):
-            if row['specimen_identifier'].startswith(prefix):
-                edc_specimen_identifier = row['specimen_identifier']
-        return edc_specimen_identifier
+    def edc_specimen_identifier(self, df, prefix):
+        """Return a series of the first 12 characters of the aliquot identifier or,
+        if none, the specimen identifier if it starts with `prefix`."""
+        aliquot_identifier = df['aliquot_identifier'].astype(object)
+        specimen_identifier = df['specimen_identifier'].astype(object)
+        return aliquot_identifier.str[0:12].where(
+            pd.notnull(aliquot_identifier),
+            specimen_identifier.where(specimen_identifier.str.startswith(prefix, na=False)))
 
-    def aliquot_identifier(self, row):
-        aliquot_identifier = np.nan
-        for column in ['lis_identifier', 'specimen_identifier']:
-            if pd.notnull(row[column]):
-                if re.match('^066\w+[0-9]{4}$', row[column]):
-                    aliquot_identifier = row[column]
-                    break
-        return aliquot_identifier
+    def aliquot_identifier(self, df):
+        """Return a series of the lis identifier or, if not, the specimen identifier
+        that looks like an aliquot identifier."""
+        lis_identifier = df['lis_identifier'].astype(object)
+        specimen_identifier = df['specimen_identifier'].astype(object)
+        return lis_identifier.where(
+            lis_identifier.str.contains(aliquot_identifier_pattern, na=False),
+            specimen_identifier.where(specimen_identifier.str.contains(aliquot_identifier_pattern, na=False)))
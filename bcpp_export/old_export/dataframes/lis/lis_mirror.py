@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pandas as pd
+
+from django.core.management.color import color_style
+from sqlalchemy import create_engine, text
+
+from .read_sql import read_sql_chunks
+
+style = color_style()
+
+
+class LisMirror(object):
+
+    """A local SQLite copy of the LIS results query, updated incrementally.
+
+    The first sync copies the whole query. Later syncs pull the rows of every
+    lis_identifier (PID) received or resulted since the latest received_datetime
+    (headerdate) or result_datetime (sample_assay_date) in the mirror and replace
+    the mirror's rows for those PIDs, so only new lab results cross the network.
+
+        mirror = LisMirror('~/bcpp_lis_mirror.sqlite')
+        lis = Lis(mirror=mirror)  # syncs, then builds from the mirror
+        lis = Lis(mirror=mirror, offline=True)  # builds from the mirror without connecting to LIS
+    """
+
+    table_name = 'lis_results'
+    key_column = 'lis_identifier'
+    watermark_columns = ['received_datetime', 'result_datetime']
+    watermark_format = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, path=None, table_name=None):
+        self.path = os.path.expanduser(path or '~/bcpp_lis_mirror.sqlite')
+        self.table_name = table_name or self.table_name
+        self.engine = create_engine('sqlite:///{}'.format(self.path))
+
+    @property
+    def exists(self):
+        with self.engine.connect() as conn:
+            return self.engine.dialect.has_table(conn, self.table_name)
+
+    @property
+    def watermark(self):
+        """Return a tuple of the latest received_datetime and result_datetime formatted
+        for the LIS query or None if the mirror is empty."""
+        if not self.exists:
+            return None
+        with self.engine.connect() as conn:
+            row = conn.execute(text('select {} from {}'.format(
+                ', '.join(['max({})'.format(column) for column in self.watermark_columns]),
+                self.table_name))).fetchone()
+        if all([pd.isnull(value) for value in row]):
+            return None
+        return tuple([
+            None if pd.isnull(value) else pd.Timestamp(value).strftime(self.watermark_format)
+            for value in row])
+
+    def sync(self, engine, sql, sql_since, chunksize=None):
+        """Update the mirror from the LIS `engine` and return the number of rows pulled.
+
+        `sql` is the full query and `sql_since(received_datetime, result_datetime)` the
+        query for all rows of the PIDs received or resulted since the watermark."""
+        watermark = self.watermark
+        update_table = '{}_update'.format(self.table_name)
+        rows = 0
+        with self.engine.begin() as conn:
+            conn.execute(text('drop table if exists {}'.format(update_table)))
+            for df in read_sql_chunks(engine, sql if watermark is None else sql_since(*watermark),
+                                      chunksize or 10000):
+                df.to_sql(update_table, conn, if_exists='append', index=False)
+                rows += len(df)
+            if rows:
+                if watermark is None:
+                    conn.execute(text('drop table if exists {}'.format(self.table_name)))
+                    conn.execute(text('alter table {} rename to {}'.format(update_table, self.table_name)))
+                else:
+                    conn.execute(text('delete from {table} where {key} in (select {key} from {update})'.format(
+                        table=self.table_name, key=self.key_column, update=update_table)))
+                    conn.execute(text('insert into {} select * from {}'.format(self.table_name, update_table)))
+            conn.execute(text('drop table if exists {}'.format(update_table)))
+        sys.stdout.write(style.SQL_FIELD('Synced {} LIS rows to {}{}.\n'.format(
+            rows, self.path, '' if watermark is None else ' since {}'.format(', '.join(
+                [str(value) for value in watermark])))))
+        return rows
+
+    def read(self):
+        """Return the mirrored LIS results as read from the LIS query or an empty
+        dataframe if the mirror has not been synced."""
+        if not self.exists:
+            return pd.DataFrame()
+        with self.engine.connect() as conn:
+            return pd.read_sql_query(text('select * from {}'.format(self.table_name)), conn)
@@ -0,0 +1,32 @@
+import pandas as pd
+
+
+def read_sql_chunks(engine, sql, chunksize):
+    """Yield dataframes of up to `chunksize` rows of the query, read in one transaction
+    with a server-side cursor where the database driver supports it."""
+    with engine.connect() as conn, conn.begin():
+        conn = conn.execution_options(stream_results=True)
+        for df in pd.read_sql_query(sql, conn, chunksize=chunksize):
+            yield df
+
+
+def read_sql(engine, sql, chunksize=None, store=None, normalize=None):
+    """Return the query as a dataframe, normalized by `normalize`, if given.
+
+    If `chunksize`, each chunk is normalized as it is read. If given a
+    ColumnarChunkStore `store`, each chunk is appended to the store, which is cleared
+    first, and the store is returned instead of a dataframe, so no more than one
+    chunk is held in memory. Read the dataframe with store.read() or iterate over
+    store.chunks()."""
+    normalize = normalize or (lambda df: df)
+    if not chunksize:
+        with engine.connect() as conn, conn.begin():
+            df = pd.read_sql_query(sql, conn)
+        return normalize(df)
+    if store is None:
+        dfs = [normalize(df) for df in read_sql_chunks(engine, sql, chunksize)]
+        return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+    store.clear()
+    for df in read_sql_chunks(engine, sql, chunksize):
+        store.append(normalize(df))
+    return store
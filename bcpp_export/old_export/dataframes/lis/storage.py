@@ -6,11 +6,21 @@ from sqlalchemy import create_engine
 from tabulate import tabulate
 from bcpp_export import urls  # DO NOT DELETE
 from bcpp_export.private_settings import Lis as LisCredentials
+from bcpp_export.dataframes.columnar_writers import ColumnarChunkStore
+from .read_sql import read_sql
 
 
 class Storage(object):
 
-    def __init__(self, df=pd.DataFrame(), engine=None, protocol=None, protocol_prefix=None):
+    """LIS storage of the protocol's aliquots, received and not received.
+
+    Set `chunksize` to read in chunks and `store_folder` to write the chunks to
+    parquet files in the folder, as for Lis."""
+
+    def __init__(self, df=pd.DataFrame(), engine=None, protocol=None, protocol_prefix=None,
+                 chunksize=None, store_folder=None):
+        self.chunksize = chunksize
+        self.store_folder = store_folder
         if not df.empty:
             self.results = df
         else:
@@ -20,17 +30,20 @@ class Storage(object):
                 db=LisCredentials.name))
             self.protocol = protocol or 'BHP066'
             self.protocol_prefix = protocol_prefix or '066'
-            self.received = self.fetch_as_dataframe(self.sql_storage_received)
-            self.received['edc_specimen_identifier'] = self.received['aliquot_identifier'].str[0:12]
-            self.not_received = self.fetch_as_dataframe(self.sql_storage_not_received)
-            self.not_received['edc_specimen_identifier'] = self.not_received['aliquot_identifier'].str[0:12]
+            self.received = self.fetch_as_dataframe(self.sql_storage_received, name='storage_received')
+            self.not_received = self.fetch_as_dataframe(self.sql_storage_not_received, name='storage_not_received')
+
+    def fetch_as_dataframe(self, sql, edc_panels=None, name=None):
+        if self.store_folder and self.chunksize:
+            store = ColumnarChunkStore(self.store_folder, name or 'storage')
+            return read_sql(self.engine, sql, chunksize=self.chunksize, store=store, normalize=self.normalize).read()
+        return read_sql(self.engine, sql, chunksize=self.chunksize, normalize=self.normalize)
 
-    def fetch_as_dataframe(self, sql, edc_panels=None):
-        with self.engine.connect() as conn, conn.begin():
-            df = pd.read_sql_query(sql, conn)
+    def normalize(self, df):
         df.fillna(value=np.nan, inplace=True)
         for column in list(df.select_dtypes(include=['datetime64[ns, UTC]']).columns):
             df[column] = df[column].astype('datetime64[ns]')
+        df['edc_specimen_identifier'] = df['aliquot_identifier'].str[0:12]
         return df
 
     @property
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+
+def identifier_lookup(df, key_column, value_column=None):
+    """Return a series of `value_column` (default subject_identifier) indexed on
+    `key_column`, keeping the first value of a duplicated key."""
+    value_column = value_column or 'subject_identifier'
+    df = df[pd.notnull(df[key_column]) & pd.notnull(df[value_column])]
+    return df.drop_duplicates(key_column).set_index(key_column)[value_column]
+
+
+class SubjectIdentifierResolver(object):
+
+    """Resolve the final_subject_identifier of LIS results from other identifiers.
+
+    Sources are looked up in the order they are added. Each source is a name, recorded
+    in final_subject_identifier_source, a lookup series of subject identifiers indexed on
+    the identifier and a function that returns, for the results, a series of the
+    identifier to look up or null where the source does not apply, e.g.:
+
+        resolver = SubjectIdentifierResolver()
+        resolver.add_source(
+            'clinic_consent (lab id)', identifier_lookup(df_clinic_consent, 'lab_identifier'))
+        df = resolver.resolve(df)
+    """
+
+    def __init__(self):
+        self.sources = []
+
+    def add_source(self, name, lookup, keys=None):
+        """Add a source, looked up by the LIS subject_identifier if `keys` is None."""
+        self.sources.append((name, lookup, keys or (lambda df: df['subject_identifier'])))
+
+    def resolve(self, df):
+        """Return the results with final_subject_identifier and final_subject_identifier_source
+        set, in one pass over the sources, for the rows without a final_subject_identifier."""
+        final_subject_identifier = df['final_subject_identifier'].astype(object).values.copy()
+        final_subject_identifier_source = df['final_subject_identifier_source'].astype(object).values.copy()
+        for name, lookup, keys in self.sources:
+            rows = np.flatnonzero(pd.isnull(final_subject_identifier))
+            if not len(rows):
+                break
+            resolved = pd.Series(keys(df).values[rows]).map(lookup).values
+            found = rows[pd.notnull(resolved)]
+            final_subject_identifier[found] = resolved[pd.notnull(resolved)]
+            final_subject_identifier_source[found] = name
+        df['final_subject_identifier'] = final_subject_identifier
+        df['final_subject_identifier_source'] = final_subject_identifier_source
+        return df
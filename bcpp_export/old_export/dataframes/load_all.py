@@ -8,7 +8,7 @@ from django.core.management.color import color_style
 style = color_style()
 
 
-def load_all(survey=None):
+def load_all(survey=None, dataframe_cache=None):
     """Load all dataframes except CombinedDataFrames and return a dictionary of objects.
 
     For exapmple:
@@ -22,6 +22,9 @@ def load_all(survey=None):
 
         dfs = CombinedDataFrames('bcpp-year-1', **objects)
         dfs.to_csv()
+
+    If `dataframe_cache` is a DataframeCache, queried dataframes are read from
+    and written to the cache.
     """
 
     def start_message(name):
@@ -36,19 +39,22 @@ def load_all(survey=None):
     survey = survey or 'bcpp-year-1'
     dte = datetime.today()
     dte_start = start_message('subjects')
-    subjects = Subjects('bcpp-year-1')
+    subjects = Subjects('bcpp-year-1', dataframe_cache=dataframe_cache)
     subjects.results
     end_message(dte_start)
 
     dte_start = start_message('members')
-    members = Members('bcpp-year-1', subjects=subjects.results)
+    members = Members('bcpp-year-1', subjects=subjects.results, dataframe_cache=dataframe_cache)
     members.results
     end_message(dte_start)
 
     dte_start = start_message('residences')
-    residences = Residences('bcpp-year-1', subjects=subjects.results, members=members.results)
+    residences = Residences(
+        'bcpp-year-1', subjects=subjects.results, members=members.results, dataframe_cache=dataframe_cache)
     residences.residences
     end_message(dte_start)
+    if dataframe_cache is not None:
+        dataframe_cache.close()
 
     td = (datetime.today() - dte)
     sys.stdout.write(style.SQL_FIELD('All done. {} minutes {} seconds\n\n\n'.format(*divmod(td.days * 86400 + td.seconds, 60))))
@@ -1,14 +1,47 @@
+import warnings
+
 import numpy as np
 import pandas as pd
 
 from bcpp_export.constants import (
-    NEG, POS, UNK, YES, IND, NAIVE, NO, DEFAULTER, ON_ART)
+    NEG, POS, UNK, YES, IND, NAIVE, NO, DEFAULTER, ON_ART, SUBJECT_IDENTIFIER)
 
 
 class LongitudinalSubjects:
 
-    def __init__(self, df, suffix=None):
-        self.suffix = '_y1'
+    """Carry forward final_hiv_status, final_arv_status and prev_result from prior
+    surveys into the current survey's subjects.
+
+    The current survey's columns have no suffix. Prior surveys are merged in with
+    a suffix each, e.g. for year 3:
+
+        df = pd.merge(df_y3, df_y1, how='left', on='subject_identifier', suffixes=['', '_y1'])
+        df = pd.merge(df, df_y2, how='left', on='subject_identifier', suffixes=['', '_y2'])
+        subjects = LongitudinalSubjects(df, suffixes=['_y1', '_y2'])
+
+    `suffixes` are ordered oldest first and default to ['_y1']. The prior surveys
+    are resolved in order, each as the current survey of the one before, and the
+    result is then resolved with the current survey.
+
+    The rules are applied column-wise. With `vectorized=False` they are applied
+    row by row, which only supports one prior survey.
+    """
+
+    def __init__(self, df, suffix=None, suffixes=None, vectorized=None):
+        self.suffixes = suffixes or [suffix or '_y1']
+        self.suffix = self.suffixes[-1]
+        self.vectorized = False if vectorized is False else True
+        if self.vectorized:
+            for column, values in self.carry_forward(df).items():
+                df[column] = values
+            df = df.rename(columns={'appointment__visit_definition__code': 'timepoint'})
+            df['consent_date'] = pd.to_datetime(df['consent_date'])
+            df['prev_result_date'] = pd.to_datetime(df['prev_result_date'])
+            df['final_hiv_status_date'] = pd.to_datetime(df['final_hiv_status_date'])
+            self.df = df
+            return None
+        if len(self.suffixes) > 1:
+            raise TypeError('Row by row rules support one prior survey. Got suffixes {}.'.format(self.suffixes))
 
         df['tmp_final_hiv_status'] = df.apply(
             lambda row: self.final_hiv_status(row),
@@ -60,6 +93,86 @@ class LongitudinalSubjects:
     def dataframe(self):
         return self.df
 
+    def carry_forward(self, df):
+        """Return a dictionary of the carried forward columns, resolving each prior
+        survey in `suffixes` and then the current survey."""
+        previous = dict(
+            [(column, self.objects(df, column + self.suffixes[0]))
+             for column in ['final_hiv_status', 'final_hiv_status_date', 'final_arv_status']])
+        for suffix in self.suffixes[1:]:
+            previous = self.resolve(previous, df, suffix)
+        columns = self.resolve(previous, df, '')
+        prev_result, prev_result_date = self.resolve_prev_result(previous, df)
+        columns.update({
+            'prev_result': prev_result,
+            'prev_result_date': prev_result_date,
+            'prev_result_known': np.where(pd.isnull(prev_result), NO, YES)})
+        return dict([(column, pd.Series(list(values), index=df.index)) for column, values in columns.items()])
+
+    def objects(self, df, column):
+        """Return the column as an object array so values keep their type through np.select."""
+        return df[column].astype(object).values
+
+    def resolve(self, previous, df, suffix):
+        """Return the final_* columns of the survey with `suffix` given the final_* columns
+        of the survey before it. Same rules as final_hiv_status, final_hiv_status_date and
+        final_arv_status."""
+        previous_result = previous['final_hiv_status']
+        previous_result_date = previous['final_hiv_status_date']
+        previous_arv = previous['final_arv_status']
+        current_result = self.objects(df, 'final_hiv_status' + suffix)
+        current_result_date = self.objects(df, 'final_hiv_status_date' + suffix)
+        current_arv = self.objects(df, 'final_arv_status' + suffix)
+        previous_null = pd.isnull(previous_result)
+        current_null = pd.isnull(current_result)
+        previous_neg_unk_ind = (previous_result == NEG) | (previous_result == UNK) | (previous_result == IND)
+        carry_previous = (((current_result == UNK) & (previous_result != NEG)) |
+                          ((current_result == NEG) & (previous_result == POS)))
+        final_hiv_status = np.select(
+            [previous_null, current_null & previous_neg_unk_ind, current_null, carry_previous],
+            [current_result, np.nan, previous_result, previous_result],
+            default=current_result)
+        final_hiv_status_date = np.select(
+            [current_null & previous_neg_unk_ind, current_null,
+             carry_previous | ((current_result == POS) & (previous_result == POS))],
+            [np.nan, previous_result_date, previous_result_date],
+            default=current_result_date)
+        previous_on_art = previous_arv == ON_ART
+        final_arv_status = np.select(
+            [pd.isnull(final_hiv_status) | (final_hiv_status != POS),
+             pd.isnull(current_arv) & previous_on_art,
+             pd.isnull(current_arv),
+             previous_on_art & (current_arv != ON_ART),
+             (previous_on_art | (previous_arv == DEFAULTER)) & (current_arv == NAIVE)],
+            [np.nan, DEFAULTER, NAIVE, DEFAULTER, DEFAULTER],
+            default=current_arv)
+        return {
+            'final_hiv_status': final_hiv_status,
+            'final_hiv_status_date': final_hiv_status_date,
+            'final_arv_status': final_arv_status}
+
+    def resolve_prev_result(self, previous, df):
+        """Return prev_result and prev_result_date given the final_* columns of the
+        prior surveys. Same rules as prev_result and prev_result_date."""
+        previous_result = previous['final_hiv_status']
+        previous_result_date = previous['final_hiv_status_date']
+        current_prev_result = self.objects(df, 'prev_result')
+        current_prev_result_date = self.objects(df, 'prev_result_date')
+        current_null = pd.isnull(current_prev_result)
+        previous_pos = previous_result == POS
+        previous_neg = previous_result == NEG
+        current_pos_or_neg = (current_prev_result == POS) | (current_prev_result == NEG)
+        prev_result = np.select(
+            [current_null, previous_pos, previous_neg & current_pos_or_neg, previous_neg],
+            [previous_result, POS, current_prev_result, previous_result],
+            default=current_prev_result)
+        prev_result = np.where(prev_result == UNK, np.nan, prev_result)
+        prev_result_date = np.select(
+            [current_null | previous_pos, previous_neg & current_pos_or_neg, previous_neg],
+            [previous_result_date, current_prev_result_date, previous_result_date],
+            default=current_prev_result_date)
+        return prev_result, prev_result_date
+
     def final_hiv_status(self, row):
         previous_result = row['final_hiv_status{}'.format(self.suffix)]
         current_result = row['final_hiv_status']
@@ -157,3 +270,87 @@ class LongitudinalSubjects:
         if prev_result == UNK:
             prev_result_date = np.nan
         return prev_result_date
+
+
+class LongitudinalSurveys(LongitudinalSubjects):
+
+    """Build a long dataframe, one row per subject per survey, from the results of
+    N surveys and carry forward the same columns as LongitudinalSubjects.
+
+        subjects = [Subjects(survey_name) for survey_name in Subjects('bcpp-year-3').survey_sequence]
+        df = LongitudinalSurveys(subjects).dataframe
+
+    `subjects` are Subjects instances, ordered by survey_sequence, or their results
+    dataframes in chronological order. The results are concatenated and sorted once
+    on subject_identifier and survey, then each survey after the first is resolved
+    against the subject's row of the survey before it, so a subject resolves the same
+    as with LongitudinalSubjects and the prior surveys merged in with suffixes.
+
+    Rows of the first survey are kept as is. Only the first row of a subject in a
+    survey is kept, with a warning that lists the subjects with more than one.
+    """
+
+    columns = ['final_hiv_status', 'final_hiv_status_date', 'final_arv_status']
+
+    def __init__(self, subjects):
+        if all([hasattr(s, 'survey_sequence') for s in subjects]):
+            survey_sequence = max([s.survey_sequence for s in subjects], key=len)
+            subjects = sorted(subjects, key=lambda s: survey_sequence.index(s.survey_name))
+            results = [s.results for s in subjects]
+        else:
+            results = list(subjects)
+        self.survey_count = len(results)
+        df = pd.concat([df.assign(survey_index=index) for index, df in enumerate(results)], ignore_index=True)
+        duplicated = df.duplicated([SUBJECT_IDENTIFIER, 'survey_index'])
+        if duplicated.any():
+            subject_identifiers = sorted(df.loc[duplicated, SUBJECT_IDENTIFIER].astype(str).unique())
+            warnings.warn(
+                'Dropped {} duplicate row(s) of {} subject(s) with more than one row in the same survey. '
+                'Got {}{}.'.format(
+                    duplicated.sum(), len(subject_identifiers), ', '.join(subject_identifiers[:20]),
+                    ', ...' if len(subject_identifiers) > 20 else ''))
+            df = df[~duplicated]
+        df = df.sort_values([SUBJECT_IDENTIFIER, 'survey_index'], kind='mergesort').reset_index(drop=True)
+        for column, values in self.carry_forward(df).items():
+            df[column] = values
+        df = df.drop('survey_index', axis=1)
+        df = df.rename(columns={'appointment__visit_definition__code': 'timepoint'})
+        df['consent_date'] = pd.to_datetime(df['consent_date'])
+        df['prev_result_date'] = pd.to_datetime(df['prev_result_date'])
+        df['final_hiv_status_date'] = pd.to_datetime(df['final_hiv_status_date'])
+        self.df = df
+
+    def carry_forward(self, df):
+        """Return a dictionary of the carried forward columns, resolving the rows of
+        each survey after the first in order.
+
+        The row before a subject's row is the subject's row of an earlier survey, if
+        any. Surveys the subject missed in between resolve with missing values."""
+        subject_identifiers = df[SUBJECT_IDENTIFIER].values
+        survey_index = df['survey_index'].values
+        has_previous = np.concatenate([[False], subject_identifiers[1:] == subject_identifiers[:-1]])
+        values = dict([(column, self.objects(df, column).copy())
+                       for column in self.columns + ['prev_result', 'prev_result_date']])
+        values['prev_result_known'] = (
+            self.objects(df, 'prev_result_known').copy() if 'prev_result_known' in df.columns
+            else np.array([np.nan] * len(df), dtype=object))
+        for index in range(1, self.survey_count):
+            rows = np.flatnonzero(survey_index == index)
+            with_previous = has_previous[rows]
+            previous = dict([(column, np.where(with_previous, values[column][rows - 1], np.nan))
+                             for column in self.columns])
+            missed = np.where(with_previous, index - 1 - survey_index[rows - 1], 0)
+            missing = pd.DataFrame(dict([(column, [np.nan] * len(rows)) for column in self.columns]))
+            for gap in range(1, missed.max() + 1 if len(rows) else 1):
+                resolved = self.resolve(previous, missing, '')
+                previous = dict([(column, np.where(missed >= gap, resolved[column], previous[column]))
+                                 for column in self.columns])
+            current = df.iloc[rows]
+            resolved = self.resolve(previous, current, '')
+            prev_result, prev_result_date = self.resolve_prev_result(previous, current)
+            for column in self.columns:
+                values[column][rows] = resolved[column]
+            values['prev_result'][rows] = prev_result
+            values['prev_result_date'][rows] = prev_result_date
+            values['prev_result_known'][rows] = np.where(pd.isnull(prev_result), NO, YES)
+        return dict([(column, pd.Series(list(value), index=df.index)) for column, value in values.items()])
@@ -2,6 +2,8 @@ import os
 import numpy as np
 import pandas as pd
 
+from .dtypes import to_dates
+
 NOT_LINKED = 0
 LINKED = 1
 ALREADY_LINKED = 2
@@ -18,16 +20,14 @@ class Ltc(object):
         self.df_subjects = pd.merge(
             self.df_subjects, self.df_pims[['regdate', 'identity256']], how='left', on='identity256')
         self.df_subjects.rename(columns={'regdate': 'pims_reg_date'}, inplace=True)
-        self.df_subjects['consent_date'] = self.df_subjects.apply(
-            lambda row: pd.to_datetime(row['consent_date']), axis=1)
-        self.df_subjects['pims_reg_date'] = self.df_subjects.apply(
-            lambda row: pd.to_datetime(row['pims_reg_date']), axis=1)
+        self.df_subjects['consent_date'] = to_dates(self.df_subjects['consent_date'])
+        self.df_subjects['pims_reg_date'] = to_dates(self.df_subjects['pims_reg_date'])
         self.df_subjects['ltc'] = self.df_subjects.apply(lambda row: self.linkage_to_care(row), axis=1)
         self.df_subjects['ltc_timing'] = self.df_subjects.apply(lambda row: self.linkage_to_care_timing(row), axis=1)
 
     def linkage_to_care(self, row):
         linkage_to_care = NOT_LINKED
-        if pd.isnull(row.pims_reg_date):
+        if pd.isnull(row.pims_reg_date) or pd.isnull(row.consent_date):
             linkage_to_care = NOT_LINKED
         elif row.consent_date <= row.pims_reg_date:
             linkage_to_care = LINKED
@@ -45,6 +45,6 @@ class Ltc(object):
     def drop_columns(self, df, columns):
         for column in columns:
             try:
-                df.drop([column], inplace=True)
-            except ValueError:
+                df.drop([column], axis=1, inplace=True)
+            except (KeyError, ValueError):
                 pass
@@ -10,24 +10,37 @@ from bhp066.apps.bcpp_household.models.household_refusal import HouseholdRefusal
 from bhp066.apps.bcpp_household_member.models import HouseholdMember, EnrollmentChecklist, SubjectHtc
 
 from ..communities import communities, intervention
-from ..constants import (YES, NO, gender, yes_no, tf, edc_NOT_APPLICABLE, survival, PLOT_IDENTIFIER)
-from ..datetime_to_date import datetime_to_date
-from ..enrolled import enrolled
-from ..household_refused import household_refused
+from ..constants import (YES, NO, edc_NOT_APPLICABLE, PLOT_IDENTIFIER)
+from ..enrolled import enrolled_bulk
+from ..household_refused import household_refused_bulk
 
+from .codebooks import map_codes
 from .csv_export_mixin import CsvExportMixin
+from .dataframe_cache import DataframeCacheMixin
+from .dtypes import compact_dtypes, to_dates
+from .incremental import filter_in, modified_values
 from .participation_status import (
-    ParticipationStatus, ENROLLED, ABSENT, REFUSED, BHS_INELIGIBLE, DECEASED,
+    ParticipationStatus, participation_status_models, ENROLLED, ABSENT, REFUSED, BHS_INELIGIBLE, DECEASED,
     UNKNOWN, MOVED, UNDECIDED)
 
 style = color_style()
 
 
-class Members(CsvExportMixin):
+class Members(CsvExportMixin, DataframeCacheMixin):
 
-    def __init__(self, survey_name, subjects=None, **kwargs):
+    # EDC responses mapped to numerics, column: codebook (see codebooks)
+    coded_columns = {
+        'gender': 'gender',
+        'study_resident': 'yes_no',
+        'survival_status': 'survival'}
+
+    def __init__(self, survey_name, subjects=None, dataframe_cache=None, household_structures=None,
+                 compact_dtypes=None, **kwargs):
         super(Members, self).__init__(**kwargs)
         self.survey_name = survey_name
+        self.dataframe_cache = dataframe_cache
+        self.household_structures = household_structures
+        self.compact_dtypes = True if compact_dtypes is True else False
         try:
             self.subjects = pd.DataFrame() if subjects.empty else subjects
         except AttributeError:
@@ -55,7 +68,8 @@ class Members(CsvExportMixin):
             qs = HouseholdMember.objects.values_list(*columns).filter(
                 household_structure__survey__survey_slug=self.survey_name).exclude(
                     household_structure__household__plot__status='bcpp_clinic')
-            df = pd.DataFrame(list(qs), columns=columns)
+            qs = filter_in(qs, 'household_structure', self.household_structures)
+            df = self.queryset_to_dataframe(qs, columns)
             self._results = df.rename(columns={
                 'id': 'household_member',
                 'household_structure__household__household_identifier': 'household_identifier',
@@ -71,6 +85,8 @@ class Members(CsvExportMixin):
             self.add_derived_columns()
             self.remove_members_by_household_refusal()
             self.subjects_value_or_value('gender')
+            if self.compact_dtypes:
+                self._results = compact_dtypes(self._results, 'members')
         return self._results
 
     def remove_members_by_household_refusal(self):
@@ -95,9 +111,7 @@ class Members(CsvExportMixin):
             self._results, self.df_subject_htc, how='left', on='registered_subject', suffixes=['', '_sh'])
 
     def map_edc_responses_to_numerics(self):
-        self._results['gender'] = self._results['gender'].map(gender.get)
-        self._results['study_resident'] = self._results['study_resident'].map(yes_no.get)
-        self._results['survival_status'] = self._results['survival_status'].map(survival.get)
+        map_codes(self._results, self.coded_columns, 'members')
 
     def subjects_value_or_value(self, attr, astype=None):
         """Replace a column value with that from subjects, if there is a subject value."""
@@ -113,8 +127,7 @@ class Members(CsvExportMixin):
             self._results[attr] = self._results[attr].astype(astype)
 
     def add_derived_columns(self):
-        self._results['first_enumeration_date'] = self._results.apply(
-            lambda row: datetime_to_date(row['first_enumeration_date']), axis=1)
+        self._results['first_enumeration_date'] = to_dates(self._results['first_enumeration_date'])
         self._results['able_to_participate'] = self._results.apply(
             lambda row: 1 if row['able_to_participate'] == edc_NOT_APPLICABLE else 2, axis=1)
         self._results['enum_eligible'] = self._results.apply(
@@ -123,8 +136,8 @@ class Members(CsvExportMixin):
             lambda row: intervention(row), axis=1)
         self._results['pair'] = self._results.apply(
             lambda row: communities.get(row['community']).pair, axis=1)
-        self._results['household_refused'] = self._results.apply(
-            lambda row: household_refused(self.df_household_refusal, row), axis=1)
+        self._results['household_refused'] = household_refused_bulk(
+            self.df_household_refusal, self._results['household_identifier'])
         if self.subjects.empty:
             self._results['household_enrolled'] = np.nan
             self._results['enrolled'] = np.nan
@@ -132,9 +145,9 @@ class Members(CsvExportMixin):
         else:
             self._results['household_enrolled'] = self._results['household_identifier'].isin(
                 self.subjects['household_identifier'])
-            self._results['household_enrolled'] = self._results['household_enrolled'].map(tf.get)
-            self._results['enrolled'] = self._results.apply(
-                lambda row: enrolled(self.subjects, row, 'registered_subject'), axis=1)
+            map_codes(self._results, {'household_enrolled': 'tf'}, 'members')
+            self._results['enrolled'] = enrolled_bulk(
+                self.subjects, self._results['registered_subject'], 'registered_subject')
             self._results['participation_status'] = self._results.apply(
                 lambda row: self.participation_status(row), axis=1)
         self._results['bhs_checklist'] = self._results.apply(
@@ -148,7 +161,10 @@ class Members(CsvExportMixin):
             return NO
 
     def participation_status(self, row):
-        if enrolled(self.subjects, row, 'registered_subject') == YES:
+        """Return the participation status for the row.
+
+        Expects column 'enrolled' to have been added by `add_derived_columns`."""
+        if row['enrolled'] == YES:
             participation_status = ENROLLED
         elif row['bhs_eligible'] == NO:
             participation_status = BHS_INELIGIBLE
@@ -163,10 +179,27 @@ class Members(CsvExportMixin):
     @property
     def df_participation_status(self):
         if self._df_participation_status.empty:
-            participation_status = ParticipationStatus(self.survey_name)
+            participation_status = ParticipationStatus(
+                self.survey_name, household_structures=self.household_structures)
             self._df_participation_status = participation_status.results
         return self._df_participation_status
 
+    def modified_household_structures(self, since):
+        """Return a set of household structures in this survey with a member,
+        member form or household refusal modified after `since`."""
+        household_structures = modified_values(
+            HouseholdMember, since, 'household_structure',
+            household_structure__survey__survey_slug=self.survey_name)
+        household_structures.update(modified_values(
+            HouseholdRefusal, since, 'household_structure',
+            household_structure__survey__survey_slug=self.survey_name))
+        for model, household_member in [(EnrollmentChecklist, 'household_member'),
+                                        (SubjectHtc, 'household_member')] + participation_status_models:
+            household_structures.update(modified_values(
+                model, since, '{}__household_structure'.format(household_member),
+                **{'{}__household_structure__survey__survey_slug'.format(household_member): self.survey_name}))
+        return household_structures
+
     @property
     def df_enrollment_checklist(self):
         if self._df_enrollment_checklist.empty:
@@ -175,11 +208,12 @@ class Members(CsvExportMixin):
                 'is_eligible']
             qs = EnrollmentChecklist.objects.values_list(*columns).filter(
                 household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            qs = filter_in(qs, 'household_member__household_structure', self.household_structures)
+            df = self.queryset_to_dataframe(qs, columns)
             df = df.rename(columns={
                 'household_member__registered_subject': 'registered_subject',
                 'is_eligible': 'bhs_eligible'})
-            df['bhs_eligible'] = df['bhs_eligible'].map(tf.get)
+            map_codes(df, {'bhs_eligible': 'tf'}, 'enrollment checklist')
             df['bhs_checklist'] = YES
             self._df_enrollment_checklist = df
         return self._df_enrollment_checklist
@@ -192,15 +226,15 @@ class Members(CsvExportMixin):
                 'refusal_reason']
             qs = SubjectHtc.objects.values_list(*columns).filter(
                 household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            qs = filter_in(qs, 'household_member__household_structure', self.household_structures)
+            df = self.queryset_to_dataframe(qs, columns)
             df = df.rename(columns={
                 'household_member__registered_subject': 'registered_subject',
                 'tracking_identifier': 'htc_tracking_identifier',
                 'offered': 'htc_offered',
                 'accepted': 'htc_accepted',
                 'refusal_reason': 'htc_refusal_reason'})
-            df['htc_offered'] = df['htc_offered'].map(yes_no.get)
-            df['htc_accepted'] = df['htc_accepted'].map(yes_no.get)
+            map_codes(df, {'htc_offered': 'yes_no', 'htc_accepted': 'yes_no'}, 'subject htc')
             self._df_subject_htc = df
         return self._df_subject_htc
 
@@ -213,7 +247,8 @@ class Members(CsvExportMixin):
             qs = HouseholdRefusal.objects.values_list(*columns).filter(
                 household_structure__survey__survey_slug=self.survey_name).exclude(
                     household_structure__household__plot__status='bcpp_clinic')
-            df = pd.DataFrame(list(qs), columns=columns)
+            qs = filter_in(qs, 'household_structure', self.household_structures)
+            df = self.queryset_to_dataframe(qs, columns)
             self._df_household_refusal = df.rename(columns={
                 'household_structure__household__household_identifier': 'household_identifier',
                 'household_structure__survey__survey_slug': 'survey'})
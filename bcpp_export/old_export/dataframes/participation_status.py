@@ -5,6 +5,8 @@ from bcpp_export import urls  # DO NOT DELETE
 from bhp066.apps.bcpp_household_member.models import (
     SubjectAbsenteeEntry, SubjectRefusal, SubjectMoved, SubjectUndecided, SubjectDeath)
 
+from .incremental import filter_in
+
 ABSENT = 2
 BHS_INELIGIBLE = 7
 DECEASED = 6
@@ -14,10 +16,19 @@ REFUSED = 3
 UNDECIDED = 5
 UNKNOWN = 0
 
+# (model, lookup to the household member)
+participation_status_models = [
+    (SubjectAbsenteeEntry, 'subject_absentee__household_member'),
+    (SubjectRefusal, 'household_member'),
+    (SubjectMoved, 'household_member'),
+    (SubjectUndecided, 'household_member'),
+    (SubjectDeath, 'household_member')]
+
 
 class ParticipationStatus(object):
 
-    def __init__(self, survey_name):
+    def __init__(self, survey_name, household_structures=None):
+        self.household_structures = household_structures
         self._results = pd.DataFrame()
         self._df_all = pd.DataFrame()
         self._df_subject_absentee = pd.DataFrame()
@@ -57,6 +68,7 @@ class ParticipationStatus(object):
                 'modified']
             qs = SubjectAbsenteeEntry.objects.values_list(*columns).filter(
                 subject_absentee__household_member__household_structure__survey__survey_slug=self.survey_name)
+            qs = filter_in(qs, 'subject_absentee__household_member__household_structure', self.household_structures)
             df = pd.DataFrame(list(qs), columns=columns)
             df = df.rename(columns={
                 'subject_absentee__household_member': 'household_member',
@@ -75,6 +87,7 @@ class ParticipationStatus(object):
                 'household_member__registered_subject', 'created', 'modified']
             qs = SubjectRefusal.objects.values_list(*columns).filter(
                 household_member__household_structure__survey__survey_slug=self.survey_name)
+            qs = filter_in(qs, 'household_member__household_structure', self.household_structures)
             df = pd.DataFrame(list(qs), columns=columns)
             df = df.rename(columns={
                 'household_member__registered_subject': 'registered_subject'})
@@ -91,6 +104,7 @@ class ParticipationStatus(object):
             columns = ['household_member__registered_subject', 'created', 'modified']
             qs = SubjectMoved.objects.values_list(*columns).filter(
                 household_member__household_structure__survey__survey_slug=self.survey_name)
+            qs = filter_in(qs, 'household_member__household_structure', self.household_structures)
             df = pd.DataFrame(list(qs), columns=columns)
             df = df.rename(columns={
                 'household_member__registered_subject': 'registered_subject'})
@@ -107,6 +121,7 @@ class ParticipationStatus(object):
             columns = ['household_member__registered_subject', 'created', 'modified']
             qs = SubjectUndecided.objects.values_list(*columns).filter(
                 household_member__household_structure__survey__survey_slug=self.survey_name)
+            qs = filter_in(qs, 'household_member__household_structure', self.household_structures)
             df = pd.DataFrame(list(qs), columns=columns)
             df = df.rename(columns={
                 'household_member__registered_subject': 'registered_subject'})
@@ -123,6 +138,7 @@ class ParticipationStatus(object):
             columns = ['household_member__registered_subject', 'created', 'modified']
             qs = SubjectDeath.objects.values_list(*columns).filter(
                 household_member__household_structure__survey__survey_slug=self.survey_name)
+            qs = filter_in(qs, 'household_member__household_structure', self.household_structures)
             df = pd.DataFrame(list(qs), columns=columns)
             df = df.rename(columns={
                 'household_member__registered_subject': 'registered_subject'})
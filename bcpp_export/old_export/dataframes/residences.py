@@ -11,14 +11,28 @@ from bhp066.apps.bcpp_household.models import (
     HouseholdStructure, Plot, RepresentativeEligibility, HouseholdLogEntry)
 
 from ..communities import communities, intervention
-from ..constants import PLOT_IDENTIFIER, yes_no, YES, NO
-from ..enrolled import enrolled
-from ..enumerated import enumerated
+from ..constants import PLOT_IDENTIFIER, YES, NO
+from ..enrolled import enrolled_bulk
+from ..enumerated import enumerated_bulk
+
+from .codebooks import map_codes
+from .dataframe_cache import DataframeCacheMixin
+from .dtypes import compact_dtypes
+from .incremental import filter_in, modified_values
 
 style = color_style()
 
 
-class Residences(object):
+def residences_dataframe(households, plots):
+    """Return a dataframe that is the merge of households and plots."""
+    return pd.merge(
+        households,
+        plots[[PLOT_IDENTIFIER, 'plot_modified', 'confirmed',
+               'plot_status', 'gps_lat', 'gps_lon', 'selected']],
+        how='left', on=PLOT_IDENTIFIER)
+
+
+class Residences(DataframeCacheMixin):
 
     """Residences prepares three main dataframes where the most useful is "residences":
 
@@ -27,15 +41,23 @@ class Residences(object):
         * households: a dataframe of the bcpp Household model with a few add fields
         * plots: a dataframe of the bcpp Plot model with a few add fields
 
+    With `compact_dtypes=True` the residences dataframe is compacted (see dtypes.compact_dtypes).
+
+    Households may be limited to `household_structures` and plots to `plot_identifiers`.
     """
 
-    def __init__(self, survey_name, subjects=None, members=None):
+    def __init__(self, survey_name, subjects=None, members=None, dataframe_cache=None,
+                 household_structures=None, plot_identifiers=None, compact_dtypes=None):
         self._df_household_log = pd.DataFrame()
         self._df_households = pd.DataFrame()
         self._df_plots = pd.DataFrame()
         self._df_representative_eligibility = pd.DataFrame()
         self._df_residences = pd.DataFrame()
         self.survey_name = survey_name
+        self.dataframe_cache = dataframe_cache
+        self.household_structures = household_structures
+        self.plot_identifiers = plot_identifiers
+        self.compact_dtypes = True if compact_dtypes is True else False
         try:
             self.subjects = pd.DataFrame() if subjects.empty else subjects
         except AttributeError:
@@ -53,11 +75,9 @@ class Residences(object):
     def residences(self):
         """Return a dataframe that is the merge of households and plots."""
         if self._df_residences.empty:
-            self._df_residences = pd.merge(
-                self.df_households,
-                self.df_plots[[PLOT_IDENTIFIER, 'plot_modified', 'confirmed',
-                               'plot_status', 'gps_lat', 'gps_lon', 'selected']],
-                how='left', on=PLOT_IDENTIFIER)
+            self._df_residences = residences_dataframe(self.df_households, self.df_plots)
+            if self.compact_dtypes:
+                self._df_residences = compact_dtypes(self._df_residences, 'residences')
         return self._df_residences
 
     @property
@@ -68,6 +88,28 @@ class Residences(object):
     def plots(self):
         return self.df_plots
 
+    def modified_household_structures(self, since):
+        """Return a set of household structures in this survey modified after `since` or
+        with a household log entry or representative eligibility modified after `since`."""
+        household_structures = modified_values(
+            HouseholdStructure, since, 'id', survey__survey_slug=self.survey_name)
+        household_structures.update(modified_values(
+            RepresentativeEligibility, since, 'household_structure',
+            household_structure__survey__survey_slug=self.survey_name))
+        household_structures.update(modified_values(
+            HouseholdLogEntry, since, 'household_log__household_structure',
+            household_log__household_structure__survey__survey_slug=self.survey_name))
+        return household_structures
+
+    def household_structure_plot_identifiers(self, household_structures):
+        """Return a set of identifiers of the plots of the household structures."""
+        return set(HouseholdStructure.objects.filter(id__in=list(household_structures)).values_list(
+            'household__plot__plot_identifier', flat=True))
+
+    def modified_plot_identifiers(self, since):
+        """Return a set of identifiers of plots modified after `since`."""
+        return modified_values(Plot, since, PLOT_IDENTIFIER)
+
     @property
     def df_representative_eligibility(self):
         """Return a dataframe with a column that indicates whether
@@ -78,9 +120,11 @@ class Residences(object):
             qs = RepresentativeEligibility.objects.values_list(*columns).filter(
                 household_structure__survey__survey_slug=self.survey_name).exclude(
                     household_structure__household__plot__status='bcpp_clinic')
-            df = pd.DataFrame(list(qs), columns=columns)
+            qs = filter_in(qs, 'household_structure', self.household_structures)
+            df = self.queryset_to_dataframe(qs, columns)
             df = df.rename(columns={'verbal_script': 'household_consented'})
-            df['household_consented'] = df['household_consented'].map(yes_no.get)
+            map_codes(df, {'household_consented': 'yes_no'}, 'representative eligibility',
+                      nullable_ints=self.compact_dtypes)
             self._df_representative_eligibility = df
         return self._df_representative_eligibility
 
@@ -94,7 +138,8 @@ class Residences(object):
             qs = HouseholdLogEntry.objects.values_list(*columns).filter(
                 household_log__household_structure__survey__survey_slug=self.survey_name).exclude(
                     household_log__household_structure__household__plot__status='bcpp_clinic')
-            df = pd.DataFrame(list(qs), columns=columns)
+            qs = filter_in(qs, 'household_log__household_structure', self.household_structures)
+            df = self.queryset_to_dataframe(qs, columns)
             df = df.rename(columns={
                 'household_log__household_structure': 'household_structure',
                 'report_datetime': 'household_log_date',
@@ -109,13 +154,14 @@ class Residences(object):
             columns = [PLOT_IDENTIFIER, 'gps_lat', 'gps_lon', 'action', 'status', 'selected',
                        'community', 'modified']
             qs = Plot.objects.values_list(*columns).exclude(status='bcpp_clinic')
-            df = pd.DataFrame(list(qs), columns=columns)
+            qs = filter_in(qs, PLOT_IDENTIFIER, self.plot_identifiers)
+            df = self.queryset_to_dataframe(qs, columns)
             df = df.rename(columns={
                 'action': 'confirmed',
                 'modified': 'plot_modified',
                 'status': 'plot_status'})
-            df['confirmed'] = df['confirmed'].map({'confirmed': 1, 'unconfirmed': 0}.get)
-            df['enrolled'] = df.apply(lambda row: enrolled(self.subjects, row, 'plot_identifier'), axis=1)
+            map_codes(df, {'confirmed': 'plot_action'}, 'plots', nullable_ints=self.compact_dtypes)
+            df['enrolled'] = enrolled_bulk(self.subjects, df[PLOT_IDENTIFIER], PLOT_IDENTIFIER)
             df['intervention'] = df.apply(lambda row: intervention(row), axis=1)
             df['pair'] = df.apply(lambda row: communities.get(row['community']).pair, axis=1)
             df['selected'] = df.apply(lambda row: int(row['selected']) if pd.notnull(row['selected']) else np.nan, axis=1)
@@ -132,16 +178,16 @@ class Residences(object):
                 'household__plot__plot_identifier', 'survey__survey_slug', 'modified']
             qs = HouseholdStructure.objects.values_list(*columns).filter(
                 survey__survey_slug=self.survey_name).exclude(household__plot__status='bcpp_clinic')
-            df = pd.DataFrame(list(qs), columns=columns)
+            qs = filter_in(qs, 'id', self.household_structures)
+            df = self.queryset_to_dataframe(qs, columns)
             df = df.rename(columns={
                 'id': 'household_structure',
                 'household__household_identifier': 'household_identifier',
                 'household__plot__plot_identifier': PLOT_IDENTIFIER,
                 'modified': 'household_modified',
                 'survey__survey_slug': 'survey'})
-            df['enumerated'] = df.apply(lambda row: enumerated(self.members, row), axis=1)
-            df['enrolled'] = df.apply(
-                lambda row: enrolled(self.subjects, row, 'household_identifier'), axis=1)
+            df['enumerated'] = enumerated_bulk(self.members, df['household_identifier'])
+            df['enrolled'] = enrolled_bulk(self.subjects, df['household_identifier'], 'household_identifier')
             df = pd.merge(
                 df, self.df_plots[[PLOT_IDENTIFIER, 'intervention', 'pair', 'community']],
                 how='left', on=PLOT_IDENTIFIER)
@@ -1,7 +1,13 @@
 import os
+import threading
+import time
 
 import pandas as pd
 
+from multiprocessing.pool import ThreadPool
+
+from django.db import connection
+
 from bcpp_export import urls  # DO NOT DELETE
 
 from bhp066.apps.bcpp_subject.models import (
@@ -11,14 +17,24 @@ from bhp066.apps.bcpp_subject.models import (
 from bhp066.apps.bcpp_clinic.models.clinic_consent import ClinicConsent
 from bhp066.apps.bcpp_lab.models import SubjectRequisition
 
-from ..constants import gender, hiv_options, tf, yes_no, SUBJECT_IDENTIFIER, HOUSEHOLD_MEMBER, PLOT_IDENTIFIER
-from ..datetime_to_date import datetime_to_date
-from ..derived_variables import DerivedVariables
+from ..constants import SUBJECT_IDENTIFIER, HOUSEHOLD_MEMBER, PLOT_IDENTIFIER
+from ..derived_variables import DerivedVariables, DerivedVariablesFrame
+from ..identity256_cache import identity256_bulk
 
+from .codebooks import map_codes
 from .csv_export_mixin import CsvExportMixin
+from .dataframe_cache import DataframeCacheMixin
+from .dtypes import compact_dtypes, to_dates
+from .incremental import filter_in, modified_values
+
+SUBJECT_VISIT_KEYS = {
+    'subject_visit__household_member': 'household_member',
+    'subject_visit__household_member__registered_subject__subject_identifier':
+    'household_member__registered_subject__subject_identifier',
+}
 
 
-class Subjects(CsvExportMixin):
+class Subjects(CsvExportMixin, DataframeCacheMixin):
 
     """A class to generate a dataset of bcpp subject data for a given survey year.
 
@@ -29,12 +45,90 @@ class Subjects(CsvExportMixin):
         from bcpp_export.dataframes.subjects import Subjects
         s = Subjects('bcpp-year-1')
         s.to_csv()
+
+    Derived columns are calculated column-wise by DerivedVariablesFrame. To
+    use the row-by-row DerivedVariables instead, set `vectorized=False`.
+
+    With `bulk_fetch=True` the survey's subject visits are fetched once and each
+    CRF is fetched by subject_visit id in chunks of `bulk_fetch_chunk_size`
+    instead of joining each CRF through household_member to survey:
+
+        s = Subjects('bcpp-year-1', bulk_fetch=True)
+
+    With `max_workers` set, all df_* dataframes are loaded concurrently on a thread
+    pool before merging. Each worker thread uses its own database connection. The
+    time taken to load each dataframe is kept in `load_times`:
+
+        s = Subjects('bcpp-year-1', max_workers=4)
+        s.results
+        s.load_times_report()
+
+    With `dataframe_cache` set to a DataframeCache, queried dataframes are kept on disk
+    and reused until the source table changes:
+
+        s = Subjects('bcpp-year-1', dataframe_cache=DataframeCache())
+
+    With `identity256_cache` set to an Identity256Cache, identity256 is only hashed for
+    identities not hashed on a previous run.
+
+    With `compact_dtypes=True`, results are compacted once derived columns are added;
+    low cardinality strings become categoricals and coded answers nullable Int8
+    (see dtypes.compact_dtypes).
+
+    With `subject_identifiers` set, all queries are limited to those subjects. Use
+    `modified_subject_identifiers` to find the subjects with data modified since a
+    previous export.
     """
 
-    def __init__(self, survey_name, merge_on=None, add_identity256=None, **kwargs):
+    default_bulk_fetch_chunk_size = 1000
+
+    # EDC responses mapped to numerics, column: codebook (see codebooks)
+    coded_columns = {
+        'arv_evidence': 'yes_no',
+        'cd4_tested': 'yes_no',
+        'circumcised': 'yes_no',
+        'citizen': 'yes_no',
+        'citizen_or_spouse': 'tf',
+        'elisa_hiv_result': 'hiv_options',
+        'ever_taken_arv': 'yes_no',
+        'gender': 'gender',
+        'has_tested': 'yes_no',
+        'household_residency': 'tf',
+        'intend_residency': 'tf',
+        'on_arv': 'yes_no',
+        'other_record': 'yes_no',
+        'part_time_resident': 'tf',
+        'permanent_resident': 'yes_no',
+        'pregnant': 'yes_no',
+        'recorded_hiv_result': 'hiv_options',
+        'referred': 'yes_no',
+        'result_recorded': 'hiv_options',
+        'self_reported_result': 'hiv_options',
+        'spouse_of_citizen': 'yes_no',
+        'today_hiv_result': 'hiv_options'}
+
+    # models queried with crf_dataframe, checked for modified instances
+    crf_models = [
+        SubjectReferral, HivResult, ElisaHivResult, HivTestingHistory, HivTestReview,
+        HivResultDocumentation, HivCareAdherence, Circumcision, ReproductiveHealth,
+        ResidencyMobility, Pima, HicEnrollment, SubjectRequisition]
+
+    def __init__(self, survey_name, merge_on=None, add_identity256=None, vectorized=None,
+                 bulk_fetch=None, bulk_fetch_chunk_size=None, max_workers=None, dataframe_cache=None,
+                 subject_identifiers=None, identity256_cache=None, compact_dtypes=None, **kwargs):
         super(Subjects, self).__init__(**kwargs)
         self.merge_on = merge_on or HOUSEHOLD_MEMBER
         self.add_identity256 = True if add_identity256 is True else False
+        self.vectorized = False if vectorized is False else True
+        self.bulk_fetch = True if bulk_fetch is True else False
+        self.bulk_fetch_chunk_size = bulk_fetch_chunk_size or self.default_bulk_fetch_chunk_size
+        self.max_workers = max_workers
+        self.dataframe_cache = dataframe_cache
+        self.subject_identifiers = subject_identifiers
+        self.identity256_cache = identity256_cache
+        self.compact_dtypes = True if compact_dtypes is True else False
+        self.load_times = {}
+        self.load_times_lock = threading.Lock()
         if self.merge_on not in (SUBJECT_IDENTIFIER, HOUSEHOLD_MEMBER):
             raise TypeError(
                 'Invalid merge_on column. Expected one of {}.'.format((SUBJECT_IDENTIFIER, HOUSEHOLD_MEMBER)))
@@ -54,6 +148,7 @@ class Subjects(CsvExportMixin):
         self._subject_pimas = pd.DataFrame()
         self._subject_referrals = pd.DataFrame()
         self._subject_requisitions = pd.DataFrame()
+        self._subject_visit_keys = pd.DataFrame()
         self._today_hiv_result = pd.DataFrame()
         self._elisa_hiv_result = pd.DataFrame()
         self.survey_name = survey_name
@@ -64,6 +159,8 @@ class Subjects(CsvExportMixin):
             self.merge_dataframes()
             self.map_edc_responses_to_numerics()
             self.add_derived_columns()
+            if self.compact_dtypes:
+                self._results = compact_dtypes(self._results, 'subjects')
         return self._results
 
     def merge_dataframes(self):
@@ -72,62 +169,119 @@ class Subjects(CsvExportMixin):
 
         All methods that return dataframes are prefixed with 'df_'."""
         drop_column = SUBJECT_IDENTIFIER if self.merge_on == HOUSEHOLD_MEMBER else HOUSEHOLD_MEMBER
-        self.df_subject_households.drop(drop_column, axis=1, inplace=True)
+        if self.max_workers:
+            self.prefetch_dataframes()
+        self.load_dataframe('df_subject_households').drop(drop_column, axis=1, inplace=True)
         self._results = pd.merge(
-            self.df_subject_consents, self.df_subject_households, how='left', on=self.merge_on)
-        for attrname in dir(self):
-            if attrname.startswith('df_') and attrname not in ('df_subject_consents', 'df_subject_households'):
+            self.load_dataframe('df_subject_consents'), self.df_subject_households, how='left', on=self.merge_on)
+        for attrname in self.dataframe_attrnames:
+            if attrname not in ('df_subject_consents', 'df_subject_households'):
                 suffix = '_' + ''.join([s[0] for s in attrname.split('_')])
-                df = getattr(self, attrname)
+                df = self.load_dataframe(attrname)
                 df.drop(drop_column, axis=1, inplace=True)
                 self._results = pd.merge(
                     self._results, df, how='left', on=self.merge_on, suffixes=['', suffix])
 
+    @property
+    def dataframe_attrnames(self):
+        """Return the names of all attributes that return dataframes, in merge order."""
+        return [attrname for attrname in dir(self) if attrname.startswith('df_')]
+
+    def load_dataframe(self, attrname):
+        """Return the df_ attribute and record the time it took on first load."""
+        if attrname not in self.load_times:
+            start = time.time()
+            getattr(self, attrname)
+            with self.load_times_lock:  # shared by the prefetch threads
+                self.load_times[attrname] = time.time() - start
+        return getattr(self, attrname)
+
+    def prefetch_dataframes(self):
+        """Load all df_ attributes on a pool of `max_workers` threads.
+
+        Returns once all dataframes are loaded."""
+        def load_dataframe(attrname):
+            try:
+                self.load_dataframe(attrname)
+            finally:
+                connection.close()  # the worker thread's connection
+        if self.bulk_fetch:
+            self.subject_visit_keys
+        pool = ThreadPool(self.max_workers)
+        try:
+            pool.map(load_dataframe, self.dataframe_attrnames)
+        finally:
+            pool.close()
+            pool.join()
+
+    def load_times_report(self):
+        """Return a dataframe of the seconds taken to load each df_ attribute, slowest first."""
+        with self.load_times_lock:
+            load_times = list(self.load_times.items())
+        df = pd.DataFrame(load_times, columns=['dataframe', 'seconds'])
+        return df.sort_values('seconds', ascending=False).reset_index(drop=True)
+
     def map_edc_responses_to_numerics(self):
         """Map responses from edc raw data, mostly strings, to numerics."""
-        self._results['arv_evidence'] = self._results['arv_evidence'].map(yes_no.get)
-        self._results['cd4_tested'] = self._results['cd4_tested'].map(yes_no.get)
-        self._results['circumcised'] = self._results['circumcised'].map(yes_no.get)
-        self._results['citizen'] = self._results['citizen'].map(yes_no.get)
-        self._results['citizen_or_spouse'] = self._results['citizen_or_spouse'].map(tf.get)
-        self._results['elisa_hiv_result'] = self._results['elisa_hiv_result'].map(hiv_options.get)
-        self._results['ever_taken_arv'] = self._results['ever_taken_arv'].map(yes_no.get)
-        self._results['gender'] = self._results['gender'].map(gender.get)
-        self._results['has_tested'] = self._results['has_tested'].map(yes_no.get)
-        self._results['household_residency'] = self._results['household_residency'].map(tf.get)
-        self._results['intend_residency'] = self._results['intend_residency'].map(tf.get)
-        self._results['on_arv'] = self._results['on_arv'].map(yes_no.get)
-        self._results['other_record'] = self._results['other_record'].map(yes_no.get)
-        self._results['part_time_resident'] = self._results['part_time_resident'].map(tf.get)
-        self._results['permanent_resident'] = self._results['permanent_resident'].map(yes_no.get)
-        self._results['pregnant'] = self._results['pregnant'].map(yes_no.get)
-        self._results['recorded_hiv_result'] = self._results['recorded_hiv_result'].map(hiv_options.get)
-        self._results['referred'] = self._results['referred'].map(yes_no.get)
-        self._results['result_recorded'] = self._results['result_recorded'].map(hiv_options.get)
-        self._results['self_reported_result'] = self._results['self_reported_result'].map(hiv_options.get)
-        self._results['spouse_of_citizen'] = self._results['spouse_of_citizen'].map(yes_no.get)
-        self._results['today_hiv_result'] = self._results['today_hiv_result'].map(hiv_options.get)
+        map_codes(self._results, self.coded_columns, 'subjects')
 
     def add_derived_columns(self):
-        attrnames = [
-            'timestamp',
-            'age_in_years',
-            'arv_evidence',
-            'final_arv_status',
-            'final_hiv_status',
-            'final_hiv_status_date',
-            'prev_result',
-            'prev_result_date',
-            'prev_result_known',
-            'pair',
-            'intervention',
-        ]
-        if self.add_identity256:
-            attrnames.append('identity256')
-        for attrname in attrnames:
-            self._results[attrname] = self._results.apply(
-                lambda row: getattr(DerivedVariables(row), attrname), axis=1)
+        if self.vectorized:
+            df = DerivedVariablesFrame(
+                self._results, add_identity256=self.add_identity256,
+                identity256_cache=self.identity256_cache).dataframe
+            for attrname in df.columns:
+                self._results[attrname] = df[attrname]
+        else:
+            for attrname in DerivedVariablesFrame.attrnames:
+                self._results[attrname] = self._results.apply(
+                    lambda row: getattr(DerivedVariables(row), attrname), axis=1)
+            if self.add_identity256:
+                self._results['identity256'] = identity256_bulk(
+                    self._results['identity'], cache=self.identity256_cache)
+
+    def crf_dataframe(self, model, columns):
+        """Return a dataframe of the CRF model's values for this survey with
+        the given columns.
+
+        Columns prefixed with 'subject_visit__' must be in SUBJECT_VISIT_KEYS."""
+        if not self.bulk_fetch:
+            qs = model.objects.values_list(*columns).filter(
+                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
+            qs = filter_in(
+                qs, 'subject_visit__household_member__registered_subject__subject_identifier',
+                self.subject_identifiers)
+            return self.queryset_to_dataframe(qs, columns)
+        visit_columns = [column for column in columns if column in SUBJECT_VISIT_KEYS]
+        crf_columns = ['subject_visit'] + [column for column in columns if column not in SUBJECT_VISIT_KEYS]
+        visit_ids = list(self.subject_visit_keys['subject_visit'])
+        frames = []
+        for index in range(0, len(visit_ids), self.bulk_fetch_chunk_size):
+            qs = model.objects.values_list(*crf_columns).filter(
+                subject_visit__in=visit_ids[index:index + self.bulk_fetch_chunk_size])
+            frames.append(self.queryset_to_dataframe(qs, crf_columns))
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=crf_columns)
+        df = pd.merge(
+            df, self.subject_visit_keys[['subject_visit'] + visit_columns], how='inner', on='subject_visit')
+        return df[columns]
+
+    @property
+    def subject_visit_keys(self):
+        """Return a dataframe of this survey's subject visit ids and the keys
+        used to merge CRF dataframes, named as in SUBJECT_VISIT_KEYS.
 
+        Only used if bulk_fetch=True."""
+        if self._subject_visit_keys.empty:
+            columns = ['id'] + list(SUBJECT_VISIT_KEYS.values())
+            qs = SubjectVisit.objects.values_list(*columns).filter(
+                household_member__household_structure__survey__survey_slug=self.survey_name)
+            qs = filter_in(qs, 'household_member__registered_subject__subject_identifier', self.subject_identifiers)
+            df = self.queryset_to_dataframe(qs, columns)
+            df = df.rename(columns=dict([(v, k) for k, v in SUBJECT_VISIT_KEYS.items()]))
+            self._subject_visit_keys = df.rename(columns={'id': 'subject_visit'})
+        return self._subject_visit_keys
+
+    @property
     def survey_sequence(self):
         n = int(self.survey_name[-1:])
         return [self.survey_name[:-1] + str(i) for i in range(1, n + 1)]
@@ -136,7 +290,22 @@ class Subjects(CsvExportMixin):
         subject_consents = SubjectConsent.objects.values_list(*columns).filter(
             household_member__household_structure__survey__survey_slug__in=self.survey_sequence).exclude(
                 household_member__household_structure__household__plot__status='bcpp_clinic')
-        return subject_consents
+        return filter_in(subject_consents, SUBJECT_IDENTIFIER, self.subject_identifiers)
+
+    def modified_subject_identifiers(self, since):
+        """Return a set of identifiers of subjects in this survey with a consent, visit
+        or CRF modified after `since`."""
+        subject_identifiers = modified_values(
+            SubjectConsent, since, SUBJECT_IDENTIFIER,
+            household_member__household_structure__survey__survey_slug__in=self.survey_sequence)
+        subject_identifiers.update(modified_values(
+            SubjectVisit, since, 'household_member__registered_subject__subject_identifier',
+            household_member__household_structure__survey__survey_slug=self.survey_name))
+        for model in self.crf_models:
+            subject_identifiers.update(modified_values(
+                model, since, 'subject_visit__household_member__registered_subject__subject_identifier',
+                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name))
+        return subject_identifiers
 
     @property
     def df_subject_consents(self):
@@ -146,7 +315,7 @@ class Subjects(CsvExportMixin):
                        'identity', 'identity_type', 'household_member_id', 'registered_subject_id',
                        'community', 'legal_marriage', 'version']
             qs = self.subject_consents(columns)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.queryset_to_dataframe(qs, columns)
             self._subject_consents = df.rename(columns={
                 'household_member_id': HOUSEHOLD_MEMBER,
                 'id': 'consent',
@@ -155,8 +324,7 @@ class Subjects(CsvExportMixin):
                 'consent_datetime': 'consent_date',
                 'version': 'version',
             })
-            self._subject_consents['consent_date'] = self._subject_consents.apply(
-                lambda row: datetime_to_date(row['consent_date']), axis=1)
+            self._subject_consents['consent_date'] = to_dates(self._subject_consents['consent_date'])
         return self._subject_consents
 
     @property
@@ -170,7 +338,7 @@ class Subjects(CsvExportMixin):
                 'household_member__household_structure__household__plot__plot_identifier',
                 'household_member__household_structure__survey__survey_slug']
             qs = self.subject_consents(columns)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.queryset_to_dataframe(qs, columns)
             df = df.rename(columns={
                 'household_member__household_structure': 'household_structure',
                 'household_member__household_structure__household__household_identifier': 'household_identifier',
@@ -192,15 +360,15 @@ class Subjects(CsvExportMixin):
             ]
             qs = SubjectVisit.objects.values_list(*columns).filter(
                 household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            qs = filter_in(qs, 'household_member__registered_subject__subject_identifier', self.subject_identifiers)
+            df = self.queryset_to_dataframe(qs, columns)
             self._subject_visits = df.rename(columns={
                 'report_datetime': 'visit_date',
                 'household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'household_member': HOUSEHOLD_MEMBER,
                 'appointment__visit_definition__visit_code': 'visit_code',
             })
-            self._subject_visits['visit_date'] = self._subject_visits.apply(
-                lambda row: datetime_to_date(row['visit_date']), axis=1)
+            self._subject_visits['visit_date'] = to_dates(self._subject_visits['visit_date'])
         return self._subject_visits
 
     @property
@@ -212,17 +380,14 @@ class Subjects(CsvExportMixin):
                 'subject_visit__household_member',
                 'arv_clinic', 'export_uuid', 'referral_clinic', 'referral_code', 'subject_referred',
                 'part_time_resident', 'vl_sample_drawn_datetime']
-            qs = SubjectReferral.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(SubjectReferral, columns)
             self._subject_referrals = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
                 'subject_referred': 'referred',
                 'vl_sample_drawn_datetime': 'vl_drawn_date',
             })
-            self._subject_referrals['vl_drawn_date'] = self._subject_referrals.apply(
-                lambda row: datetime_to_date(row['vl_drawn_date']), axis=1)
+            self._subject_referrals['vl_drawn_date'] = to_dates(self._subject_referrals['vl_drawn_date'])
         return self._subject_referrals
 
     @property
@@ -232,17 +397,14 @@ class Subjects(CsvExportMixin):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'hiv_result', 'hiv_result_datetime', 'why_not_tested']
-            qs = HivResult.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(HivResult, columns)
             self._today_hiv_result = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
                 'hiv_result': 'today_hiv_result',
                 'hiv_result_datetime': 'today_hiv_result_date',
                 'why_not_tested': 'reason_not_tested_today'})
-            self._today_hiv_result['today_hiv_result_date'] = self._today_hiv_result.apply(
-                lambda row: datetime_to_date(row['today_hiv_result_date']), axis=1)
+            self._today_hiv_result['today_hiv_result_date'] = to_dates(self._today_hiv_result['today_hiv_result_date'])
         return self._today_hiv_result
 
     @property
@@ -252,17 +414,15 @@ class Subjects(CsvExportMixin):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'hiv_result', 'hiv_result_datetime']
-            qs = ElisaHivResult.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(ElisaHivResult, columns)
             self._elisa_hiv_result = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
                 'hiv_result': 'elisa_hiv_result',
                 'hiv_result_datetime': 'elisa_hiv_result_date'})
             if not self._elisa_hiv_result.empty:
-                self._elisa_hiv_result['elisa_hiv_result_date'] = self._elisa_hiv_result.apply(
-                    lambda row: datetime_to_date(row['elisa_hiv_result_date']), axis=1)
+                self._elisa_hiv_result['elisa_hiv_result_date'] = to_dates(
+                    self._elisa_hiv_result['elisa_hiv_result_date'])
         return self._elisa_hiv_result
 
     @property
@@ -271,9 +431,7 @@ class Subjects(CsvExportMixin):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'has_tested', 'other_record', 'verbal_hiv_result']
-            qs = HivTestingHistory.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(HivTestingHistory, columns)
             self._hiv_testing_history = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
@@ -287,9 +445,7 @@ class Subjects(CsvExportMixin):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'recorded_hiv_result', 'hiv_test_date']
-            qs = HivTestReview.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(HivTestReview, columns)
             self._hiv_test_review = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
@@ -302,9 +458,7 @@ class Subjects(CsvExportMixin):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'result_recorded', 'result_date', 'result_doc_type']
-            qs = HivResultDocumentation.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(HivResultDocumentation, columns)
             self._hiv_result_documentation = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
@@ -319,9 +473,7 @@ class Subjects(CsvExportMixin):
                        'subject_visit__household_member',
                        'ever_taken_arv', 'on_arv', 'arv_evidence',
                        'clinic_receiving_from']
-            qs = HivCareAdherence.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(HivCareAdherence, columns)
             self._hiv_care_adherence = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER})
@@ -333,9 +485,7 @@ class Subjects(CsvExportMixin):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'circumcised']
-            qs = Circumcision.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(Circumcision, columns)
             self._circumcised = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER})
@@ -347,9 +497,7 @@ class Subjects(CsvExportMixin):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'currently_pregnant']
-            qs = ReproductiveHealth.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(ReproductiveHealth, columns)
             self._reproductive_health = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
@@ -362,9 +510,7 @@ class Subjects(CsvExportMixin):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'permanent_resident']
-            qs = ResidencyMobility.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(ResidencyMobility, columns)
             self._residency_mobility = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER})
@@ -377,17 +523,14 @@ class Subjects(CsvExportMixin):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'pima_today', 'pima_today_other', 'cd4_datetime', 'cd4_value']
-            qs = Pima.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(Pima, columns)
             self._subject_pimas = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
                 'pima_today': 'cd4_tested',
                 'pima_today_other': 'cd4_not_tested_reason',
                 'cd4_datetime': 'cd4_date'})
-            self._subject_pimas['cd4_date'] = self._subject_pimas.apply(
-                lambda row: datetime_to_date(row['cd4_date']), axis=1)
+            self._subject_pimas['cd4_date'] = to_dates(self._subject_pimas['cd4_date'])
         return self._subject_pimas
 
     @property
@@ -400,9 +543,7 @@ class Subjects(CsvExportMixin):
                        'subject_visit__household_member',
                        'hic_permission', 'permanent_resident', 'intend_residency', 'household_residency',
                        'citizen_or_spouse']
-            qs = HicEnrollment.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(HicEnrollment, columns)
             self._hic_enrollment = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER})
@@ -445,9 +586,7 @@ class Subjects(CsvExportMixin):
                        'subject_visit__household_member', 'panel__name', 'is_drawn',
                        'requisition_identifier', 'requisition_datetime', 'specimen_identifier',
                        'drawn_datetime', 'reason_not_drawn']
-            qs = SubjectRequisition.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(SubjectRequisition, columns)
             self._subject_requisitions = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
@@ -25,8 +25,6 @@ from bhp066.apps.bcpp_subject.models import LabourMarketWages, Demographics, Edu
 
 from bcpp_export.constants import SUBJECT_IDENTIFIER, HOUSEHOLD_MEMBER
 
-from ..constants import hiv_options
-
 from .subjects import Subjects
 
 
@@ -43,6 +41,10 @@ class SubjectsCrio2017(Subjects):
         s.to_csv()
     """
 
+    crf_models = Subjects.crf_models + [LabourMarketWages, Demographics, Education, MonthsRecentPartner]
+
+    coded_columns = dict(Subjects.coded_columns, first_partner_hiv='hiv_options')
+
     def __init__(self, survey_name, merge_on=None, add_identity256=None, **kwargs):
         self._demographics = pd.DataFrame()
         self._education = pd.DataFrame()
@@ -50,19 +52,13 @@ class SubjectsCrio2017(Subjects):
         self._months_recent_partner = pd.DataFrame()
         super(SubjectsCrio2017, self).__init__(survey_name, merge_on, add_identity256, **kwargs)
 
-    def map_edc_responses_to_numerics(self):
-        self._results['first_partner_hiv'] = self._results['first_partner_hiv'].map(hiv_options.get)
-        super(SubjectsCrio2017, self).map_edc_responses_to_numerics()
-
     @property
     def df_labour_market_wages(self):
         if self._labour_market_wages.empty:
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'employed', 'days_worked', 'monthly_income', 'salary_payment']
-            qs = LabourMarketWages.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(LabourMarketWages, columns)
             self._labour_market_wages = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
@@ -78,9 +74,7 @@ class SubjectsCrio2017(Subjects):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'marital_status']
-            qs = Demographics.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(Demographics, columns)
             self._demographics = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
@@ -93,9 +87,7 @@ class SubjectsCrio2017(Subjects):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'education', 'working', 'job_type']
-            qs = Education.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(Education, columns)
             self._education = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
@@ -110,9 +102,7 @@ class SubjectsCrio2017(Subjects):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'first_relationship', 'first_partner_hiv']
-            qs = MonthsRecentPartner.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(MonthsRecentPartner, columns)
             self._months_recent_partner = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
@@ -126,9 +116,7 @@ class SubjectsCrio2017(Subjects):
             columns = ['subject_visit__household_member__registered_subject__subject_identifier',
                        'subject_visit__household_member',
                        'permanent_resident', 'length_residence']
-            qs = ResidencyMobility.objects.values_list(*columns).filter(
-                subject_visit__household_member__household_structure__survey__survey_slug=self.survey_name)
-            df = pd.DataFrame(list(qs), columns=columns)
+            df = self.crf_dataframe(ResidencyMobility, columns)
             self._residency_mobility = df.rename(columns={
                 'subject_visit__household_member__registered_subject__subject_identifier': SUBJECT_IDENTIFIER,
                 'subject_visit__household_member': HOUSEHOLD_MEMBER,
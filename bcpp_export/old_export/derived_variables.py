@@ -10,6 +10,7 @@ from .communities import communities, intervention
 from .constants import (YES, NO, DEFAULTER, NAIVE, NEG, ON_ART, POS, UNK,
                         SUBJECT_IDENTIFIER, edc_ART_PRESCRIPTION)
 from .identity256 import identity256
+from .identity256_cache import identity256_bulk
 
 
 class DerivedVariables(object):
@@ -206,3 +207,209 @@ class DerivedVariables(object):
             self.final_hiv_status = POS
         else:
             self.final_hiv_status = UNK
+
+
+class DerivedVariablesFrame(object):
+
+    """A class that prepares the same derived variables as DerivedVariables but
+    column-wise for a whole dataframe.
+
+    Each rule of DerivedVariables is expressed as a boolean mask and resolved
+    with np.select so the decision tree runs once per column instead of once per
+    row per attribute.
+
+        df = DerivedVariablesFrame(subjects_df, add_identity256=True).dataframe
+
+    identity256 is hashed with identity256_bulk using `identity256_cache`, if set.
+    """
+
+    attrnames = [
+        'timestamp',
+        'age_in_years',
+        'arv_evidence',
+        'final_arv_status',
+        'final_hiv_status',
+        'final_hiv_status_date',
+        'prev_result',
+        'prev_result_date',
+        'prev_result_known',
+        'pair',
+        'intervention',
+    ]
+
+    def __init__(self, df, add_identity256=None, identity256_cache=None):
+        self.df = df
+        self.index = df.index
+        self.add_identity256 = True if add_identity256 is True else False
+        self.identity256_cache = identity256_cache
+        self.arv_evidence = df['arv_evidence'].where(
+            df['result_recorded_document'] != edc_ART_PRESCRIPTION, YES)
+        self.prepare_documented_status_and_date()
+        self.prepare_final_hiv_status()
+        self.prepare_final_arv_status()
+        self.prepare_previous_status_date_and_awareness()
+
+    @property
+    def dataframe(self):
+        """Return a dataframe of the derived columns indexed like the source dataframe."""
+        df = pd.DataFrame(index=self.index)
+        attrnames = self.attrnames + (['identity256'] if self.add_identity256 else [])
+        for attrname in attrnames:
+            df[attrname] = getattr(self, attrname)
+        return df
+
+    def series(self, values):
+        return pd.Series(values, index=self.index)
+
+    def objects(self, column):
+        """Return the column as an object array so dates keep their type through np.select."""
+        return self.df[column].astype(object).values
+
+    def numerics(self, column):
+        return pd.to_numeric(self.df[column], errors='coerce').values
+
+    @property
+    def timestamp(self):
+        return timezone.now()
+
+    @property
+    def age_in_years(self):
+        visit_date = pd.to_datetime(self.df['visit_date'], errors='coerce')
+        dob = pd.to_datetime(self.df['dob'], errors='coerce')
+        before_birthday = ((visit_date.dt.month < dob.dt.month) |
+                           ((visit_date.dt.month == dob.dt.month) & (visit_date.dt.day < dob.dt.day)))
+        age_in_years = visit_date.dt.year - dob.dt.year - before_birthday.astype(int)
+        invalid = pd.isnull(visit_date) | pd.isnull(dob)
+        if invalid.any():
+            sys.stdout.write('Cannot calculate age_in_years for {} subjects. Got missing visit_date '
+                             'or dob.\n'.format(invalid.sum()))
+        return age_in_years.where(~invalid, -1).astype(int)
+
+    @property
+    def pair(self):
+        return self.df['community'].map(
+            lambda name: communities.get(name).pair if name in communities else np.nan)
+
+    @property
+    def intervention(self):
+        return self.df['community'].map(
+            lambda name: (1 if communities.get(name).intervention else 0) if name in communities else np.nan)
+
+    @property
+    def identity256(self):
+        return identity256_bulk(self.df['identity'], cache=self.identity256_cache)
+
+    @property
+    def final_hiv_status_date(self):
+        """Return the oldest POS result date or the most recent NEG result date."""
+        df = self.df
+        prev_known = self.prev_result_known == YES
+        if_pos = self.final_hiv_status == POS
+        if_neg = self.final_hiv_status == NEG
+        return self.series(np.select(
+            [if_pos & prev_known & (self.prev_result == POS),
+             if_pos & (df['today_hiv_result'] == POS),
+             if_pos & (df['elisa_hiv_result'] == POS),
+             if_neg & pd.notnull(df['elisa_hiv_result_date']),
+             if_neg & pd.notnull(df['today_hiv_result_date']),
+             if_neg & prev_known & (self.prev_result == NEG)],
+            [self.prev_result_date.astype(object).values,
+             self.objects('today_hiv_result_date'),
+             self.objects('elisa_hiv_result_date'),
+             self.objects('elisa_hiv_result_date'),
+             self.objects('today_hiv_result_date'),
+             self.prev_result_date.astype(object).values],
+            default=np.nan))
+
+    def prepare_documented_status_and_date(self):
+        df = self.df
+        recorded_pos = df['recorded_hiv_result'] == POS
+        other_record_pos = (df['other_record'] == YES) & (df['result_recorded'] == POS)
+        self.documented_pos = self.series(np.where(
+            recorded_pos | other_record_pos | (self.arv_evidence == YES), YES, NO))
+        self.documented_pos_date = self.series(np.select(
+            [recorded_pos, other_record_pos],
+            [self.objects('recorded_hiv_result_date'), self.objects('result_recorded_date')],
+            default=pd.NaT))
+
+    def prepare_final_hiv_status(self):
+        df = self.df
+        self.final_hiv_status = self.series(np.select(
+            [df['elisa_hiv_result'].isin([POS, NEG]),
+             df['today_hiv_result'].isin([POS, NEG]),
+             self.documented_pos == YES],
+            [self.numerics('elisa_hiv_result'), self.numerics('today_hiv_result'), POS],
+            default=UNK))
+
+    def prepare_final_arv_status(self):
+        df = self.df
+        ever_taken_arv = df['ever_taken_arv']
+        on_arv = df['on_arv']
+        arv_evidence = self.arv_evidence
+        pos = self.final_hiv_status == POS
+        naive = (pos & (pd.isnull(ever_taken_arv) | ever_taken_arv.isin([NO, 'DWTA'])) &
+                 ((arv_evidence == NO) | pd.isnull(arv_evidence)))
+        defaulter = pos & ((ever_taken_arv == YES) | (arv_evidence == YES)) & (on_arv == NO)
+        on_art = pos & ((arv_evidence == YES) | (ever_taken_arv == YES)) & (on_arv == YES)
+        on_art_by_evidence = pos & (arv_evidence == YES) & pd.isnull(on_arv) & pd.isnull(ever_taken_arv)
+        self.final_arv_status = self.series(np.select(
+            [naive, defaulter, on_art, on_art_by_evidence],
+            [NAIVE, DEFAULTER, ON_ART, ON_ART],
+            default=np.nan))
+        undetermined = pos & pd.isnull(self.final_arv_status)
+        for _, row in df[undetermined].iterrows():
+            sys.stdout.write(
+                'Cannot determine final_arv_status for {}. '
+                'Got ever_taken_arv={}, on_arv={}, arv_evidence={}'.format(
+                    row[SUBJECT_IDENTIFIER], row['ever_taken_arv'], row['on_arv'],
+                    arv_evidence[row.name]))
+
+    def prepare_previous_status_date_and_awareness(self):
+        """Prepare prev_result, prev_result_date, and prev_result_known.
+
+        Follows the same sequence as DerivedVariables.prepare_previous_status_date_and_awareness."""
+        df = self.df
+        self.prev_result = self.series(np.nan)
+        self.prev_result_date = self.series(pd.NaT).astype(object)
+        self.prev_result_known = self.series(np.nan)
+        self.update_prev_result_if(pd.Series(True, index=self.index), POS)
+        self.update_prev_result_if(pd.isnull(self.prev_result), NEG)
+        prev_results_discordant = (
+            pd.notnull(df['result_recorded']) & pd.notnull(df['recorded_hiv_result']) &
+            (df['result_recorded'] != df['recorded_hiv_result']))
+        self.update_prev_result_if(
+            prev_results_discordant & (self.final_hiv_status != self.prev_result), self.final_hiv_status)
+        no_prev_result = pd.isnull(self.prev_result)
+        self.prev_result_date[no_prev_result] = np.nan
+        self.prev_result_known[no_prev_result] = np.nan
+        self.previous_status_date_and_awareness_exceptions()
+
+    def update_prev_result_if(self, mask, result):
+        """Update the prev_result columns for rows in `mask` where recorded_hiv_result
+        or result_recorded equals `result` (a scalar or a series aligned with df)."""
+        df = self.df
+        recorded = mask & (df['recorded_hiv_result'] == result)
+        result_recorded = mask & ~recorded & (df['result_recorded'] == result)
+        updated = recorded | result_recorded
+        self.prev_result = self.prev_result.where(
+            ~updated, pd.to_numeric(df['recorded_hiv_result'].where(recorded, df['result_recorded']),
+                                    errors='coerce'))
+        self.prev_result_date[recorded] = df['recorded_hiv_result_date'][recorded]
+        self.prev_result_date[result_recorded] = df['result_recorded_date'][result_recorded]
+        self.prev_result_known[updated] = YES
+
+    def previous_status_date_and_awareness_exceptions(self):
+        """Overwrite invalid result sequence and/or derive from arv status if possible."""
+        df = self.df
+        # evidence of ARV's implies POS previous result
+        on_arv = (self.final_arv_status.isin([DEFAULTER, ON_ART]) &
+                  ((self.prev_result == NEG) | pd.isnull(self.prev_result)))
+        best_prev_result_date = self.series(np.select(
+            [df['recorded_hiv_result'] == POS, df['result_recorded'] == POS],
+            [self.objects('recorded_hiv_result_date'), self.objects('result_recorded_date')],
+            default=np.nan))
+        self.prev_result[on_arv] = POS
+        self.prev_result_date[on_arv] = best_prev_result_date[on_arv]
+        self.prev_result_known[on_arv] = YES
+        # if finally NEG, a known previous result must wrong, so flip to NEG
+        self.prev_result[(self.final_hiv_status == NEG) & (self.prev_result_known == YES)] = NEG
@@ -12,3 +12,15 @@ def enrolled(subjects, row, column):
     if subjects[subjects[column].isin([row[column]])].empty:
         return NO
     return YES
+
+
+def enrolled_bulk(subjects, values, column):
+    """Return an array of YES/NO, one for each of values, based on whether
+    the value is in the subjects dataframe column, or NaN if subjects is empty.
+
+    Same as `enrolled` but for a whole column of values in a single pass, e.g.
+        df['enrolled'] = enrolled_bulk(subjects, df['plot_identifier'], 'plot_identifier')
+    """
+    if subjects.empty:
+        return np.full(len(values), np.nan)
+    return np.where(values.isin(subjects[column].unique()), YES, NO)
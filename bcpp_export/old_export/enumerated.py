@@ -10,3 +10,11 @@ def enumerated(members, row):
     if members[members['household_identifier'].isin([row['household_identifier']])].empty:
         return NO
     return YES
+
+
+def enumerated_bulk(members, values):
+    """Return an array of YES/NO, one for each household_identifier in values,
+    or NaN if members is empty."""
+    if members.empty:
+        return np.full(len(values), np.nan)
+    return np.where(values.isin(members['household_identifier'].unique()), YES, NO)
@@ -1,113 +1,239 @@
-# import os
-# import sys
-#
-# from django.db.models.loading import get_apps, get_models
-# from django.db.utils import OperationalError
-#
-# from .dataframes.edc import EdcModelToDataFrame
-#
-#
-# class Export:
-#
-#     def __init__(self, path=None):
-#         self.path = path or '/Users/erikvw/bcpp_201703'
-#         self.unencrypted_models = []
-#         self.encrypted_models = []
-#         excluded_models = [
-#             'incomingtransaction', 'outgoingtransaction', 'crypt']
-#         for app in get_apps():
-#             for model in get_models(app):
-#                 for field in model._meta.fields:
-#                     if hasattr(field, 'field_cryptor'):
-#                         self.encrypted_models.append(model)
-#                         model = None
-#                         break
-#                 if model:
-#                     self.unencrypted_models.append(model)
-#         self.unencrypted_models = [
-#             m for m in self.unencrypted_models
-#             if m._meta.model_name not in excluded_models]
-#         self.unencrypted_models.sort(
-#             key=lambda x: x._meta.app_label + x._meta.model_name)
-#         self.encrypted_models = [
-#             m for m in self.encrypted_models
-#             if m._meta.model_name not in excluded_models]
-#         self.encrypted_models.sort(
-#             key=lambda x: x._meta.app_label + x._meta.model_name)
-#         self.make_folders()
-#
-#     def make_folders(self):
-#         """mkdir a folder for each app that has models relative to path.
-#         """
-#         # build folder structure for CSV files
-#         for models in [self.unencrypted_models, self.encrypted_models]:
-#             paths = []
-#             for model in models:
-#                 path_or_buf = os.path.join(
-#                     self.path, model._meta.app_label)
-#                 paths.append(path_or_buf)
-#             paths = list(set(paths))
-#             for p in paths:
-#                 try:
-#                     os.mkdir(p)
-#                 except OSError:
-#                     pass
-#
-#     def export_model_to_csv(self, model, overwrite_csv=None, encrypted=None):
-#         overwrite_csv = False if overwrite_csv is None else False
-#         msg = '{}.{}{}'.format(
-#             model._meta.app_label, model._meta.model_name, ' (encrypted)' if encrypted else '')
-#         sys.stdout.write(msg + '\r')
-#         count = model.objects.all().count()
-#         if count > 0:
-#             path_or_buf = os.path.join(
-#                 self.path, model._meta.app_label,
-#                 '{}.csv'.format(model._meta.model_name))
-#             if os.path.exists(path_or_buf):
-#                 sys.stdout.write(
-#                     '{} exists ({} records).\n'.format(msg, count))
-#             if ((not os.path.exists(path_or_buf))
-#                     or (os.path.exists(path_or_buf) and overwrite_csv)):
-#                 sys.stdout.write('{} creating **** \r'.format(msg))
-#                 try:
-#                     e = EdcModelToDataFrame(model)
-#                 except OperationalError as err:
-#                     sys.stdout.write('\nError. {}. Got {}\n\n'.format(
-#                         model._meta.model_name, str(err)))
-#                 else:
-#                     path_or_buf = os.path.join(
-#                         self.path, model._meta.app_label,
-#                         '{}.csv'.format(model._meta.model_name))
-#                     e.dataframe.to_csv(
-#                         columns=e.columns(model.objects.all(), None),
-#                         path_or_buf=path_or_buf,
-#                         index=False,
-#                         encoding='utf-8')
-#                     sys.stdout.write('{} creating **** Done\n'.format(msg))
-#         else:
-#             sys.stdout.write('{} empty\n'.format(msg))
-#
-#     def export_unencrypted(self, models=None, skip_models=None,
-#                            reverse=None, overwrite_csv=None):
-#         """Creates a CSV file for each model and places in
-#         path/app_label/modelname.csv.
-#         """
-#         models = models or self.unencrypted_models
-#         for model in models:
-#             self.export_model_to_csv(
-#                 model, overwrite_csv=overwrite_csv)
-#
-#     def export_encrypted(self, models=None, skip_models=None,
-#                          reverse=None, overwrite_csv=None):
-#         """Creates a CSV file for each model and places in
-#         path/app_label/modelname.csv.
-#         """
-#         models = models or self.encrypted_models
-#         if reverse:
-#             self.encrypted_models.reverse()
-#         if skip_models:
-#             models = [
-#                 m for m in models if m._meta.model_name not in skip_models]
-#         for model in models:
-#             self.export_model_to_csv(
-#                 model, overwrite_csv=overwrite_csv, encrypted=True)
+import hashlib
+import json
+import os
+import sys
+import time
+
+from multiprocessing import Pool
+
+from django.db import connection
+from django.db.models.loading import get_apps, get_models, get_model
+from django.db.utils import OperationalError
+
+from .dataframes.csv_export_mixin import export_file
+from .dataframes.edc import EdcModelToDataFrame
+from .dataframes.edc.edc_watermark import model_watermark
+
+
+def file_checksum(path):
+    """Return the sha256 hexdigest of the file."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def dump_model(model, path, chunksize=None):
+    """Write the model's table to a CSV file at `path` and return its manifest entry.
+
+    The table is read in primary key ranged chunks, each written as it is read."""
+    chunksize = chunksize or 10000
+    start = time.time()
+    rows = 0
+    with export_file(path) as f:
+        for df in EdcModelToDataFrame.chunks(model, chunksize=chunksize):
+            df.to_csv(f, header=rows == 0, index=False, encoding='utf-8')
+            rows += len(df)
+    return {
+        'model': '{}.{}'.format(model._meta.app_label, model._meta.model_name),
+        'path': path,
+        'rows': rows,
+        'sha256': file_checksum(path),
+        'seconds': round(time.time() - start, 3)}
+
+
+def _dump_model(args):
+    app_label, model_name, path, chunksize = args
+    try:
+        return dump_model(get_model(app_label, model_name), path, chunksize)
+    except OperationalError as err:
+        return {'model': '{}.{}'.format(app_label, model_name), 'path': path, 'error': str(err)}
+
+
+class Export(object):
+
+    """Export every model of every app to a CSV file, path/app_label/modelname.csv.
+
+        export = Export('/Users/erikvw/bcpp_201703')
+        export.dump(processes=4)
+
+    `dump` exports the models on a pool of processes, largest table first, and writes
+    a manifest of row counts, checksums and durations to path/manifest.json.
+
+    Each table is written to a temp file and renamed when complete, then its manifest
+    entry, with the table's watermark (row count, max pk and max modified), is written.
+    A dump that is interrupted is resumed by calling `dump` again, which skips the
+    tables whose watermark has not changed since they were written.
+    """
+
+    manifest_filename = 'manifest.json'
+
+    def __init__(self, path=None):
+        self.path = path or '/Users/erikvw/bcpp_201703'
+        self.unencrypted_models = []
+        self.encrypted_models = []
+        excluded_models = [
+            'incomingtransaction', 'outgoingtransaction', 'crypt']
+        for app in get_apps():
+            for model in get_models(app):
+                for field in model._meta.fields:
+                    if hasattr(field, 'field_cryptor'):
+                        self.encrypted_models.append(model)
+                        model = None
+                        break
+                if model:
+                    self.unencrypted_models.append(model)
+        self.unencrypted_models = [
+            m for m in self.unencrypted_models
+            if m._meta.model_name not in excluded_models]
+        self.unencrypted_models.sort(
+            key=lambda x: x._meta.app_label + x._meta.model_name)
+        self.encrypted_models = [
+            m for m in self.encrypted_models
+            if m._meta.model_name not in excluded_models]
+        self.encrypted_models.sort(
+            key=lambda x: x._meta.app_label + x._meta.model_name)
+        self.make_folders()
+
+    def make_folders(self):
+        """mkdir a folder for each app that has models relative to path.
+        """
+        # build folder structure for CSV files
+        for models in [self.unencrypted_models, self.encrypted_models]:
+            paths = []
+            for model in models:
+                path_or_buf = os.path.join(
+                    self.path, model._meta.app_label)
+                paths.append(path_or_buf)
+            paths = list(set(paths))
+            for p in paths:
+                try:
+                    os.mkdir(p)
+                except OSError:
+                    pass
+
+    def csv_path(self, model):
+        return os.path.join(
+            self.path, model._meta.app_label,
+            '{}.csv'.format(model._meta.model_name))
+
+    def export_model_to_csv(self, model, overwrite_csv=None, encrypted=None):
+        overwrite_csv = True if overwrite_csv is True else False
+        msg = '{}.{}{}'.format(
+            model._meta.app_label, model._meta.model_name, ' (encrypted)' if encrypted else '')
+        sys.stdout.write(msg + '\r')
+        count = model.objects.all().count()
+        if count > 0:
+            path_or_buf = self.csv_path(model)
+            if os.path.exists(path_or_buf):
+                sys.stdout.write(
+                    '{} exists ({} records).\n'.format(msg, count))
+            if ((not os.path.exists(path_or_buf))
+                    or (os.path.exists(path_or_buf) and overwrite_csv)):
+                sys.stdout.write('{} creating **** \r'.format(msg))
+                try:
+                    e = EdcModelToDataFrame(model)
+                except OperationalError as err:
+                    sys.stdout.write('\nError. {}. Got {}\n\n'.format(
+                        model._meta.model_name, str(err)))
+                else:
+                    with export_file(path_or_buf) as f:
+                        e.dataframe.to_csv(
+                            f,
+                            columns=e.columns(model.objects.all(), None),
+                            index=False,
+                            encoding='utf-8')
+                    sys.stdout.write('{} creating **** Done\n'.format(msg))
+        else:
+            sys.stdout.write('{} empty\n'.format(msg))
+
+    def export_unencrypted(self, models=None, skip_models=None,
+                           reverse=None, overwrite_csv=None):
+        """Creates a CSV file for each model and places in
+        path/app_label/modelname.csv.
+        """
+        models = models or self.unencrypted_models
+        for model in models:
+            self.export_model_to_csv(
+                model, overwrite_csv=overwrite_csv)
+
+    def export_encrypted(self, models=None, skip_models=None,
+                         reverse=None, overwrite_csv=None):
+        """Creates a CSV file for each model and places in
+        path/app_label/modelname.csv.
+        """
+        models = models or self.encrypted_models
+        if reverse:
+            self.encrypted_models.reverse()
+        if skip_models:
+            models = [
+                m for m in models if m._meta.model_name not in skip_models]
+        for model in models:
+            self.export_model_to_csv(
+                model, overwrite_csv=overwrite_csv, encrypted=True)
+
+    def dump(self, models=None, processes=None, chunksize=None, resume=None):
+        """Export the models, by default all, on a pool of `processes` processes
+        (1 exports in process), largest table first, and return the manifest.
+
+        Each table is read in primary key ranged chunks of `chunksize` rows and
+        written to its CSV file as it is read. Empty tables are skipped, as are tables
+        unchanged since the manifest entry of a previous dump unless `resume` is False."""
+        resume = False if resume is False else True
+        models = models or self.unencrypted_models + self.encrypted_models
+        manifest = self.read_manifest() if resume else {}
+        manifest.update({'started': time.strftime('%Y-%m-%d %H:%M:%S'), 'finished': None})
+        manifest.setdefault('models', {})
+        watermarks = {}
+        for model in models:
+            label = '{}.{}'.format(model._meta.app_label, model._meta.model_name)
+            watermark = model_watermark(model)
+            if not watermark['count']:
+                continue
+            entry = manifest['models'].get(label, {})
+            if (entry.get('error') is None and os.path.exists(self.csv_path(model))
+                    and all([entry.get(key) == value for key, value in watermark.items()])):
+                sys.stdout.write('{} unchanged\n'.format(label))
+                continue
+            watermarks[label] = (watermark, model)
+        jobs = [(model._meta.app_label, model._meta.model_name, self.csv_path(model), chunksize)
+                for _, model in sorted(watermarks.values(), key=lambda item: item[0]['count'], reverse=True)]
+        if processes == 1:
+            results = (_dump_model(job) for job in jobs)
+        else:
+            # each process opens its own connection
+            connection.close()
+            pool = Pool(processes)
+            results = pool.imap_unordered(_dump_model, jobs)
+        try:
+            for entry in results:
+                if 'error' in entry:
+                    sys.stdout.write('Error. {}. Got {}\n'.format(entry['model'], entry['error']))
+                else:
+                    # the watermark is taken before the dump, so a table changed during
+                    # its dump is dumped again by the next run
+                    entry.update(watermarks[entry['model']][0])
+                    sys.stdout.write('{model} {rows} records in {seconds}s\n'.format(**entry))
+                manifest['models'][entry['model']] = entry
+                self.write_manifest(manifest)
+        finally:
+            if processes != 1:
+                pool.close()
+                pool.join()
+        manifest['finished'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.write_manifest(manifest)
+        return manifest
+
+    def read_manifest(self):
+        path = os.path.join(self.path, self.manifest_filename)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def write_manifest(self, manifest):
+        path = os.path.join(self.path, self.manifest_filename)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.rename(path + '.tmp', path)
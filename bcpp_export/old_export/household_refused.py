@@ -10,3 +10,12 @@ def household_refused(household_refusal, row, column=None):
     if household_refusal[household_refusal[column].isin([row[column]])].empty:
         return NO
     return YES
+
+
+def household_refused_bulk(household_refusal, values, column=None):
+    """Return an array of YES/NO, one for each of values, based on whether
+    the value is in the household_refusal dataframe column."""
+    column = 'household_identifier' if column is None else column
+    if household_refusal.empty:
+        return np.full(len(values), NO)
+    return np.where(values.isin(household_refusal[column].unique()), YES, NO)
@@ -0,0 +1,175 @@
+import hashlib
+import hmac
+import json
+import os
+import sys
+
+import pandas as pd
+
+from multiprocessing import Pool, cpu_count
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.color import color_style
+from django.utils import six
+from M2Crypto import EVP
+
+from .identity256 import identity256
+
+style = color_style()
+
+ENCRYPT = 1
+DECRYPT = 0
+
+
+def _compare_digest(a, b):
+    """Return True if the digests are equal, in time independent of where they
+    differ. For python < 2.7.7, which has no hmac.compare_digest."""
+    if len(a) != len(b):
+        return False
+    a, b = bytearray(a), bytearray(b)
+    result = 0
+    for x, y in six.moves.zip(a, b):
+        result |= x ^ y
+    return result == 0
+
+
+compare_digest = getattr(hmac, 'compare_digest', _compare_digest)
+
+
+def _identity256(value):
+    return identity256({'identity': value})
+
+
+class Identity256Cache(object):
+
+    """A persistent cache of identity -> identity256, stored AES encrypted in `cache_path`
+    and authenticated with an HMAC of the iv and ciphertext.
+
+    The key is read from `key_path`, by default settings.IDENTITY256_CACHE_KEY_PATH.
+    It is not created on first use; create it once with `create_key`:
+
+        Identity256Cache.create_key('~/.bcpp_export_identity256_cache.key')
+        cache = Identity256Cache()
+        df['identity256'] = identity256_bulk(df['identity'], cache=cache)
+    """
+
+    default_cache_path = '~/.bcpp_export_identity256.enc'
+    algorithm = 'aes_256_cbc'
+    iv_length = 16
+    mac_length = 32
+
+    def __init__(self, cache_path=None, key_path=None):
+        self.cache_path = os.path.expanduser(cache_path or self.default_cache_path)
+        key_path = key_path or getattr(settings, 'IDENTITY256_CACHE_KEY_PATH', None)
+        if not key_path:
+            raise ImproperlyConfigured(
+                'Identity256Cache requires a key. Set IDENTITY256_CACHE_KEY_PATH or pass key_path.')
+        self.key_path = os.path.expanduser(key_path)
+        if not os.path.exists(self.key_path):
+            raise ImproperlyConfigured(
+                'Identity256Cache key {} does not exist. Create it with Identity256Cache.create_key.'.format(
+                    self.key_path))
+        with open(self.key_path, 'rb') as f:
+            key = f.read()
+        # separate keys to encrypt and to authenticate
+        self.encryption_key = hmac.new(key, b'encrypt', hashlib.sha256).digest()
+        self.mac_key = hmac.new(key, b'authenticate', hashlib.sha256).digest()
+        self.hashes = self.load()
+
+    @classmethod
+    def create_key(cls, key_path):
+        """Write a new random key to `key_path`, which must not exist."""
+        key_path = os.path.expanduser(key_path)
+        if os.path.exists(key_path):
+            raise TypeError('Identity256Cache key {} already exists.'.format(key_path))
+        with open(key_path, 'wb') as f:
+            f.write(os.urandom(32))
+        os.chmod(key_path, 0o600)
+
+    def __contains__(self, identity):
+        return identity in self.hashes
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def get(self, identity):
+        return self.hashes.get(identity)
+
+    def update(self, hashes):
+        self.hashes.update(hashes)
+
+    def cipher(self, iv, op):
+        return EVP.Cipher(alg=self.algorithm, key=self.encryption_key, iv=iv, op=op)
+
+    def mac(self, data):
+        return hmac.new(self.mac_key, data, hashlib.sha256).digest()
+
+    def load(self):
+        """Return the decrypted cache or an empty dictionary if there is none or it
+        cannot be authenticated and decrypted with the key."""
+        if not os.path.exists(self.cache_path):
+            return {}
+        with open(self.cache_path, 'rb') as f:
+            data = f.read()
+        data, mac = data[:-self.mac_length], data[-self.mac_length:]
+        if not compare_digest(self.mac(data), mac):
+            sys.stdout.write(style.WARNING(
+                'Unable to authenticate identity256 cache {}. Ignoring.\n'.format(self.cache_path)))
+            return {}
+        iv, data = data[:self.iv_length], data[self.iv_length:]
+        cipher = self.cipher(iv, DECRYPT)
+        try:
+            return json.loads((cipher.update(data) + cipher.final()).decode('utf-8'))
+        except (EVP.EVPError, ValueError):
+            sys.stdout.write(style.WARNING(
+                'Unable to decrypt identity256 cache {}. Ignoring.\n'.format(self.cache_path)))
+            return {}
+
+    def save(self):
+        iv = os.urandom(self.iv_length)
+        cipher = self.cipher(iv, ENCRYPT)
+        data = iv + cipher.update(json.dumps(self.hashes).encode('utf-8')) + cipher.final()
+        with open(self.cache_path + '.tmp', 'wb') as f:
+            f.write(data + self.mac(data))
+        os.chmod(self.cache_path + '.tmp', 0o600)
+        os.rename(self.cache_path + '.tmp', self.cache_path)
+
+
+def identity256_bulk(identities, cache=None, processes=None):
+    """Return a series of identity256 values, one for each of identities, or NaN
+    where the identity is null.
+
+    Each unique identity is hashed once. Identities not in `cache` are hashed on a
+    pool of `processes` processes (default is the cpu count, 1 hashes in process),
+    then added to the cache and the cache is saved.
+
+    Same as `identity256` for a whole column, e.g.
+        df['identity256'] = identity256_bulk(df['identity'], cache=Identity256Cache())
+    """
+    identities = pd.Series(identities)
+    unique_identities = pd.unique(identities.dropna())
+    hashes = {}
+    missing = []
+    for identity in unique_identities:
+        if cache is not None and identity in cache:
+            hashes[identity] = cache.get(identity)
+        else:
+            missing.append(identity)
+    if missing:
+        if processes == 1 or len(missing) == 1:
+            values = [_identity256(identity) for identity in missing]
+        else:
+            processes = processes or cpu_count()
+            pool = Pool(processes)
+            try:
+                values = pool.map(_identity256, missing, chunksize=max(1, len(missing) // (4 * processes)))
+            finally:
+                pool.close()
+                pool.join()
+        new_hashes = dict(zip(missing, values))
+        hashes.update(new_hashes)
+        if cache is not None:
+            cache.update(new_hashes)
+            cache.save()
+    return identities.map(hashes)
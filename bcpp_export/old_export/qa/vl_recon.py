@@ -9,7 +9,7 @@ from bhp066.apps.bcpp_lab.models import ClinicRequisition, Panel
 from bhp066.apps.bcpp_clinic.models import (
     ClinicVlResult, ViralLoadTracking, Questionnaire, ClinicConsent)
 
-from bcpp_export.dataframes.edc import EdcModelToDataFrame
+from bcpp_export.dataframes.edc import edc_frames
 from bcpp_export.dataframes.lis import Lis
 
 
@@ -48,13 +48,13 @@ class VlRecon(object):
 #         else:
 #             self.df_lis = Lis().results
         # bcpp dataframes
-        self.df_consent = EdcModelToDataFrame(ClinicConsent).dataframe
+        self.df_consent = edc_frames.model_dataframe(ClinicConsent).copy()
         self.df_consent['is_verified'] = self.df_consent.apply(lambda row: 'Yes' if row['is_verified'] == True else 'No', axis=1)
-        self.df_track = EdcModelToDataFrame(ViralLoadTracking, add_columns_for='clinic_visit').dataframe
-        self.df_req = EdcModelToDataFrame(ClinicRequisition, add_columns_for='clinic_visit').dataframe
-        self.df_panel = EdcModelToDataFrame(Panel).dataframe
-        self.df_result = EdcModelToDataFrame(ClinicVlResult, add_columns_for='clinic_visit').dataframe
-        self.df_q = EdcModelToDataFrame(Questionnaire, add_columns_for='clinic_visit').dataframe
+        self.df_track = edc_frames.model_dataframe(ViralLoadTracking, add_columns_for='clinic_visit')
+        self.df_req = edc_frames.model_dataframe(ClinicRequisition, add_columns_for='clinic_visit')
+        self.df_panel = edc_frames.model_dataframe(Panel)
+        self.df_result = edc_frames.model_dataframe(ClinicVlResult, add_columns_for='clinic_visit')
+        self.df_q = edc_frames.model_dataframe(Questionnaire, add_columns_for='clinic_visit').copy()
         self.df_q['track'] = self.df_q.apply(lambda row: self.vl_track(row), axis=1)
         self.df_req = pd.merge(self.df_req, self.df_panel[['id', 'name']], left_on='panel_id', right_on='id', how='left', suffixes=['', '_panel'])
         self.df_req.rename(columns={'name': 'panel'}, inplace=True)
@@ -147,3 +147,5 @@ LIMIT_EDIT_TO_CURRENT_COMMUNITY = False
 SUBJECT_TYPES = ['subject']
 
 KEY_PATH = os.path.join(BASE_DIR, 'etc', 'keys')
+# key of the identity256 cache (see identity256_cache), kept apart from the crypto_fields keys
+IDENTITY256_CACHE_KEY_PATH = os.path.expanduser('~/.bcpp_export_identity256_cache.key')
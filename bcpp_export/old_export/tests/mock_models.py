@@ -0,0 +1,100 @@
+from collections import namedtuple
+from mock import MagicMock
+
+from django.utils import six
+
+Field = namedtuple('Field', 'name attname')
+Join = namedtuple('Join', 'table_name')
+
+
+class QuerySet(object):
+
+    """A queryset of rows, dictionaries keyed by column or lookup, that supports the
+    queryset methods the exports use: all, filter (exact, __in and __gt lookups),
+    order_by, slicing, values_list and the count, max_pk and max_modified aggregates.
+
+    Each time a values_list queryset is read, its filter lookups are appended to `reads`,
+    which is shared by all querysets derived from this one. `joins` are the tables the
+    query joins, as in query.alias_map."""
+
+    def __init__(self, rows=None, model=None, columns=None, joins=None, lookups=None, reads=None):
+        self.rows = [] if rows is None else rows
+        self.model = model
+        self.columns = columns
+        self.joins = joins or []
+        self.lookups = lookups or {}
+        self.reads = [] if reads is None else reads
+        self.query = MagicMock(alias_map=dict([(table, Join(table)) for table in self.joins]))
+        self.query.__str__ = lambda _: 'select'
+
+    def clone(self, rows=None, columns=None, lookups=None):
+        return QuerySet(
+            self.rows if rows is None else rows, self.model, columns or self.columns, self.joins,
+            lookups or self.lookups, self.reads)
+
+    def all(self):
+        return self.clone()
+
+    def filter(self, **kwargs):
+        rows = self.rows
+        for lookup, value in kwargs.items():
+            column, _, operator = lookup.rpartition('__')
+            if operator not in ('in', 'gt'):
+                column, operator = lookup, None
+            column = 'id' if column == 'pk' else column
+            if operator == 'in':
+                rows = [row for row in rows if row[column] in value]
+            elif operator == 'gt':
+                rows = [row for row in rows if row[column] > value]
+            else:
+                rows = [row for row in rows if row[column] == value]
+        lookups = dict(self.lookups)
+        lookups.update(kwargs)
+        return self.clone(rows=rows, lookups=lookups)
+
+    def order_by(self, *fields):
+        rows = list(self.rows)
+        for field in reversed(fields):
+            column = 'id' if field.lstrip('-') == 'pk' else field.lstrip('-')
+            rows.sort(key=lambda row: row[column], reverse=field.startswith('-'))
+        return self.clone(rows=rows)
+
+    def __getitem__(self, key):
+        return self.clone(rows=self.rows[key])
+
+    def values_list(self, *columns):
+        return self.clone(columns=columns)
+
+    def aggregate(self, **aggregates):
+        columns = {'max_pk': 'id', 'max_modified': 'modified'}
+        values = {}
+        for name in aggregates:
+            if name == 'count':
+                values[name] = len(self.rows)
+            else:
+                values[name] = max([row[columns[name]] for row in self.rows]) if self.rows else None
+        return values
+
+    def __iter__(self):
+        if self.columns is None:
+            return iter(self.rows)
+        self.reads.append(self.lookups)
+        return iter([tuple(row[column] for column in self.columns) for row in self.rows])
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def mock_model(app_label=None, model_name=None, fields=None, rows=None, joins=None):
+    """Return a mock model with `fields`, names or Field-like objects, and a QuerySet
+    of `rows` as its manager, `objects`."""
+    model = MagicMock()
+    model._meta.app_label = app_label or 'bcpp_subject'
+    model._meta.model_name = model_name or 'subjectconsent'
+    model._meta.db_table = '{}_{}'.format(model._meta.app_label, model._meta.model_name)
+    model._meta.pk.attname = 'id'
+    model._meta.fields = [
+        Field(field, field) if isinstance(field, six.string_types) else field for field in fields or ['id']]
+    model._meta.concrete_fields = model._meta.fields
+    model.objects = QuerySet(rows, model, joins=joins)
+    return model
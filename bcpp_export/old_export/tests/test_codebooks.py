@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from django.test.testcases import TestCase
+
+from bcpp_export.constants import (
+    DWTA, FEMALE, MALE, NEG, NO, NOT_APPLICABLE, POS, YES, gender, hiv_options, tf, yes_no)
+from bcpp_export.dataframes.codebooks import map_codes
+
+
+class TestCodebooks(TestCase):
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'gender': ['M', 'F', None, 'F', 'X'],
+            'on_arv': ['Yes', 'No', 'N/A', 'DWTA', np.nan],
+            'today_hiv_result': ['POS', 'NEG', 'positive', None, 'Pos'],
+            'citizen_or_spouse': [True, False, None, True, False]},
+            index=[5, 6, 7, 8, 9])
+        self.schema = {
+            'gender': 'gender', 'on_arv': 'yes_no',
+            'today_hiv_result': 'hiv_options', 'citizen_or_spouse': 'tf'}
+
+    def test_map_codes_same_as_map(self):
+        df = map_codes(self.df.copy(), self.schema)
+        for column, codebook in [('gender', gender), ('on_arv', yes_no),
+                                 ('today_hiv_result', hiv_options), ('citizen_or_spouse', tf)]:
+            pd.testing.assert_series_equal(
+                df[column], self.df[column].map(codebook.get).astype(float), check_names=False)
+        self.assertEqual(list(df['gender'][:2]), [MALE, FEMALE])
+        self.assertEqual(list(df['on_arv'][:4]), [YES, NO, NOT_APPLICABLE, DWTA])
+        self.assertEqual(list(df['today_hiv_result'][:3]), [POS, NEG, POS])
+
+    def test_map_codes_nullable_ints(self):
+        if hasattr(pd, 'Int8Dtype'):
+            df = map_codes(self.df.copy(), self.schema, nullable_ints=True)
+            self.assertEqual(str(df['gender'].dtype), 'Int8')
+            self.assertEqual(df['gender'].isnull().sum(), 2)
+
+    def test_map_codes_invalid_codebook(self):
+        self.assertRaises(TypeError, map_codes, self.df.copy(), {'gender': 'sex'})
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from datetime import date, datetime
+from decimal import Decimal
+from mock import patch
+from unittest import skipIf
+
+from django.test.testcases import TestCase
+
+from bcpp_export.dataframes.columnar_writers import (
+    ColumnarChunkStore, columnar_dataframe, readers, write_columnar, writers)
+from bcpp_export.dataframes.dtypes import compact_dtypes
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+try:
+    import tables
+except ImportError:
+    tables = None
+
+
+class TestColumnarWriters(TestCase):
+
+    def setUp(self):
+        self.export_folder = tempfile.mkdtemp()
+        self.df = pd.DataFrame({
+            'community': ['digawana', 'ranaka', 'digawana'],
+            'consent_date': [date(2014, 1, 1), None, date(2014, 2, 1)],
+            'enrolled': [1.0, np.nan, 0.0],
+            'gps_lat': [Decimal('-24.1'), Decimal('-24.2'), None],
+            'mixed': [1, 'a', None],
+            'subject_identifier': ['066-1', '066-2', '066-3'],
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.export_folder)
+
+    def test_columnar_dataframe(self):
+        df = columnar_dataframe(self.df)
+        self.assertEqual(str(df['community'].dtype), 'category')
+        self.assertEqual(df['consent_date'].dtype.kind, 'M')
+        self.assertEqual(df['gps_lat'].dtype.kind, 'f')
+        self.assertEqual(list(df['mixed'][:2]), ['1', 'a'])
+        self.assertTrue(pd.isnull(df['mixed'][2]))
+        self.assertEqual(list(df['subject_identifier']), ['066-1', '066-2', '066-3'])
+        if hasattr(pd, 'Int64Dtype'):
+            self.assertEqual(str(df['enrolled'].dtype), 'Int64')
+
+    def test_columnar_dataframe_without_nullable_ints(self):
+        df = columnar_dataframe(self.df, nullable_ints=False)
+        self.assertEqual(df['enrolled'].dtype.kind, 'f')
+
+    @skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_write_parquet(self):
+        path = os.path.join(self.export_folder, 'subjects.parquet')
+        write_columnar(self.df, path, 'subjects', 'parquet')
+        df = pd.read_parquet(path)
+        self.assertEqual(str(df['community'].dtype), 'category')
+        self.assertEqual(df['consent_date'][0], datetime(2014, 1, 1))
+        self.assertEqual(os.listdir(self.export_folder), ['subjects.parquet'])
+
+    @skipIf(pyarrow is None or tables is None, 'pyarrow or tables is not installed')
+    def test_write_and_read_all_formats(self):
+        df = self.df.copy()
+        df['survey'] = pd.Categorical(['bcpp-year-1', 'bcpp-year-2', 'bcpp-year-1'])
+        if hasattr(pd, 'Int8Dtype'):
+            df['circumcised'] = pd.Series([1, None, 2], dtype='Int8')
+        for export_format, (_, extension, supports_nullable_ints) in writers.items():
+            path = os.path.join(self.export_folder, 'subjects' + extension)
+            write_columnar(df, path, 'subjects', export_format)
+            df_read = readers[export_format](path, 'subjects')
+            self.assertEqual(list(df_read.columns), list(df.columns), export_format)
+            self.assertEqual(str(df_read['community'].dtype), 'category', export_format)
+            self.assertEqual(str(df_read['survey'].dtype), 'category', export_format)
+            self.assertEqual(list(df_read['survey']), list(df['survey']), export_format)
+            self.assertEqual(df_read['consent_date'][0], datetime(2014, 1, 1), export_format)
+            self.assertTrue(pd.isnull(df_read['consent_date'][1]), export_format)
+            self.assertEqual(list(df_read['gps_lat'][:2]), [-24.1, -24.2], export_format)
+            self.assertEqual(list(df_read['subject_identifier']), ['066-1', '066-2', '066-3'])
+            self.assertEqual(list(df_read['enrolled'].fillna(-1)), [1, -1, 0], export_format)
+            if hasattr(pd, 'Int8Dtype'):
+                self.assertEqual(list(df_read['circumcised'].fillna(-1)), [1, -1, 2], export_format)
+                self.assertEqual(
+                    df_read['circumcised'].dtype.kind, 'i' if supports_nullable_ints else 'f', export_format)
+        self.assertEqual(sorted(os.listdir(self.export_folder)), [
+            'subjects.feather', 'subjects.h5', 'subjects.parquet'])
+
+    def test_columnar_dataframe_nullable_ints_to_float(self):
+        if hasattr(pd, 'Int8Dtype'):
+            df = self.df.copy()
+            df['enrolled'] = df['enrolled'].astype('Int8')
+            df = columnar_dataframe(df, nullable_ints=False)
+            self.assertEqual(df['enrolled'].dtype, np.float64)
+            self.assertTrue(np.isnan(df['enrolled'][1]))
+
+    @skipIf(tables is None, 'tables is not installed')
+    def test_write_hdf5_compacted(self):
+        path = os.path.join(self.export_folder, 'subjects.h5')
+        write_columnar(compact_dtypes(columnar_dataframe(self.df)), path, 'subjects', 'hdf5')
+        df = pd.read_hdf(path, key='subjects')
+        self.assertEqual(list(df['enrolled'].fillna(-1)), [1.0, -1, 0.0])
+
+    def test_chunk_store_without_pyarrow(self):
+        path = os.path.join(self.export_folder, 'subjects.parquet')
+        with patch('bcpp_export.dataframes.columnar_writers.import_module', side_effect=ImportError):
+            store = ColumnarChunkStore(self.export_folder, 'subjects')
+            self.assertEqual(store.export_format, 'pickle')
+            store.append(self.df[:2])
+            store.append(self.df[2:])
+            self.assertRaises(ImportError, ColumnarChunkStore, self.export_folder, 'subjects', 'parquet')
+            self.assertRaises(ImportError, write_columnar, self.df, path, 'subjects', 'parquet')
+        self.assertEqual(sorted(os.listdir(self.export_folder)), ['subjects-00000.pkl', 'subjects-00001.pkl'])
+        pd.testing.assert_frame_equal(store.read(), self.df)
+
+    def test_invalid_export_format(self):
+        path = os.path.join(self.export_folder, 'subjects.xls')
+        self.assertRaises(TypeError, write_columnar, self.df, path, 'subjects', 'xls')
@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from mock import patch
+
+from django.test.testcases import TestCase
+
+from bcpp_export.dataframes.dataframe_cache import DataframeCache
+from bcpp_export.tests.mock_models import mock_model
+
+
+def rows(count):
+    return [{'id': n, 'subject_identifier': '066-{}'.format(n), 'value': n} for n in range(1, count + 1)]
+
+
+class TestDataframeCache(TestCase):
+
+    def setUp(self):
+        self.cache_folder = tempfile.mkdtemp()
+        self.df = pd.DataFrame({'subject_identifier': ['066-1', '066-2'], 'value': [1, 2]})
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_folder)
+
+    def test_put_and_get(self):
+        cache = DataframeCache(self.cache_folder, file_format='pickle')
+        cache.put('key1', self.df)
+        self.assertTrue(cache.get('key1').equals(self.df))
+        self.assertIsNone(cache.get('key2'))
+
+    def test_index_is_persisted(self):
+        cache = DataframeCache(self.cache_folder, file_format='pickle')
+        cache.put('key1', self.df)
+        cache = DataframeCache(self.cache_folder, file_format='pickle')
+        self.assertTrue(cache.get('key1').equals(self.df))
+
+    def test_put_replaces_same_query(self):
+        cache = DataframeCache(self.cache_folder, file_format='pickle')
+        cache.put('key1', self.df, query_key='query1')
+        cache.put('key2', self.df, query_key='query1')
+        self.assertIsNone(cache.get('key1'))
+        self.assertEqual(list(cache.index), ['key2'])
+
+    def test_evicts_least_recently_used(self):
+        cache = DataframeCache(self.cache_folder, file_format='pickle')
+        cache.put('key1', self.df)
+        cache.put('key2', self.df)
+        cache.get('key1')
+        cache.max_size = cache.size
+        cache.put('key3', self.df)
+        self.assertIn('key1', cache.index)
+        self.assertNotIn('key2', cache.index)
+        self.assertIn('key3', cache.index)
+        self.assertFalse(os.path.exists(os.path.join(self.cache_folder, 'key2.pkl')))
+
+    def test_clear(self):
+        cache = DataframeCache(self.cache_folder, file_format='pickle')
+        cache.put('key1', self.df)
+        cache.clear()
+        self.assertEqual(cache.index, {})
+        self.assertEqual(cache.size, 0)
+
+    def test_invalid_file_format(self):
+        self.assertRaises(TypeError, DataframeCache, self.cache_folder, file_format='xls')
+
+    def test_dataframe_replaced_when_table_changes(self):
+        cache = DataframeCache(self.cache_folder, watermark_ttl=0)
+        model = mock_model('bcpp_subject', 'hivresult', rows=rows(2))
+        columns = ['subject_identifier', 'value']
+        qs = model.objects.values_list(*columns)
+        with patch('bcpp_export.dataframes.dataframe_cache.get_models', return_value=[model]):
+            cache.dataframe(qs, columns, 'bcpp-year-1')
+            df = cache.dataframe(qs, columns, 'bcpp-year-1')
+            self.assertEqual(len(qs.reads), 1)
+            self.assertTrue(df.equals(self.df))
+            model.objects.rows.extend(rows(3)[2:])
+            df = cache.dataframe(qs, columns, 'bcpp-year-1')
+        self.assertEqual(len(qs.reads), 2)
+        self.assertEqual(list(df['value']), [1, 2, 3])
+        self.assertEqual(len(cache.index), 1)
+
+    def test_dataframe_replaced_when_joined_table_changes(self):
+        cache = DataframeCache(self.cache_folder, watermark_ttl=0)
+        model = mock_model('bcpp_subject', 'hivresult', rows=rows(2), joins=['bcpp_subject_subjectvisit'])
+        subject_visit = mock_model('bcpp_subject', 'subjectvisit', rows=rows(2))
+        other = mock_model('bcpp_household', 'plot', rows=rows(2))
+        columns = ['subject_identifier', 'value']
+        qs = model.objects.values_list(*columns)
+        with patch('bcpp_export.dataframes.dataframe_cache.get_models',
+                   return_value=[model, subject_visit, other]):
+            cache.dataframe(qs, columns, 'bcpp-year-1')
+            other.objects.rows.extend(rows(3)[2:])
+            cache.dataframe(qs, columns, 'bcpp-year-1')
+            self.assertEqual(len(qs.reads), 1)
+            subject_visit.objects.rows.extend(rows(3)[2:])
+            cache.dataframe(qs, columns, 'bcpp-year-1')
+        self.assertEqual(len(qs.reads), 2)
+
+    def test_watermark_ttl(self):
+        cache = DataframeCache(self.cache_folder, watermark_ttl=3600)
+        model = mock_model('bcpp_subject', 'hivresult', rows=rows(2))
+        watermark = cache.watermark(model)
+        model.objects.rows.extend(rows(3)[2:])
+        self.assertEqual(cache.watermark(model), watermark)
+        cache.watermark_ttl = 0
+        self.assertNotEqual(cache.watermark(model), watermark)
+
+    def test_watermarks_and_tables_queried_once_by_default(self):
+        cache = DataframeCache(self.cache_folder)
+        model = mock_model('bcpp_subject', 'hivresult', rows=rows(2))
+        columns = ['subject_identifier', 'value']
+        qs = model.objects.values_list(*columns)
+        with patch('bcpp_export.dataframes.dataframe_cache.get_models', return_value=[model]) as get_models:
+            with patch.object(model.objects, 'aggregate', wraps=model.objects.aggregate) as aggregate:
+                for _ in range(3):
+                    cache.dataframe(qs, columns, 'bcpp-year-1')
+        self.assertEqual(aggregate.call_count, 1)
+        self.assertEqual(get_models.call_count, 1)
+        self.assertEqual(len(qs.reads), 1)
+
+    def test_get_writes_index_on_close(self):
+        cache = DataframeCache(self.cache_folder, file_format='pickle')
+        cache.put('key1', self.df)
+        accessed = cache.index['key1']['accessed']
+        with patch.object(cache, 'write_index') as write_index:
+            cache.get('key1')
+        self.assertEqual(write_index.call_count, 0)
+        cache.index['key1']['accessed'] = accessed + 1
+        cache.close()
+        cache = DataframeCache(self.cache_folder, file_format='pickle')
+        self.assertEqual(cache.index['key1']['accessed'], accessed + 1)
+
+    def test_parquet_default(self):
+        cache = DataframeCache(self.cache_folder)
+        cache.put('key1', self.df)
+        self.assertEqual(cache.index['key1']['file_format'], 'parquet')
+        self.assertTrue(os.path.exists(os.path.join(self.cache_folder, 'key1.parquet')))
+        self.assertTrue(cache.get('key1').equals(self.df))
@@ -5,7 +5,7 @@ import pandas as pd
 
 from django.test.testcases import TestCase
 
-from bcpp_export.derived_variables import DerivedVariables
+from bcpp_export.derived_variables import DerivedVariables, DerivedVariablesFrame
 from bcpp_export.constants import (
     NEG, POS, UNK, YES, IND, NAIVE, NO, DEFAULTER, edc_ART_PRESCRIPTION, ON_ART, SUBJECT_IDENTIFIER)
 
@@ -38,6 +38,9 @@ class TestDerivedVariables(TestCase):
             'household_identifier': '99999-9',
         }
 
+    def derived_variables(self, row):
+        return DerivedVariables(row)
+
     def test(self):
         self.row.update(
             other_record=UNK,
@@ -47,7 +50,7 @@ class TestDerivedVariables(TestCase):
             today_hiv_result=POS,
             today_hiv_result_date=date(2016, 1, 7)
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_hiv_status, POS)
         self.assertEqual(obj.final_arv_status, NAIVE)
         self.assertEqual(obj.prev_result_known, YES)
@@ -59,7 +62,7 @@ class TestDerivedVariables(TestCase):
             today_hiv_result=POS,
             today_hiv_result_date=date(2016, 1, 7),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_hiv_status, POS)
         self.assertEqual(obj.final_hiv_status_date, date(2016, 1, 7))
         self.assertTrue(pd.isnull(obj.prev_result))
@@ -77,7 +80,7 @@ class TestDerivedVariables(TestCase):
             on_arv=NO,
             result_recorded_document=edc_ART_PRESCRIPTION,
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_arv_status, DEFAULTER)
         self.assertEqual(obj.final_hiv_status_date, date(2013, 5, 7))
         self.assertEqual(obj.prev_result_date, date(2013, 5, 7))
@@ -93,7 +96,7 @@ class TestDerivedVariables(TestCase):
             on_arv=NO,
             result_recorded_document=edc_ART_PRESCRIPTION,
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_arv_status, DEFAULTER)
         self.assertTrue(pd.isnull(obj.final_hiv_status_date))
         self.assertTrue(pd.isnull(obj.prev_result_date))
@@ -104,7 +107,7 @@ class TestDerivedVariables(TestCase):
             today_hiv_result=POS,
             today_hiv_result_date=date(2016, 1, 7),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertTrue(pd.isnull(obj.prev_result))
         self.assertTrue(pd.isnull(obj.prev_result_date))
         self.assertTrue(pd.isnull(obj.prev_result_known))
@@ -117,7 +120,7 @@ class TestDerivedVariables(TestCase):
             recorded_hiv_result=POS,
             recorded_hiv_result_date=date(2015, 1, 7),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result, POS)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 7))
         self.assertEqual(obj.prev_result_known, YES)
@@ -130,7 +133,7 @@ class TestDerivedVariables(TestCase):
             recorded_hiv_result=POS,
             recorded_hiv_result_date=date(2015, 1, 7)
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_hiv_status_date, date(2015, 1, 7))
 
     def test_prev_result_neg(self):
@@ -141,7 +144,7 @@ class TestDerivedVariables(TestCase):
             recorded_hiv_result=NEG,
             recorded_hiv_result_date=date(2015, 1, 7)
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, NEG)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 7))
@@ -157,7 +160,7 @@ class TestDerivedVariables(TestCase):
             result_recorded=POS,
             result_recorded_date=date(2014, 1, 7)
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, POS)
         self.assertEqual(obj.prev_result_date, date(2014, 1, 7))
@@ -173,7 +176,7 @@ class TestDerivedVariables(TestCase):
             result_recorded=NEG,
             result_recorded_date=date(2014, 1, 7)
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, NEG)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 7))
@@ -189,7 +192,7 @@ class TestDerivedVariables(TestCase):
             recorded_hiv_result=POS,
             recorded_hiv_result_date=date(2015, 1, 6),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, NEG)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 6))
@@ -204,7 +207,7 @@ class TestDerivedVariables(TestCase):
             result_recorded=POS,
             result_recorded_date=date(2015, 1, 6),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, NEG)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 6))
@@ -219,7 +222,7 @@ class TestDerivedVariables(TestCase):
             result_recorded=POS,
             result_recorded_date=date(2015, 1, 6),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, NEG)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 6))
@@ -235,7 +238,7 @@ class TestDerivedVariables(TestCase):
             result_recorded=POS,
             result_recorded_date=date(2014, 1, 7)
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_hiv_status, NEG)
         self.assertEqual(obj.final_hiv_status_date, date(2016, 1, 7))
         self.assertEqual(obj.prev_result, NEG)
@@ -250,7 +253,7 @@ class TestDerivedVariables(TestCase):
             result_recorded=POS,
             result_recorded_date=date(2015, 1, 7)
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, POS)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 7))
@@ -264,7 +267,7 @@ class TestDerivedVariables(TestCase):
             result_recorded=NEG,
             result_recorded_date=date(2015, 1, 6),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, NEG)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 6))
@@ -276,7 +279,7 @@ class TestDerivedVariables(TestCase):
             today_hiv_result=NEG,
             today_hiv_result_date=date(2016, 1, 7),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertTrue(pd.isnull(obj.prev_result_known))
         self.assertTrue(pd.isnull(obj.prev_result))
         self.assertTrue(pd.isnull(obj.prev_result_date))
@@ -293,7 +296,7 @@ class TestDerivedVariables(TestCase):
             result_recorded=NEG,
             result_recorded_date=date(2015, 1, 6),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, POS)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 7))
@@ -307,7 +310,7 @@ class TestDerivedVariables(TestCase):
             result_recorded=NEG,
             result_recorded_date=date(2015, 1, 6),
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.prev_result_known, YES)
         self.assertEqual(obj.prev_result, NEG)
         self.assertEqual(obj.prev_result_date, date(2015, 1, 6))
@@ -324,7 +327,7 @@ class TestDerivedVariables(TestCase):
             on_arv=NO,
             result_recorded_document=edc_ART_PRESCRIPTION,
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_hiv_status, POS)
         self.assertEqual(obj.arv_evidence, YES)
         self.assertEqual(obj.final_arv_status, DEFAULTER)
@@ -339,7 +342,7 @@ class TestDerivedVariables(TestCase):
             ever_taken_arv=NO,
             on_arv=NO,
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_hiv_status, POS)
         self.assertTrue(pd.isnull(obj.arv_evidence))
         self.assertEqual(obj.final_arv_status, NAIVE)
@@ -356,7 +359,7 @@ class TestDerivedVariables(TestCase):
             on_arv=NO,
             arv_evidence=YES
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_hiv_status, POS)
         self.assertEqual(obj.arv_evidence, YES)
         self.assertEqual(obj.final_arv_status, DEFAULTER)
@@ -372,7 +375,7 @@ class TestDerivedVariables(TestCase):
             on_arv=YES,
             arv_evidence=YES
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_hiv_status, POS)
         self.assertEqual(obj.arv_evidence, YES)
         self.assertEqual(obj.final_arv_status, ON_ART)
@@ -380,7 +383,7 @@ class TestDerivedVariables(TestCase):
     def test_age_in_years(self):
         """Assert age calc."""
         self.row.update(dob=datetime(1992, 1, 15))
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.age_in_years, 24)
 
     def test_prev_result_pos2(self):
@@ -394,6 +397,14 @@ class TestDerivedVariables(TestCase):
             result_recorded=np.nan,
             result_recorded_date=np.nan,
         )
-        obj = DerivedVariables(self.row)
+        obj = self.derived_variables(self.row)
         self.assertEqual(obj.final_hiv_status, POS)
         self.assertEqual(obj.final_hiv_status_date, date(2015, 11, 4))
+
+
+class TestDerivedVariablesFrame(TestDerivedVariables):
+
+    """Run the same cases against the column-wise engine."""
+
+    def derived_variables(self, row):
+        return DerivedVariablesFrame(pd.DataFrame([row])).dataframe.iloc[0]
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from datetime import date, datetime
+
+from django.test.testcases import TestCase
+
+from bcpp_export.dataframes.dtypes import compact_dtypes, to_dates
+
+
+class TestDtypes(TestCase):
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'survey': ['bcpp-year-1'] * 4,
+            'subject_identifier': ['066-1', '066-2', '066-3', '066-4'],
+            'circumcised': [1.0, 2.0, np.nan, 1.0],
+            'cd4_value': [350.0, 1200.0, np.nan, 40.0],
+            'gps_lat': [-24.1, -24.2, -24.3, np.nan],
+            'pair': [1, 2, 3, 15],
+        })
+
+    def test_compact_dtypes(self):
+        df = compact_dtypes(self.df, 'subjects')
+        self.assertEqual(str(df['survey'].dtype), 'category')
+        self.assertEqual(list(df['subject_identifier']), list(self.df['subject_identifier']))
+        self.assertNotEqual(str(df['subject_identifier'].dtype), 'category')
+        self.assertEqual(df['gps_lat'].dtype, np.float64)
+        self.assertEqual(df['pair'].dtype, np.int8)
+        if hasattr(pd, 'Int64Dtype'):
+            self.assertEqual(str(df['circumcised'].dtype), 'Int8')
+            self.assertEqual(str(df['cd4_value'].dtype), 'Int16')
+        self.assertTrue(pd.isnull(df['circumcised'][2]))
+        self.assertEqual(df['circumcised'][0], 1)
+
+    def test_compact_dtypes_saves_memory(self):
+        df = pd.concat([self.df] * 100, ignore_index=True)
+        self.assertLess(
+            compact_dtypes(df).memory_usage(deep=True).sum(), df.memory_usage(deep=True).sum())
+
+    def test_to_dates(self):
+        values = pd.Series([
+            pd.Timestamp('2016-05-06 01:30', tz='Africa/Gaborone').to_pydatetime(),
+            datetime(2015, 1, 10, 8), date(2014, 1, 10), '2013-12-01 10:00', None, np.nan, 'unknown'],
+            index=[10, 11, 12, 13, 14, 15, 16])
+        dates = to_dates(values)
+        self.assertEqual(list(dates.index), list(values.index))
+        self.assertEqual(list(dates[:4]), [
+            date(2016, 5, 5), date(2015, 1, 10), date(2014, 1, 10), date(2013, 12, 1)])
+        self.assertTrue(pd.isnull(dates[14:]).all())
+        self.assertTrue(np.isnan(dates[14]))
+
+    def test_to_dates_all_null(self):
+        dates = to_dates(pd.Series([None, np.nan]))
+        self.assertEqual(dates.dtype, object)
+        self.assertTrue(np.isnan(dates[0]) and np.isnan(dates[1]))
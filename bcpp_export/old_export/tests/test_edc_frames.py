@@ -0,0 +1,49 @@
+from django.test.testcases import TestCase
+
+from bcpp_export.dataframes.edc.edc_frames import EdcFrames
+from bcpp_export.dataframes.edc.edc_watermark import model_watermark
+from bcpp_export.tests.mock_models import mock_model
+
+
+class TestEdcFrames(TestCase):
+
+    def setUp(self):
+        self.model = mock_model(fields=['id', 'modified'], rows=[
+            {'id': n, 'modified': '2016-10-01 10:0{}'.format(n)} for n in range(1, 10)])
+        self.loads = []
+
+        test = self
+
+        class Consent(object):
+            models = [self.model]
+
+            def __init__(self):
+                test.loads.append(self)
+
+        self.edc_frames = EdcFrames()
+        self.edc_frames.register('consent', Consent)
+
+    def test_loads_once(self):
+        consent = self.edc_frames.get('consent')
+        self.assertIs(self.edc_frames.get('consent'), consent)
+        self.assertEqual(len(self.loads), 1)
+
+    def test_reloads_on_watermark(self):
+        consent = self.edc_frames.get('consent')
+        self.model.objects.rows.pop(0)
+        self.assertIsNot(self.edc_frames.get('consent'), consent)
+        self.assertEqual(len(self.loads), 2)
+        self.edc_frames.invalidate('consent')
+        self.edc_frames.get('consent')
+        self.assertEqual(len(self.loads), 3)
+
+    def test_invalid_name(self):
+        self.assertRaises(TypeError, self.edc_frames.get, 'subject_consent')
+
+    def test_model_watermark(self):
+        self.assertEqual(model_watermark(self.model), {
+            'count': 9, 'max_pk': '9', 'max_modified': '2016-10-01 10:09'})
+        model = mock_model(fields=['id'], rows=[{'id': 1}])
+        self.assertEqual(model_watermark(model), {'count': 1, 'max_pk': '1', 'max_modified': None})
+        model.objects.rows = []
+        self.assertEqual(model_watermark(model), {'count': 0, 'max_pk': None, 'max_modified': None})
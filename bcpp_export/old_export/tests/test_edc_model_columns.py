@@ -0,0 +1,16 @@
+from django.test.testcases import TestCase
+
+from bcpp_export.dataframes.edc.edc_model_columns import model_columns
+from bcpp_export.tests.mock_models import Field, mock_model
+
+
+class TestEdcModelColumns(TestCase):
+
+    def test_model_columns(self):
+        model = mock_model(fields=['id', Field('panel', 'panel_id'), 'subject_identifier'])
+        columns = model_columns(model)
+        self.assertEqual(columns, ['id', 'panel_id', 'subject_identifier'])
+        columns.remove('subject_identifier')
+        model._meta.concrete_fields = []
+        self.assertEqual(model_columns(model), ['id', 'panel_id', 'subject_identifier'])
+        self.assertEqual(model.objects.reads, [])
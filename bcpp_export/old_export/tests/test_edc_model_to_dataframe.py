@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from mock import MagicMock
+from unittest import skipIf
+
+from django.test.testcases import TestCase
+
+from bcpp_export.dataframes.columnar_writers import ColumnarChunkStore
+from bcpp_export.dataframes.edc.edc_model_to_dataframe import EdcModelToDataFrame
+from bcpp_export.tests.mock_models import mock_model
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class EncryptedField(object):
+
+    field_cryptor = True
+
+    def __init__(self, name):
+        self.name = name
+        self.attname = name
+        self.decrypted = []
+
+    def to_python(self, value):
+        self.decrypted.append(value)
+        return value.replace('enc1:::', '')
+
+
+class TestEdcModelToDataFrame(TestCase):
+
+    def setUp(self):
+        self.first_name = EncryptedField('first_name')
+        self.model = mock_model(fields=['id', self.first_name, 'gender'], rows=[
+            {'id': 1, 'first_name': 'enc1:::ERIK', 'gender': 'M'},
+            {'id': 2, 'first_name': 'enc1:::JEAN', 'gender': 'F'},
+            {'id': 3, 'first_name': 'enc1:::ERIK', 'gender': 'M'},
+            {'id': 4, 'first_name': None, 'gender': 'F'}])
+
+    def test_bulk_decrypt(self):
+        df = EdcModelToDataFrame(self.model, decrypt_batch_size=1).dataframe
+        self.assertEqual(list(df['first_name'].fillna('')), ['ERIK', 'JEAN', 'ERIK', ''])
+        self.assertEqual(list(df['gender']), ['M', 'F', 'M', 'F'])
+        self.assertEqual(sorted(self.first_name.decrypted), ['enc1:::ERIK', 'enc1:::JEAN'])
+        self.assertTrue(np.isnan(df['first_name'][3]))
+
+    def test_chunks(self):
+        model = mock_model(fields=['id', 'gender'], rows=[
+            {'id': n, 'gender': 'M' if n % 2 else 'F'} for n in range(25, 0, -1)])
+        store = MagicMock()
+        dfs = list(EdcModelToDataFrame.chunks(model, chunksize=10, store=store))
+        self.assertEqual([len(df) for df in dfs], [10, 10, 5])
+        self.assertEqual([lookups.get('pk__gt') for lookups in model.objects.reads], [None, 10, 20])
+        df = pd.concat(dfs, ignore_index=True)
+        self.assertEqual(list(df['id']), list(range(1, 26)))
+        self.assertEqual(store.append.call_count, 3)
+        self.assertEqual(store.clear.call_count, 1)
+        dfs = list(EdcModelToDataFrame.chunks(model, chunksize=5))
+        self.assertEqual([len(df) for df in dfs], [5, 5, 5, 5, 5])
+
+    @skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_chunks_rerun_to_store(self):
+        model = mock_model(fields=['id', 'gender'], rows=[
+            {'id': n, 'gender': 'M' if n % 2 else 'F'} for n in range(1, 26)])
+        folder = tempfile.mkdtemp()
+        try:
+            store = ColumnarChunkStore(folder, 'subjectconsent')
+            list(EdcModelToDataFrame.chunks(model, chunksize=10, store=store))
+            list(EdcModelToDataFrame.chunks(model, chunksize=10, store=store))
+            self.assertEqual(len(store.paths), 3)
+            self.assertEqual(list(store.read()['id']), list(range(1, 26)))
+        finally:
+            shutil.rmtree(folder)
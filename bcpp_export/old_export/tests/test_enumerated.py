@@ -12,7 +12,9 @@ from django.test.testcases import TestCase, TransactionTestCase
 
 from edc_constants.constants import MALE, YES, NOT_APPLICABLE
 
-from bcpp_export.enumerated import enumerated
+from bcpp_export.enrolled import enrolled, enrolled_bulk
+from bcpp_export.enumerated import enumerated, enumerated_bulk
+from bcpp_export.household_refused import household_refused, household_refused_bulk
 from bcpp_export.derived_variables import DerivedVariables
 from bcpp_export.constants import (
     NEG, POS, UNK, YES, NAIVE, NO, DEFAULTER, edc_ART_PRESCRIPTION, ON_ART, SUBJECT_IDENTIFIER)
@@ -74,3 +76,41 @@ class TestEnumerated(TestCase, BcppMixin):
         self.assertEqual(enumerated(members, self.row), YES)
         members = pd.DataFrame()
         self.assertTrue(pd.isnull(enumerated(members, self.row)))
+
+    def test_is_enumerated_bulk(self):
+        members = pd.DataFrame(
+            [('99999-9',), ('99999-8', ), ('99997-9', ), ('99996-9', )],
+            columns=['household_identifier'])
+        households = pd.DataFrame(
+            [('99999-9',), ('99995-9', ), ('99997-9', )],
+            columns=['household_identifier'])
+        self.assertEqual(
+            list(enumerated_bulk(members, households['household_identifier'])),
+            [enumerated(members, row) for _, row in households.iterrows()])
+        self.assertTrue(pd.isnull(enumerated_bulk(pd.DataFrame(), households['household_identifier'])).all())
+
+    def test_is_enrolled_bulk(self):
+        subjects = pd.DataFrame(
+            [('99999-9',), ('99999-8', )],
+            columns=['household_identifier'])
+        households = pd.DataFrame(
+            [('99999-9',), ('99995-9', ), ('99999-8', )],
+            columns=['household_identifier'])
+        self.assertEqual(
+            list(enrolled_bulk(subjects, households['household_identifier'], 'household_identifier')),
+            [enrolled(subjects, row, 'household_identifier') for _, row in households.iterrows()])
+        self.assertTrue(pd.isnull(
+            enrolled_bulk(pd.DataFrame(), households['household_identifier'], 'household_identifier')).all())
+
+    def test_is_household_refused_bulk(self):
+        household_refusal = pd.DataFrame(
+            [('99999-9',)],
+            columns=['household_identifier'])
+        households = pd.DataFrame(
+            [('99999-9',), ('99995-9', )],
+            columns=['household_identifier'])
+        self.assertEqual(
+            list(household_refused_bulk(household_refusal, households['household_identifier'])),
+            [household_refused(household_refusal, row) for _, row in households.iterrows()])
+        self.assertEqual(
+            list(household_refused_bulk(pd.DataFrame(), households['household_identifier'])), [NO, NO])
@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from mock import patch
+
+from django.test.testcases import TestCase
+
+from bcpp_export.export import Export, dump_model
+from bcpp_export.tests.mock_models import mock_model
+
+
+class TestExport(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.df = pd.DataFrame({'id': range(1, 26), 'gender': ['M', 'F', 'M', 'F', 'M'] * 5})
+        self.rows = self.df.to_dict('records')
+        self.model = mock_model('bcpp_subject', 'subjectconsent', rows=self.rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_dump_model_in_chunks(self):
+        path = os.path.join(self.path, 'subjectconsent.csv')
+        chunks = [self.df[:10], self.df[10:20], self.df[20:]]
+        with patch('bcpp_export.export.EdcModelToDataFrame.chunks', return_value=iter(chunks)) as chunks:
+            entry = dump_model(self.model, path, chunksize=10)
+        chunks.assert_called_once_with(self.model, chunksize=10)
+        self.assertEqual(entry['rows'], 25)
+        self.assertEqual(entry['model'], 'bcpp_subject.subjectconsent')
+        self.assertEqual(len(entry['sha256']), 64)
+        pd.testing.assert_frame_equal(pd.read_csv(path), self.df)
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+    def dump(self, models, **kwargs):
+        """Return the models dumped by Export.dump and the manifest."""
+        dumped = []
+
+        def dump_model(model, path, chunksize):
+            dumped.append(model._meta.model_name)
+            with open(path, 'w'):
+                pass
+            return {'model': '{}.{}'.format(model._meta.app_label, model._meta.model_name),
+                    'path': path, 'rows': len(model.objects.rows), 'sha256': '', 'seconds': 0}
+        with patch('bcpp_export.export.get_apps', return_value=[]):
+            export = Export(self.path)
+        for model in models:
+            if not os.path.exists(os.path.join(self.path, model._meta.app_label)):
+                os.mkdir(os.path.join(self.path, model._meta.app_label))
+        lookup = {model._meta.model_name: model for model in models}
+        with patch('bcpp_export.export.get_model', side_effect=lambda _, name: lookup[name]):
+            with patch('bcpp_export.export.dump_model', side_effect=dump_model):
+                manifest = export.dump(models=models, processes=1, **kwargs)
+        return dumped, manifest
+
+    def test_dump_largest_first_with_manifest(self):
+        small = mock_model('bcpp_household', 'household', rows=self.rows[:5])
+        empty = mock_model('bcpp_household', 'plot', rows=[])
+        dumped, manifest = self.dump([small, self.model, empty])
+        self.assertEqual(dumped, ['subjectconsent', 'household'])
+        self.assertEqual(manifest['models']['bcpp_household.household']['rows'], 5)
+        self.assertEqual(manifest['models']['bcpp_household.household']['count'], 5)
+        self.assertEqual(manifest['models']['bcpp_household.household']['max_pk'], '5')
+        with open(os.path.join(self.path, 'manifest.json')) as f:
+            self.assertEqual(sorted(json.load(f)['models']), [
+                'bcpp_household.household', 'bcpp_subject.subjectconsent'])
+
+    def test_dump_resumes_changed_tables(self):
+        small = mock_model('bcpp_household', 'household', rows=self.rows[:5])
+        self.dump([small, self.model])
+        small.objects.rows = self.rows[:6]
+        dumped, manifest = self.dump([small, self.model])
+        self.assertEqual(dumped, ['household'])
+        self.assertEqual(manifest['models']['bcpp_household.household']['max_pk'], '6')
+        dumped, _ = self.dump([small, self.model], resume=False)
+        self.assertEqual(dumped, ['subjectconsent', 'household'])
+
+    def test_dump_resumes_interrupted_dump(self):
+        small = mock_model('bcpp_household', 'household', rows=self.rows[:5])
+        self.dump([small, self.model])
+        os.remove(os.path.join(self.path, 'bcpp_household', 'household.csv'))
+        dumped, _ = self.dump([small, self.model])
+        self.assertEqual(dumped, ['household'])
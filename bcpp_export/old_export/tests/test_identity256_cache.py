@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test.testcases import TestCase
+
+from bcpp_export.identity256 import identity256
+from bcpp_export.identity256_cache import Identity256Cache, identity256_bulk, _compare_digest
+
+
+class TestIdentity256Cache(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.folder, 'identity256.enc')
+        self.key_path = os.path.join(self.folder, 'identity256.key')
+        Identity256Cache.create_key(self.key_path)
+        self.identities = pd.Series(['317918515', '317918516', np.nan, '317918515'])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_identity256_bulk(self):
+        hashes = identity256_bulk(self.identities, processes=1)
+        for identity, value in zip(self.identities, hashes):
+            if pd.isnull(identity):
+                self.assertTrue(pd.isnull(value))
+            else:
+                self.assertEqual(value, identity256({'identity': identity}))
+
+    def test_identity256_bulk_pool(self):
+        self.assertTrue(identity256_bulk(self.identities, processes=2).equals(
+            identity256_bulk(self.identities, processes=1)))
+
+    def test_cache_is_saved_encrypted(self):
+        cache = Identity256Cache(self.cache_path, key_path=self.key_path)
+        identity256_bulk(self.identities, cache=cache, processes=1)
+        self.assertEqual(len(cache), 2)
+        with open(self.cache_path, 'rb') as f:
+            self.assertNotIn(b'317918515', f.read())
+        cache = Identity256Cache(self.cache_path, key_path=self.key_path)
+        self.assertEqual(cache.get('317918515'), identity256({'identity': '317918515'}))
+
+    def test_cached_identities_are_not_hashed(self):
+        cache = Identity256Cache(self.cache_path, key_path=self.key_path)
+        cache.update({'317918515': 'cached'})
+        hashes = identity256_bulk(self.identities, cache=cache, processes=1)
+        self.assertEqual(hashes[0], 'cached')
+        self.assertEqual(hashes[1], identity256({'identity': '317918516'}))
+
+    def test_cache_with_other_key_is_ignored(self):
+        cache = Identity256Cache(self.cache_path, key_path=self.key_path)
+        identity256_bulk(self.identities, cache=cache, processes=1)
+        Identity256Cache.create_key(os.path.join(self.folder, 'other.key'))
+        cache = Identity256Cache(self.cache_path, key_path=os.path.join(self.folder, 'other.key'))
+        self.assertEqual(len(cache), 0)
+
+    def test_missing_key_is_not_created(self):
+        key_path = os.path.join(self.folder, 'missing.key')
+        self.assertRaises(ImproperlyConfigured, Identity256Cache, self.cache_path, key_path=key_path)
+        self.assertFalse(os.path.exists(key_path))
+
+    def test_create_key_does_not_replace_key(self):
+        self.assertRaises(TypeError, Identity256Cache.create_key, self.key_path)
+
+    def test_tampered_cache_is_ignored(self):
+        cache = Identity256Cache(self.cache_path, key_path=self.key_path)
+        identity256_bulk(self.identities, cache=cache, processes=1)
+        with open(self.cache_path, 'rb') as f:
+            data = bytearray(f.read())
+        data[20] ^= 1
+        with open(self.cache_path, 'wb') as f:
+            f.write(bytes(data))
+        cache = Identity256Cache(self.cache_path, key_path=self.key_path)
+        self.assertEqual(len(cache), 0)
+
+    def test_compare_digest_fallback(self):
+        self.assertTrue(_compare_digest(b'\x00\x01digest', b'\x00\x01digest'))
+        self.assertFalse(_compare_digest(b'\x00\x01digest', b'\x00\x01digesT'))
+        self.assertFalse(_compare_digest(b'digest', b'diges'))
+        self.assertFalse(_compare_digest(b'', b'\x00'))
+        self.assertTrue(_compare_digest(b'', b''))
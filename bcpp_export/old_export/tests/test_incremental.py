@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+
+import pandas as pd
+
+from datetime import datetime
+
+from mock import patch
+
+from django.test.testcases import TestCase
+
+from bcpp_export.dataframes.incremental import ExportSnapshot, replace_rows
+
+
+class TestIncremental(TestCase):
+
+    def setUp(self):
+        self.snapshot_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.snapshot_folder)
+
+    def test_replace_rows(self):
+        previous = pd.DataFrame({'subject_identifier': ['1', '2', '2', '3'], 'value': [1, 2, 2, 3]})
+        updated = pd.DataFrame({'subject_identifier': ['2', '4'], 'value': [20, 40]})
+        df = replace_rows(previous, updated, 'subject_identifier', set(['2', '4']))
+        self.assertEqual(list(df['subject_identifier']), ['1', '3', '2', '4'])
+        self.assertEqual(list(df['value']), [1, 3, 20, 40])
+
+    def test_replace_rows_removes_rows_not_updated(self):
+        previous = pd.DataFrame({'subject_identifier': ['1', '2'], 'value': [1, 2]})
+        df = replace_rows(previous, pd.DataFrame(), 'subject_identifier', set(['2']))
+        self.assertEqual(list(df['subject_identifier']), ['1'])
+
+    def test_replace_rows_without_previous(self):
+        updated = pd.DataFrame({'subject_identifier': ['2'], 'value': [20]})
+        df = replace_rows(pd.DataFrame(), updated, 'subject_identifier', set(['2']))
+        self.assertTrue(df.equals(updated))
+
+    def test_snapshot(self):
+        snapshot = ExportSnapshot(self.snapshot_folder, 'bcpp-year-1')
+        self.assertFalse(snapshot.exists)
+        self.assertIsNone(snapshot.watermark)
+        self.assertTrue(snapshot.read('subjects').empty)
+        watermark = datetime(2016, 10, 12, 10, 0)
+        dataframes = dict([(name, pd.DataFrame({'value': [1, 2]})) for name in ExportSnapshot.snapshot_names])
+        snapshot.write(watermark, **dataframes)
+        snapshot = ExportSnapshot(self.snapshot_folder, 'bcpp-year-1')
+        self.assertTrue(snapshot.exists)
+        self.assertEqual(snapshot.watermark, watermark)
+        self.assertTrue(snapshot.read('subjects').equals(dataframes['subjects']))
+        self.assertFalse(ExportSnapshot(self.snapshot_folder, 'bcpp-year-2').exists)
+
+    def test_interrupted_snapshot_write(self):
+        snapshot = ExportSnapshot(self.snapshot_folder, 'bcpp-year-1')
+        dataframes = dict([(name, pd.DataFrame({'value': [1, 2]})) for name in ExportSnapshot.snapshot_names])
+        snapshot.write(datetime(2016, 10, 12, 10, 0), **dataframes)
+
+        def interrupted_to_pickle(path):
+            with open(path, 'wb') as f:
+                f.write(b'trunc')
+            raise KeyboardInterrupt
+
+        updated = dict([(name, pd.DataFrame({'value': [3]})) for name in ExportSnapshot.snapshot_names])
+        with patch.object(updated['members'], 'to_pickle', side_effect=interrupted_to_pickle):
+            self.assertRaises(KeyboardInterrupt, snapshot.write, datetime(2016, 10, 13, 10, 0), **updated)
+        snapshot = ExportSnapshot(self.snapshot_folder, 'bcpp-year-1')
+        self.assertFalse(snapshot.exists)
+        self.assertIsNone(snapshot.watermark)
+        self.assertTrue(snapshot.read('subjects').equals(updated['subjects']))
+        self.assertTrue(snapshot.read('members').equals(dataframes['members']))
@@ -0,0 +1,153 @@
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import tempfile
+
+from datetime import datetime
+from sqlalchemy import create_engine
+
+from django.test.testcases import TestCase
+
+from bcpp_export.dataframes.columnar_writers import ColumnarChunkStore
+from bcpp_export.dataframes.lis import Lis, LisMirror
+from bcpp_export.dataframes.lis.read_sql import read_sql
+from bcpp_export.dataframes.lis.subject_identifier_resolver import SubjectIdentifierResolver, identifier_lookup
+
+
+class TestLis(TestCase):
+
+    def setUp(self):
+        self.lis = Lis(df=pd.DataFrame({'result': ['1']}))
+        self.df = pd.DataFrame({
+            'lis_identifier': ['AA12345', '066AB1234560001', 'AA12346', 'AA1234700001', 'AA12348'],
+            'subject_identifier': ['066-12345678-9', 'K1234-5', '066-1234', np.nan, '12-34'],
+            'specimen_identifier': ['NA', np.nan, '066CD12345670002', '066CD12AB', np.nan],
+            'drawn_datetime': [datetime(2016, 1, 10, 10, 30)] * 4 + [np.nan],
+            'test_id': ['610'] * 5,
+            'received_datetime': [datetime(2016, 1, 11)] * 5,
+            'utestid': ['HIV-1 RNA'] * 5,
+            'result': ['<400', '>750000', '*', '=1200', np.nan],
+            'result_quantifier': ['<', '>', np.nan, '=', np.nan],
+            'result_datetime': [datetime(2016, 1, 12)] * 5,
+            'sample_condition': ['10'] * 5})
+
+    def test_normalize_results(self):
+        df = self.lis.normalize_results(self.df)
+        self.assertEqual(list(df['result'].fillna('')), ['400', '750000', '', '1200', ''])
+        self.assertEqual(list(df['drawn_datetime'][:4]), [pd.Timestamp(2016, 1, 10)] * 4)
+        self.assertTrue(pd.isnull(df['drawn_datetime'][4]))
+        self.assertTrue(pd.isnull(df['specimen_identifier'][0]))
+        self.assertEqual(list(df['aliquot_identifier'].fillna('')), [
+            '', '066AB1234560001', '066CD12345670002', '', ''])
+        self.assertEqual(list(df['edc_specimen_identifier'].fillna('')), [
+            '', '066AB1234560', '066CD1234567', '066CD12AB', ''])
+        self.assertEqual(list(df['subject_identifier'].fillna('')), [
+            '066-12345678-9', 'K12345', '066-1234', '', '1234'])
+        self.assertEqual(list(df['final_subject_identifier'].fillna('')), [
+            '066-12345678-9', '', '066-1234', '', ''])
+        self.assertEqual(list(df['final_subject_identifier_source'].fillna('')), [
+            'lis', '', 'lis', '', ''])
+
+    def test_resolve_final_subject_identifier(self):
+        df = self.lis.normalize_results(self.df)
+        df_clinic_consent = pd.DataFrame({
+            'subject_identifier': ['066-11111111-1', '066-22222222-2', '066-33333333-3'],
+            'lab_identifier': ['K12345', np.nan, 'K12345'],
+            'htc_identifier': ['K12345', '1234', np.nan]})
+        df_req = pd.DataFrame({
+            'subject_identifier': ['066-44444444-4'],
+            'edc_specimen_identifier': ['AA1234700001']})
+        resolver = SubjectIdentifierResolver()
+        resolver.add_source('clinic_consent (lab id)', identifier_lookup(df_clinic_consent, 'lab_identifier'))
+        resolver.add_source('clinic_consent (htc id)', identifier_lookup(df_clinic_consent, 'htc_identifier'))
+        resolver.add_source('edc requisition', identifier_lookup(df_req, 'edc_specimen_identifier'),
+                            keys=self.lis.requisition_keys)
+        df = resolver.resolve(df)
+        self.assertEqual(list(df['final_subject_identifier'].fillna('')), [
+            '066-12345678-9', '066-11111111-1', '066-1234', '066-44444444-4', '066-22222222-2'])
+        self.assertEqual(list(df['final_subject_identifier_source']), [
+            'lis', 'clinic_consent (lab id)', 'lis', 'edc requisition', 'clinic_consent (htc id)'])
+
+    def test_read_sql_in_chunks(self):
+        engine = create_engine('sqlite://')
+        self.df.to_sql('lab01response', engine, index=False)
+        sql = 'select * from lab01response'
+        df = read_sql(engine, sql, normalize=self.lis.normalize_results)
+        df_chunks = read_sql(engine, sql, chunksize=2, normalize=self.lis.normalize_results)
+        pd.testing.assert_frame_equal(df, df_chunks, check_dtype=False)
+        folder = tempfile.mkdtemp()
+        try:
+            store = ColumnarChunkStore(folder, 'lis_results')
+            self.assertIs(read_sql(engine, sql, chunksize=2, store=store, normalize=self.lis.normalize_results), store)
+            self.assertEqual(len(store.paths), 3)
+            self.assertEqual([len(df) for df in store.chunks()], [2, 2, 1])
+            df_store = store.read()
+            self.assertEqual(list(df_store['edc_specimen_identifier'].fillna('')),
+                             list(df['edc_specimen_identifier'].fillna('')))
+            self.assertEqual(list(df_store['drawn_datetime'].dropna()), list(df['drawn_datetime'].dropna()))
+            read_sql(engine, sql, chunksize=5, store=store, normalize=self.lis.normalize_results)
+            self.assertEqual(len(store.paths), 1)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_lis_mirror(self):
+        engine = create_engine('sqlite://')
+        self.df['received_datetime'] = [datetime(2016, 1, day) for day in range(1, 6)]
+        self.df['result_datetime'] = self.df['received_datetime']
+        self.df.to_sql('lab01response', engine, index=False)
+
+        def sql_since(received_datetime, result_datetime):
+            return ('select * from lab01response where lis_identifier in (select lis_identifier '
+                    'from lab01response where received_datetime >= \'{}\' or result_datetime >= \'{}\')'.format(
+                        received_datetime, result_datetime))
+
+        folder = tempfile.mkdtemp()
+        try:
+            mirror = LisMirror(os.path.join(folder, 'mirror.sqlite'))
+            self.assertIsNone(mirror.watermark)
+            self.assertEqual(mirror.sync(engine, 'select * from lab01response', sql_since), 5)
+            self.assertEqual(mirror.watermark, ('2016-01-05 00:00:00', '2016-01-05 00:00:00'))
+            df = pd.DataFrame({
+                'lis_identifier': ['AA12345', 'AA12349'],
+                'subject_identifier': ['066-12345678-9', '066-12345678-9'],
+                'specimen_identifier': [np.nan, np.nan],
+                'drawn_datetime': [datetime(2016, 2, 1)] * 2,
+                'test_id': ['610'] * 2,
+                'received_datetime': [datetime(2016, 1, 1), datetime(2016, 2, 2)],
+                'utestid': ['HIV-1 RNA'] * 2,
+                'result': ['<400', '1000'],
+                'result_quantifier': ['<', '='],
+                'result_datetime': [datetime(2016, 2, 3)] * 2,
+                'sample_condition': ['10'] * 2})
+            df.to_sql('lab01response', engine, index=False, if_exists='append')
+            self.assertEqual(mirror.sync(engine, 'select * from lab01response', sql_since), 4)
+            df = self.lis.normalize_results(mirror.read())
+            self.assertEqual(len(df), 7)
+            self.assertEqual(sorted(df['lis_identifier'].unique()), sorted(
+                ['AA12345', '066AB1234560001', 'AA12346', 'AA1234700001', 'AA12348', 'AA12349']))
+            self.assertEqual(mirror.sync(engine, 'select * from lab01response', sql_since), 3)
+            self.assertEqual(len(mirror.read()), 7)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_update_edc_specimen_identifier_from_requisition(self):
+
+        class Requisition(object):
+            all = pd.DataFrame({
+                'subject_identifier': ['066-1', '066-1', '066-1', '066-2'],
+                'requisition_datetime': [datetime(2016, 1, 10, 9)] * 4,
+                'panel_id': [1, 1, 2, 6],
+                'edc_specimen_identifier': ['066A', '066B', '066C', '066D']})
+
+        lis = Lis(df=pd.DataFrame({
+            'final_subject_identifier': ['066-1', '066-1', '066-1', '066-2', '066-2'],
+            'subject_identifier': ['066-1', '066-1', '066-1', '066-2', '066-2'],
+            'drawn_datetime': [datetime(2016, 1, 10)] * 5,
+            'test_id': ['610', '401', '610', '999', np.nan],
+            'edc_specimen_identifier': [np.nan, np.nan, '066X', np.nan, np.nan]}))
+        lis.requisition = Requisition()
+        lis.update_edc_specimen_identifier_from_requisition()
+        self.assertEqual(list(lis.results['edc_specimen_identifier'].fillna('')), [
+            '066A', '066B', '066C', '066X', '066X', '', ''])
+        self.assertEqual(list(lis.results['edc_panel_id'].fillna(-1)), [1, 1, 2, 1, 1, 0, -1])
@@ -0,0 +1,133 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+
+from django.test.testcases import TestCase
+
+from bcpp_export.constants import NEG, POS, UNK, IND, NAIVE, DEFAULTER, ON_ART, YES
+from bcpp_export.dataframes.longitudinal_subjects import LongitudinalSubjects, LongitudinalSurveys
+
+
+class TestLongitudinalSubjects(TestCase):
+
+    def setUp(self):
+        np.random.seed(11)
+        size = 500
+        results = [POS, NEG, UNK, IND, np.nan]
+        arv = [NAIVE, DEFAULTER, ON_ART, np.nan]
+        dates = [datetime(2013, 12, 1), datetime(2015, 1, 10), datetime(2016, 5, 5), np.nan]
+        self.df = pd.DataFrame({
+            'subject_identifier': ['066-{}'.format(n) for n in range(size)],
+            'appointment__visit_definition__code': ['T1'] * size,
+            'consent_date': [datetime(2015, 1, 10)] * size})
+        for suffix in ['', '_y1']:
+            self.df['final_hiv_status' + suffix] = np.random.choice(results, size)
+            self.df['final_hiv_status_date' + suffix] = [
+                dates[n] for n in np.random.randint(0, len(dates), size)]
+            self.df['final_arv_status' + suffix] = np.random.choice(arv, size)
+            self.df['prev_result' + suffix] = np.random.choice(results, size)
+            self.df['prev_result_date' + suffix] = [
+                dates[n] for n in np.random.randint(0, len(dates), size)]
+
+    def test_vectorized_same_as_row_by_row(self):
+        df = LongitudinalSubjects(self.df.copy(), vectorized=False).dataframe
+        df_vectorized = LongitudinalSubjects(self.df.copy()).dataframe
+        self.assertEqual(list(df.columns), list(df_vectorized.columns))
+        pd.testing.assert_frame_equal(df, df_vectorized)
+
+    def test_carry_forward_two_prior_surveys(self):
+        df = pd.DataFrame({
+            'appointment__visit_definition__code': ['T2', 'T2', 'T2'],
+            'consent_date': [datetime(2016, 1, 10)] * 3,
+            'final_hiv_status': [NEG, np.nan, UNK],
+            'final_hiv_status_date': [datetime(2016, 1, 10), np.nan, datetime(2016, 1, 10)],
+            'final_arv_status': [np.nan, np.nan, np.nan],
+            'prev_result': [np.nan, np.nan, np.nan],
+            'prev_result_date': [np.nan, np.nan, np.nan],
+            'final_hiv_status_y1': [POS, NEG, np.nan],
+            'final_hiv_status_date_y1': [datetime(2014, 1, 10), datetime(2014, 1, 10), np.nan],
+            'final_arv_status_y1': [ON_ART, np.nan, np.nan],
+            'final_hiv_status_y2': [np.nan, POS, NEG],
+            'final_hiv_status_date_y2': [np.nan, datetime(2015, 1, 10), datetime(2015, 1, 10)],
+            'final_arv_status_y2': [np.nan, np.nan, np.nan]})
+        df = LongitudinalSubjects(df, suffixes=['_y1', '_y2']).dataframe
+        self.assertEqual(list(df['final_hiv_status']), [POS, POS, UNK])
+        self.assertEqual(list(df['final_hiv_status_date']), [
+            pd.Timestamp(2014, 1, 10), pd.Timestamp(2015, 1, 10), pd.Timestamp(2016, 1, 10)])
+        self.assertEqual(list(df['final_arv_status'][:2]), [NAIVE, NAIVE])
+        self.assertTrue(pd.isnull(df['final_arv_status'][2]))
+        self.assertEqual(list(df['prev_result']), [POS, POS, NEG])
+        self.assertEqual(list(df['prev_result_date']), [
+            pd.Timestamp(2014, 1, 10), pd.Timestamp(2015, 1, 10), pd.Timestamp(2015, 1, 10)])
+        self.assertEqual(list(df['prev_result_known']), [YES, YES, YES])
+        self.assertIn('timepoint', df.columns)
+
+    def test_row_by_row_one_prior_survey(self):
+        self.assertRaises(
+            TypeError, LongitudinalSubjects, self.df.copy(), suffixes=['_y1', '_y2'], vectorized=False)
+
+    def test_longitudinal_surveys_same_as_merged(self):
+        results = []
+        for suffix, survey in [('_y1', 'bcpp-year-1'), ('', 'bcpp-year-2')]:
+            df = self.df[['subject_identifier', 'appointment__visit_definition__code', 'consent_date']].copy()
+            for column in ['final_hiv_status', 'final_hiv_status_date', 'final_arv_status',
+                           'prev_result', 'prev_result_date']:
+                df[column] = self.df[column + suffix]
+            df['survey'] = survey
+            results.append(df)
+        df_y1 = results[0].iloc[50:]
+        df_y2 = results[1].iloc[:450]
+        df_merged = LongitudinalSubjects(pd.merge(
+            df_y2, df_y1, how='left', on='subject_identifier', suffixes=['', '_y1'])).dataframe
+        df = LongitudinalSurveys([df_y1, df_y2]).dataframe
+        self.assertEqual(len(df), 500 - 50 + 450)
+        df_y2 = df[df['survey'] == 'bcpp-year-2'].set_index('subject_identifier')
+        df_merged = df_merged.set_index('subject_identifier').loc[df_y2.index]
+        for column in ['final_hiv_status', 'final_hiv_status_date', 'final_arv_status',
+                       'prev_result', 'prev_result_date', 'prev_result_known', 'timepoint']:
+            pd.testing.assert_series_equal(df_y2[column], df_merged[column], check_dtype=False)
+        df_y1 = df[df['survey'] == 'bcpp-year-1'].set_index('subject_identifier')
+        self.assertEqual(list(df_y1['final_hiv_status'].fillna(-1)),
+                         list(results[0].set_index('subject_identifier').loc[
+                             df_y1.index, 'final_hiv_status'].fillna(-1)))
+
+    def test_longitudinal_surveys_missed_survey(self):
+        df_y1 = pd.DataFrame({
+            'subject_identifier': ['066-1', '066-2'],
+            'consent_date': [datetime(2014, 1, 10)] * 2,
+            'final_hiv_status': [POS, NEG],
+            'final_hiv_status_date': [datetime(2014, 1, 10)] * 2,
+            'final_arv_status': [ON_ART, np.nan],
+            'prev_result': [np.nan, np.nan],
+            'prev_result_date': [np.nan, np.nan]})
+        df_y2 = df_y1[df_y1['subject_identifier'] == '066-3']
+        df_y3 = df_y1.copy()
+        df_y3['final_hiv_status'] = [np.nan, UNK]
+        df_y3['final_arv_status'] = [np.nan, np.nan]
+        df = LongitudinalSurveys([df_y1, df_y2, df_y3]).dataframe
+        self.assertEqual(list(df['subject_identifier']), ['066-1', '066-1', '066-2', '066-2'])
+        self.assertEqual(df['final_hiv_status'][1], POS)
+        self.assertEqual(df['final_arv_status'][1], NAIVE)
+        self.assertEqual(df['final_hiv_status'][3], UNK)
+        self.assertTrue(pd.isnull(df['prev_result'][3]))
+
+    def test_longitudinal_surveys_warns_of_duplicates(self):
+        df_y1 = pd.DataFrame({
+            'subject_identifier': ['066-1', '066-2', '066-2', '066-3'],
+            'consent_date': [datetime(2014, 1, 10)] * 4,
+            'final_hiv_status': [POS, NEG, POS, NEG],
+            'final_hiv_status_date': [datetime(2014, 1, 10)] * 4,
+            'final_arv_status': [ON_ART, np.nan, np.nan, np.nan],
+            'prev_result': [np.nan] * 4,
+            'prev_result_date': [np.nan] * 4})
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            df = LongitudinalSurveys([df_y1, df_y1[df_y1['subject_identifier'] != '066-2']]).dataframe
+        self.assertEqual(len(caught), 1)
+        self.assertIn('1 duplicate row(s) of 1 subject(s)', str(caught[0].message))
+        self.assertIn('066-2', str(caught[0].message))
+        self.assertEqual(list(df['subject_identifier']), ['066-1', '066-1', '066-2', '066-3', '066-3'])
+        self.assertEqual(df['final_hiv_status'][2], NEG)
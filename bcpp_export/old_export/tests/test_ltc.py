@@ -0,0 +1,35 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from django.test.testcases import TestCase
+
+from bcpp_export.dataframes.ltc import Ltc, ALREADY_LINKED, LINKED, NOT_LINKED
+
+
+class TestLtc(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.subjects_path = os.path.join(self.path, 'subjects.csv')
+        self.pims_path = os.path.join(self.path, 'pims.csv')
+        pd.DataFrame({
+            'identity256': ['a', 'b', 'c', 'd', 'e'],
+            'consent_date': ['2015-01-10', '2015-01-10', None, '2015-01-10', None]}).to_csv(
+                self.subjects_path, index=False)
+        pd.DataFrame({
+            'identity256': ['a', 'b', 'c'],
+            'regdate': ['2015-03-10 08:00', '2014-01-10', '2014-01-10']}).to_csv(
+                self.pims_path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_ltc_with_null_dates(self):
+        df = Ltc(self.subjects_path, self.pims_path).df_subjects
+        self.assertEqual(list(df['ltc']), [LINKED, ALREADY_LINKED, NOT_LINKED, NOT_LINKED, NOT_LINKED])
+        self.assertEqual(list(df['ltc_timing'][:2]), [59, -365])
+        self.assertTrue(np.isnan(df['ltc_timing'][2:]).all())
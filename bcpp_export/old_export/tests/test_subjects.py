@@ -1,7 +1,15 @@
+import threading
+import time
+
+import pandas as pd
+
+from mock import patch
+
 from django.test.testcases import TestCase
 
 from bcpp_export.dataframes.subjects import Subjects
 from bcpp_export.tests.bcpp_mixin import BcppMixin
+from bcpp_export.tests.mock_models import mock_model
 
 
 class TestSubjects(TestCase, BcppMixin):
@@ -12,3 +20,102 @@ class TestSubjects(TestCase, BcppMixin):
     def test_subject_df(self):
         subjects = Subjects('bcpp-year-1')
         columns = subjects.results.columns
+
+
+class TestSubjectsBulkFetch(TestCase):
+
+    def setUp(self):
+        visits = []
+        crfs = []
+        for n in range(7):
+            visit = {
+                'id': 'visit-{}'.format(n),
+                'household_member': 'member-{}'.format(n),
+                'household_member__registered_subject__subject_identifier': '066-{}'.format(n),
+                'household_member__household_structure__survey__survey_slug':
+                    'bcpp-year-1' if n < 5 else 'bcpp-year-2'}
+            visits.append(visit)
+            if n != 3:
+                crf = dict([('subject_visit__' + key, value) for key, value in visit.items()])
+                crf.update({'subject_visit': visit['id'], 'ever_taken_arv': 'Yes', 'on_arv': 'No',
+                            'arv_evidence': None, 'clinic_receiving_from': 'clinic-{}'.format(n)})
+                crfs.append(crf)
+        self.subject_visit = mock_model('bcpp_subject', 'subjectvisit', rows=visits)
+        self.hiv_care_adherence = mock_model('bcpp_subject', 'hivcareadherence', rows=crfs)
+
+    def hiv_care_adherence_df(self, **kwargs):
+        with patch('bcpp_export.dataframes.subjects.SubjectVisit', self.subject_visit):
+            with patch('bcpp_export.dataframes.subjects.HivCareAdherence', self.hiv_care_adherence):
+                df = Subjects('bcpp-year-1', bulk_fetch_chunk_size=2, **kwargs).df_hiv_care_adherence
+        return df.sort_values('household_member').reset_index(drop=True)
+
+    def test_bulk_fetch_same_as_per_crf(self):
+        df = self.hiv_care_adherence_df()
+        self.assertEqual(list(df['subject_identifier']), ['066-0', '066-1', '066-2', '066-4'])
+        pd.testing.assert_frame_equal(self.hiv_care_adherence_df(bulk_fetch=True), df)
+
+    def test_bulk_fetch_same_as_per_crf_for_subject_identifiers(self):
+        subject_identifiers = set(['066-1', '066-3', '066-4', '066-6'])
+        df = self.hiv_care_adherence_df(subject_identifiers=subject_identifiers)
+        self.assertEqual(list(df['subject_identifier']), ['066-1', '066-4'])
+        pd.testing.assert_frame_equal(
+            self.hiv_care_adherence_df(bulk_fetch=True, subject_identifiers=subject_identifiers), df)
+
+
+class PrefetchSubjects(Subjects):
+
+    """Subjects with three df_ attributes that count their loads."""
+
+    delays = {'df_fast': 0.0, 'df_medium': 0.05, 'df_slow': 0.1}
+
+    def __init__(self, *args, **kwargs):
+        super(PrefetchSubjects, self).__init__(*args, **kwargs)
+        self.loads = []
+        self.loads_lock = threading.Lock()
+        self.frames = {}
+
+    @property
+    def dataframe_attrnames(self):
+        return sorted(self.delays)
+
+    def frame(self, attrname):
+        if attrname not in self.frames:
+            time.sleep(self.delays[attrname])
+            with self.loads_lock:
+                self.loads.append(attrname)
+            self.frames[attrname] = pd.DataFrame({'value': [1]})
+        return self.frames[attrname]
+
+    @property
+    def df_fast(self):
+        return self.frame('df_fast')
+
+    @property
+    def df_medium(self):
+        return self.frame('df_medium')
+
+    @property
+    def df_slow(self):
+        return self.frame('df_slow')
+
+
+class TestSubjectsPrefetch(TestCase):
+
+    def test_prefetch_loads_each_dataframe_once(self):
+        subjects = PrefetchSubjects('bcpp-year-1', max_workers=3)
+        with patch('bcpp_export.dataframes.subjects.connection') as connection:
+            subjects.prefetch_dataframes()
+        self.assertEqual(sorted(subjects.loads), ['df_fast', 'df_medium', 'df_slow'])
+        self.assertEqual(connection.close.call_count, 3)
+        for attrname in subjects.dataframe_attrnames:
+            subjects.load_dataframe(attrname)
+        self.assertEqual(len(subjects.loads), 3)
+        self.assertEqual(sorted(subjects.load_times), ['df_fast', 'df_medium', 'df_slow'])
+
+    def test_load_times_report_slowest_first(self):
+        subjects = PrefetchSubjects('bcpp-year-1', max_workers=3)
+        with patch('bcpp_export.dataframes.subjects.connection'):
+            subjects.prefetch_dataframes()
+        df = subjects.load_times_report()
+        self.assertEqual(list(df['dataframe']), ['df_slow', 'df_medium', 'df_fast'])
+        self.assertEqual(list(df['seconds']), sorted(df['seconds'], reverse=True))
@@ -1,3 +1,7 @@
+import gzip
+import os
+import shutil
+import tempfile
 import uuid
 import random    
 import pandas as pd
@@ -5,6 +9,7 @@ import pandas as pd
 from django.test.testcases import TestCase
 
 from bcpp_export.dataframes import Subjects, Members, Residences, CombinedDataFrames, CDCDataFrames
+from bcpp_export.dataframes.csv_export_mixin import CsvExportMixin
 from django.test.utils import override_settings
 
 
@@ -82,3 +87,38 @@ class TestToCsv(TestCase):
         self.assertTrue(len(dfs.get_export_columns('households').get('households')) > 0)
         self.assertTrue(len(dfs.get_export_columns('members').get('members')) > 0)
         self.assertTrue(len(dfs.get_export_columns('subjects').get('subjects')) > 0)
+
+    def test_export_dataframe_in_chunks(self):
+        export_folder = tempfile.mkdtemp()
+        try:
+            obj = CsvExportMixin(export_folder=export_folder)
+            obj.export_dataframe(self.df, 'results', ['pair', 'one'], chunksize=2)
+            filenames = os.listdir(export_folder)
+            self.assertEqual(len(filenames), 1)
+            with open(os.path.join(export_folder, filenames[0])) as f:
+                self.assertEqual(
+                    f.read(), obj.filtered_export_dataframe(self.df).to_csv(index=False, columns=['pair', 'one']))
+        finally:
+            shutil.rmtree(export_folder)
+
+    def test_export_dataframe_gzip(self):
+        export_folder = tempfile.mkdtemp()
+        try:
+            obj = CsvExportMixin(export_folder=export_folder)
+            obj.export_dataframe(self.df, 'results', None, chunksize=2, compression='gzip')
+            filenames = os.listdir(export_folder)
+            self.assertTrue(filenames[0].endswith('.csv.gz'))
+            df = pd.read_csv(gzip.open(os.path.join(export_folder, filenames[0])))
+            self.assertEqual(list(df['pair']), list(obj.filtered_export_dataframe(self.df)['pair']))
+        finally:
+            shutil.rmtree(export_folder)
+
+    def test_export_dataframe_removes_temp_file_on_error(self):
+        export_folder = tempfile.mkdtemp()
+        try:
+            obj = CsvExportMixin(export_folder=export_folder)
+            self.assertRaises(
+                KeyError, obj.export_dataframe, self.df, 'results', ['does_not_exist'], chunksize=2)
+            self.assertEqual(os.listdir(export_folder), [])
+        finally:
+            shutil.rmtree(export_folder)
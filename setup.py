@@ -21,6 +21,12 @@ setup(
     description='Export analysis datasets of Plot, Household, Enumeration and Participants data from the "BCPP" Edc.',
     long_description=README,
     zip_safe=False,
+    extras_require={
+        # parquet and feather exports, the chunk store and the dataframe cache (pyarrow), HDF5 exports (tables)
+        'columnar': ['pyarrow', 'tables'],
+        # zstd compressed CSV exports
+        'zstd': ['zstandard'],
+    },
     keywords='bcpp specific EDC utils',
     classifiers=[
         'Environment :: Web Environment',